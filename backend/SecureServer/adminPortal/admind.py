@@ -0,0 +1,157 @@
+"""
+Admin daemon: runs the adminPortal commands in one long-lived process, so
+imports, .env, keys and the decrypted stores stay loaded between commands.
+Listens on a Unix socket (paths.ADMIN_SOCKET_FILE, owner only); each
+connection carries one JSON line {"command", "args", "cwd", "stdin"} and
+gets one JSON line {"code", "stdout", "stderr"} back. Commands run one at a time and keep
+their own authenticate_session check. The stores reload when the server
+rewrites their files, and everything a command changed is written before it
+answers.
+
+Started by the first adminPortal command (client.py), or by hand:
+    python SecureServer/adminPortal/admind.py
+Exits after ADMIN_DAEMON_IDLE idle seconds, and before the next command once
+.env or the loaded code changed (that command then runs without it).
+"""
+import os, sys, io, json, socket, socketserver, traceback
+from pathlib import Path
+from contextlib import redirect_stdout, redirect_stderr
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+from SecureServer.code.paths import ADMIN_SOCKET_FILE, ENV_FILE
+from SecureServer.code.environment_variables import ADMIN_DAEMON_IDLE
+from SecureServer.code.file_writer import writer
+from SecureServer.code.lockout_store import lockout_tracker
+from SecureServer.code.token_store import token_repository
+from SecureServer.code.logs import server_log
+from SecureServer.adminPortal.commands import COMMANDS
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+MAX_REQUEST = 64 * 1024 * 1024  # bytes in one request line (bulkaction input included)
+
+def run_command(command: str, args: list, stdin: str = "", cwd: str = None) -> dict:
+    """
+    Run one command as the client's process would have: its stdin and working
+    directory (for relative file arguments), capturing what it prints and its exit code.
+    """
+    stdout, stderr = io.StringIO(), io.StringIO()
+    daemon_stdin, daemon_cwd = sys.stdin, os.getcwd()
+    with redirect_stdout(stdout), redirect_stderr(stderr):
+        try:
+            sys.stdin = io.StringIO(stdin)
+            if cwd:
+                os.chdir(cwd)
+            code = COMMANDS[command](args)
+        except Exception:
+            traceback.print_exc()
+            server_log("ERROR", f"Admin command {command} failed.")
+            code = 1
+        finally:
+            sys.stdin = daemon_stdin
+            os.chdir(daemon_cwd)
+            # What the exiting script used to write at exit
+            token_repository.flush()
+            lockout_tracker.flush()
+            writer.flush()
+    return {"code": code, "stdout": stdout.getvalue(), "stderr": stderr.getvalue()}
+
+def _source_stamps() -> dict:
+    """mtimes of .env and of every loaded SecureServer module."""
+    files = [ENV_FILE] + [m.__file__ for name, m in list(sys.modules.items())
+                          if name.startswith("SecureServer") and getattr(m, "__file__", None)]
+    stamps = {}
+    for path in files:
+        try:
+            stamps[str(path)] = os.stat(path).st_mtime_ns
+        except OSError:
+            stamps[str(path)] = None
+    return stamps
+
+class AdminRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline(MAX_REQUEST)
+        if _source_stamps() != self.server.stamps:
+            # Stale configuration or code: decline without running; the client runs it itself
+            server_log("NOTICE", "Admin daemon stopping: .env or code changed.")
+            self.server.stopped = True
+            self.wfile.write(json.dumps({"declined": True}).encode() + b"\n")
+            return
+        try:
+            request = json.loads(line)
+            command, args = request["command"], request["args"]
+            stdin, cwd = request.get("stdin", ""), request.get("cwd")
+            if command not in COMMANDS or not isinstance(args, list) or not all(isinstance(a, str) for a in args):
+                raise ValueError
+            if not isinstance(stdin, str) or not isinstance(cwd, (str, type(None))):
+                raise ValueError
+        except (ValueError, KeyError, TypeError):
+            reply = {"code": 2, "stdout": "", "stderr": "Invalid request\n"}
+        else:
+            reply = run_command(command, args, stdin, cwd)
+        self.wfile.write(json.dumps(reply).encode() + b"\n")
+
+class AdminDaemon(socketserver.UnixStreamServer):
+    """Serves one request at a time until idle for idle_timeout seconds (0 = never) or stopped."""
+    def __init__(self, path: Path, idle_timeout: int = ADMIN_DAEMON_IDLE):
+        self.timeout = idle_timeout or None
+        self.stopped = False
+        self.stamps = _source_stamps()
+        old_umask = os.umask(0o177)  # the socket file is created owner-only
+        try:
+            super().__init__(str(path), AdminRequestHandler)
+        finally:
+            os.umask(old_umask)
+
+    def handle_timeout(self):
+        server_log("NOTICE", "Admin daemon stopping: idle.")
+        self.stopped = True
+
+    def serve(self):
+        while not self.stopped:
+            self.handle_request()
+
+def main() -> int:
+    if not hasattr(socket, "AF_UNIX") or fcntl is None:
+        print("The admin daemon needs Unix sockets; adminPortal commands run in their own process.", file=sys.stderr)
+        return 1
+
+    # One daemon per data directory: the lock is held for the daemon's lifetime
+    lock = open(str(ADMIN_SOCKET_FILE) + ".lock", "a")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return 0
+
+    try:
+        ADMIN_SOCKET_FILE.unlink()  # left over from a daemon that did not exit cleanly
+    except FileNotFoundError:
+        pass
+
+    # Other processes (the server, its workers) read the same files, so writes land right away
+    writer.set_window(0)
+    try:
+        daemon = AdminDaemon(ADMIN_SOCKET_FILE)
+    except OSError as e:
+        server_log("ERROR", f"Admin daemon could not listen on {ADMIN_SOCKET_FILE}: {e}")
+        return 1
+
+    server_log("STARTUP", f"Admin daemon listening on {ADMIN_SOCKET_FILE}.")
+    try:
+        daemon.serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        try:
+            ADMIN_SOCKET_FILE.unlink()
+        except FileNotFoundError:
+            pass
+        daemon.server_close()
+        lock.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
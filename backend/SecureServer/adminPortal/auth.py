@@ -0,0 +1,149 @@
+import pyotp, uuid, urllib.parse, os
+from SecureServer.code.encryption import hash_pw, verify_login, needs_rehash, rehash_pw, DUMMY_HASH
+from SecureServer.code.lockout_store import lockout_tracker
+from SecureServer.code.user_store import user_repository
+from SecureServer.code.token_handling import get_new_token, validate_token
+from SecureServer.code.logs import server_log
+
+# Configuration
+APP_NAME = "SecureServerAdmin"
+
+def authenticate_session(session: str):
+    user, t_data = validate_token(session)
+    if not t_data or not user:
+        # Session expired or nonexistant
+        server_log("SECURITY NOTICE", f"Failed session fetch for admin user session {session}.")
+        return None
+    
+    return user # No extra logs, as other files will handle that
+
+
+def get_totp_uri(username: str, secret: str) -> str:
+    # Label = issuer:username
+    label = f"{APP_NAME}:{username}"
+    label = urllib.parse.quote(label)  # URL-encode special characters
+    
+    issuer = urllib.parse.quote(APP_NAME)
+    
+    # Standard URI format
+    uri = f"otpauth://totp/{label}?secret={secret}&issuer={issuer}&algorithm=SHA1&digits=6&period=30"
+    return uri
+
+def create_initial_admin(username: str, password: str):
+    if len(user_repository) > 0:
+        return False  # Initial admin already exists
+
+    password_hash = hash_pw(password)
+
+    new_user = {
+        "id": str(uuid.uuid4()),
+        "username": username,
+        "password": password_hash,
+        "root_auth": True,
+        "dev_admin": True,
+        "root": True, # This flags the initial account on the server, as it will not follow a setup template
+        "salt": os.urandom(16).hex(),
+        "2fa_secret": pyotp.random_base32(),
+        "2fa_enabled": True,
+        "2fa_setup_complete": False
+    }
+
+    user_repository.save_user(new_user)
+
+    server_log("NOTICE", f"Initial Developer Admin '{username}' created.")
+
+    # Give 2fa authentication setup
+    totp_uri = get_totp_uri(username, new_user["2fa_secret"])
+    server_log("NOTICE", f"Served initial 2FA activation code for developer admin user {username}.")
+    return 5, totp_uri
+
+
+
+def authenticate(username: str, password: str, totp_code: str | None = None):
+    """
+    Returns
+    | Code | Meaning                   |
+    | ---- | ------------------------- |
+    | `0`  | Root authenticated        |
+    | `1`  | Non-root authenticated    |
+    | `3`  | 2FA required (OTP prompt) |
+    | `5`  | 2FA setup required (QR)   |
+    | `4`  | Invalid OTP               |
+    | `2`  | Failure                   |
+    | `6`  | Account locked            |
+    | `7`  | Account frozen            |
+    """
+    # FIRST RUN: only if no users exist 
+    if len(user_repository) == 0:
+        return create_initial_admin(username, password)
+
+    user = user_repository.get_by_username(username)
+
+    # Dummy hash for timing-attack protection (one stretch, like a real user)
+    target_hash = user["password"] if user else DUMMY_HASH
+
+    # --- Check lockout ---
+    remaining = lockout_tracker.locked(username)
+    if remaining is not None:
+        server_log("SECURITY NOTICE", f"Account locked for user {username} due to repeated failures.")
+        return 6, f"Account temporarily locked. Try again in {int(remaining) // 60} minutes."
+
+    master = verify_login(password, target_hash)
+    if not user or master is None or not user.get("dev_admin", False):
+        # Failed login → record attempt
+        lockout_tracker.record_failure(username)
+        server_log("SECURITY NOTICE", f"Failed login for admin user {username}.")
+        return 2, None
+
+    # Upgrade legacy password hashes to the single-stretch key schedule
+    if needs_rehash(user["password"]):
+        user["password"] = rehash_pw(user["password"], master)
+        user_repository.save_user(user)
+
+    # --- Check freeze ---
+    if user.get("freeze", False):
+        server_log("SECURITY NOTICE", f"Frozen admin user tried to log in: {username}")
+        return 7, "Your account is disabled."
+
+    # --- 2FA Handling ---
+    if user.get("root_auth", False) or user.get("2fa_enabled", False):
+        if not user.get("2fa_secret"):
+            user["2fa_secret"] = pyotp.random_base32()
+            user["2fa_setup_complete"] = False
+            user_repository.save_user(user)
+
+        totp = pyotp.TOTP(user["2fa_secret"])
+
+        # --- SETUP PHASE ---
+        if not user.get("2fa_setup_complete", False):
+            if not totp_code:
+                totp_uri = get_totp_uri(username, user["2fa_secret"])
+                server_log("NOTICE", f"Served initial 2FA activation code for developer admin user {username}.")
+                return 5, totp_uri
+
+            if not totp.verify(str(totp_code)):
+                server_log("SECURITY NOTICE", f"Failed 2FA authentication for developer admin user {username}.")
+                return 4, None
+
+            # OTP valid → complete setup
+            user["2fa_setup_complete"] = True
+            user_repository.save_user(user)
+            server_log("LOGIN", f"Developer Admin user {username} authenticated.")
+            token, key, csrf = get_new_token(user["id"], password, 1200, master)
+            return (0 if user.get("root_auth", False) else 1), token
+
+        # --- NORMAL 2FA ---
+        if not totp_code:
+            server_log("NOTICE", f"Prompted Developer Admin user {username} for 2fa.")
+            return 3, None
+
+        if not totp.verify(str(totp_code)):
+            server_log("SECURITY NOTICE", f"Failed 2FA authentication for developer admin user {username}.")
+            return 4, None
+
+    # --- Successful login ---
+    lockout_tracker.clear(username)
+
+    server_log("LOGIN", f"Developer Admin user {username} authenticated.")
+    token, key, csrf = get_new_token(user["id"], password, 1200, master)
+    return (0 if user.get("root_auth", False) else 1), token
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+from SecureServer.adminPortal.client import main
+
+if __name__ == "__main__":
+    sys.exit(main("bulkaction"))
@@ -0,0 +1,87 @@
+"""
+Thin client behind every adminPortal script: forwards the command to the
+admin daemon (admind.py) over its Unix socket and replays its stdout, stderr
+and exit code. Only the standard library is imported on that path, so a
+command costs a process start and one round trip. Without a daemon the
+command runs in this process as before, and a daemon is started for the
+next one (ADMIN_DAEMON).
+"""
+import io, os, sys, json, socket
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+from SecureServer.code.paths import ADMIN_SOCKET_FILE
+
+CONNECT_TIMEOUT = 1  # seconds; a daemon that does not accept by then is treated as absent
+REPLY_TIMEOUT = 120  # seconds; a login includes a password stretch
+STDIN_COMMANDS = {"bulkaction"}  # read their input from stdin when no file (or "-") is given
+
+NO_REPLY = {"code": 1, "stdout": "", "stderr": "The admin daemon did not reply; the command may have run. Check before retrying.\n"}
+
+def call_daemon(command: str, args: list, stdin: str = None) -> dict | None:
+    """
+    The daemon's {"code", "stdout", "stderr"} for a command, or None if no
+    daemon took it (not reachable, or it declined before running anything),
+    so it is safe to run here. Once the request is sent it is never run
+    twice: a lost reply is reported as an error instead.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    request = {"command": command, "args": args, "cwd": os.getcwd()}
+    if stdin is not None:
+        request["stdin"] = stdin
+    try:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    except OSError:
+        return None
+    with sock:
+        try:
+            sock.settimeout(CONNECT_TIMEOUT)
+            sock.connect(str(ADMIN_SOCKET_FILE))
+            sock.settimeout(REPLY_TIMEOUT)
+            sock.sendall(json.dumps(request).encode() + b"\n")
+        except OSError:
+            return None  # the daemon never read the whole request, so it did not run it
+        try:
+            with sock.makefile("rb") as reply:
+                line = reply.readline()
+        except OSError:
+            return NO_REPLY
+    if not line:
+        return NO_REPLY
+    reply = json.loads(line)
+    if reply.get("declined"):
+        return None  # the daemon is stopping (e.g. .env or code changed) and did not run the command
+    return reply
+
+def run_local(command: str, args: list) -> int:
+    """Run the command in this process (imports and loads every store)."""
+    from SecureServer.adminPortal.commands import COMMANDS
+    from SecureServer.code.environment_variables import ADMIN_DAEMON
+    code = COMMANDS[command](args)
+    if ADMIN_DAEMON and hasattr(socket, "AF_UNIX"):
+        start_daemon()
+    return code
+
+def start_daemon() -> None:
+    """Start admind.py detached from this process; it exits at once if one is already running."""
+    import subprocess
+    subprocess.Popen(
+        [sys.executable, str(Path(__file__).with_name("admind.py"))],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True, close_fds=True,
+    )
+
+def main(command: str) -> int:
+    args = sys.argv[1:]
+    stdin = None
+    if command in STDIN_COMMANDS and args[1:2] in ([], ["-"]):
+        stdin = sys.stdin.read()
+    reply = call_daemon(command, args, stdin)
+    if reply is None:
+        if stdin is not None:
+            sys.stdin = io.StringIO(stdin)
+        return run_local(command, args)
+    sys.stdout.write(reply["stdout"])
+    sys.stderr.write(reply["stderr"])
+    return reply["code"]
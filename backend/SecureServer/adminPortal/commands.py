@@ -0,0 +1,469 @@
+"""
+The adminPortal commands. Each takes the script's arguments (without the
+script name), prints what the C# front end reads and returns the exit code.
+They run in the admin daemon (admind.py) or, without it, in the script's own
+process (client.py).
+"""
+import sys, io, json, uuid, os, pyotp, copy, argparse
+from contextlib import redirect_stderr
+from SecureServer.code.lockout_store import lockout_tracker
+from SecureServer.code.user_store import user_repository
+from SecureServer.code.token_store import token_repository
+from SecureServer.code import listings, vault_store
+from SecureServer.code.listings import page, parse_limit, parse_flag, parse_time, decode_cursor, format_ts
+from SecureServer.code.encryption import hash_pw
+from SecureServer.code.logs import server_log
+from SecureServer.adminPortal.auth import authenticate_session, authenticate
+
+USER_ACTIONS = {
+    # action: (field, value, log message)
+    "freeze": ("freeze", True, "{admin} froze all actions for user {user}."),
+    "unfreeze": ("freeze", False, "{admin} unfroze available actions for user {user}."),
+    "promote_app_admin": ("admin", True, "{admin} promoted user {user} to app admin."),
+    "demote_app_admin": ("admin", False, "{admin} revoked all app admin privileges from user {user}."),
+    "promote_dev_admin": ("dev_admin", True, "{admin} promoted user {user} to developer admin."),
+    "demote_dev_admin": ("dev_admin", False, "{admin} revoked all developer admin privileges from user {user}."),
+    "grant_root_auth": ("root_auth", True, "{admin} granted user {user} root command access."),
+    "revoke_root_auth": ("root_auth", False, "{admin} revoked all root command access from user {user}."),
+}
+
+# --- Helpers ---
+def auto_cast(value: str):
+    v = value.strip().lower()
+
+    # bool
+    if v == "true":
+        return True
+    if v == "false":
+        return False
+
+    # null / none
+    if v in ("null", "none"):
+        return None
+
+    # int
+    if v.isdigit() or (v.startswith("-") and v[1:].isdigit()):
+        return int(v)
+
+    # float
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    # string fallback
+    return value
+
+def safe_user(u: dict) -> dict:
+    """Return safe to log fields (not passwords, secrets, entire vaults, etc)"""
+    return {
+        "id": u.get("id"),
+        "username": u.get("username"),
+        "first_name": u.get("first_name"),
+        "last_name": u.get("last_name"),
+        "email": u.get("email"),
+        "phone": u.get("phone"),
+        "preferred_contact_method": u.get("preferred_contact_method"),
+        "admin": u.get("admin", False),
+        "dev_admin": u.get("dev_admin", False),
+        "2fa_enabled": u.get("2fa_enabled", False),
+        "root_auth": u.get("root_auth", False),
+        "vault_len": vault_store.size_of(u),
+        "frozen": u.get("freeze", False),
+        "failed_attempts": lockout_tracker.count(u.get("username"))
+    }
+
+def safe_session(t: dict, username: str | None) -> dict:
+    """Return safe to log fields (not passwords, secrets, entire vaults, etc)"""
+    return {
+        "session_id": t.get("session_id"),
+        "value": t.get("safe_log"),
+        "username": username if username is not None else "<user removed>",
+        "login_time": format_ts(t.get("auth_time")) if t.get("auth_time") else None,
+        "user_id": t.get("user_id")
+    }
+
+def _listing_options(args: list, admin: bool = False, times: bool = False):
+    """
+    Options of a list command: <session> [--limit N] [--cursor C] [--prefix P]
+    [--ndjson], plus [--admin true|false] or [--since T] [--until T].
+    None if they are invalid.
+    """
+    parser = argparse.ArgumentParser(add_help=False, exit_on_error=False)
+    parser.add_argument("session")
+    parser.add_argument("--limit")
+    parser.add_argument("--cursor")
+    parser.add_argument("--prefix")
+    parser.add_argument("--ndjson", action="store_true")
+    if admin:
+        parser.add_argument("--admin")
+    if times:
+        parser.add_argument("--since")
+        parser.add_argument("--until")
+    try:
+        with redirect_stderr(io.StringIO()):  # only our own "Invalid arguments" is printed
+            options = parser.parse_args(args)
+        options.limit = parse_limit(options.limit)
+        options.after = decode_cursor(options.cursor)
+        if admin:
+            options.admin = parse_flag(options.admin)
+        if times:
+            options.since, options.until = parse_time(options.since), parse_time(options.until)
+    except (argparse.ArgumentError, ValueError, SystemExit):
+        return None
+    return options
+
+def _print_listing(rows, next_cursor: str | None, options) -> None:
+    """
+    Without --limit: the JSON array the portal reads, written row by row.
+    With --limit: {"items": [...], "next_cursor": ...}. With --ndjson: one row
+    per line, then {"next_cursor": ...} if another page follows.
+    """
+    write = sys.stdout.write
+    if options.ndjson:
+        for row in rows:
+            write(json.dumps(row) + "\n")
+        if next_cursor:
+            write(json.dumps({"next_cursor": next_cursor}) + "\n")
+    elif options.limit is None:
+        write("[")
+        for i, row in enumerate(rows):
+            write((", " if i else "") + json.dumps(row))
+        write("]\n")
+    else:
+        print(json.dumps({"items": list(rows), "next_cursor": next_cursor}))
+
+def _session_user(args: list, count: int):
+    """(admin user, exit code): the code is set when the arguments or the session are invalid."""
+    if len(args) != count:
+        print("Invalid arguments", file=sys.stderr)
+        return None, 2
+
+    user = authenticate_session(args[0])
+    if not user:
+        print("Invalid session", file=sys.stderr)
+        return None, 1
+    return user, 0
+
+# --- Commands ---
+def adminlogin(args: list) -> int:
+    if len(args) not in (2, 3):
+        server_log("ERROR", "Invalid arguments. Usage: adminlogin.py <username> <password> <(optional) TOTP>")
+        return 2
+
+    username = args[0]
+    password = args[1]
+    totp_code = args[2] if len(args) == 3 else None
+
+    if not username or not password:
+        server_log("ERROR", "Username and password cannot be empty (adminlogin.py)")
+        return 2
+
+    result, data = authenticate(username, password, totp_code)
+
+    if (result == 5 or result == 0 or result == 1) and data:
+        print(data)  # C# reads this
+    return result
+
+def clearallattempts(args: list) -> int:
+    user, code = _session_user(args, 1)
+    if not user:
+        return code
+
+    server_log("COMMAND", f"{user['username']} cleared all failed attempts.")
+
+    lockout_tracker.clear_all()
+    lockout_tracker.flush()
+    return 0
+
+def createuser(args: list) -> int:
+    if len(args) < 3 or len(args) % 2 != 1:
+        print("Invalid arguments", file=sys.stderr)
+        return 2
+
+    session_id = args[0]
+    username = args[1]
+    password = args[2]
+
+    custom_dict = args[3:] # Get custom set keys and their values
+
+    # ---- Auth ----
+    user = authenticate_session(session_id)
+    if not user:
+        print("Invalid session", file=sys.stderr)
+        return 1
+
+    # ---- Create user ----
+    template = user_repository.get_by_username("template")
+    if not template:
+        server_log("ERROR", f"{user['username']} tried to create a user, but the template user was not found (try restarting the server).")
+        return 1
+
+    server_log("COMMAND", f"{user['username']} created a new user: '{username}' (defaults from template).")
+    new_user = copy.deepcopy(template)
+
+    # Load into template
+    new_user["id"] = str(uuid.uuid4())
+    new_user["username"] = username
+    new_user["password"] = hash_pw(password)
+    new_user["salt"] = os.urandom(16).hex()
+    new_user["2fa_secret"] = pyotp.random_base32()
+
+    # Load custom data
+    for i in range(0, len(custom_dict), 2):
+        key = custom_dict[i]
+        raw_value = custom_dict[i + 1]
+        new_user[key] = auto_cast(raw_value)
+
+    print(new_user)
+
+    user_repository.save_user(new_user)
+    return 0
+
+def listattempts(args: list) -> int:
+    options = _listing_options(args, times=True)
+    if options is None:
+        print("Invalid arguments", file=sys.stderr)
+        return 2
+    user, code = _session_user(args[:1], 1)
+    if not user:
+        return code
+
+    server_log("COMMAND", f"{user['username']} requested list of failed attempts.")
+
+    items, next_cursor = page(
+        listings.attempts(options.after, options.prefix, options.since, options.until),
+        options.limit, listings.attempt_key)
+
+    def rows():
+        for username, timestamps in items:
+            # Entry that identifies the user
+            yield {"username": username, "timestamp": None}
+
+            # Entries for each failed attempt
+            for ts in timestamps:
+                yield {"username": username, "timestamp": format_ts(ts)}
+
+    _print_listing(rows(), next_cursor, options)
+    return 0
+
+def listsessions(args: list) -> int:
+    options = _listing_options(args, times=True)
+    if options is None:
+        print("Invalid arguments", file=sys.stderr)
+        return 2
+    user, code = _session_user(args[:1], 1)
+    if not user:
+        return code
+
+    server_log("COMMAND", f"{user['username']} requested list of active sessions")
+
+    items, next_cursor = page(
+        listings.sessions(options.after, options.prefix, options.since, options.until),
+        options.limit, listings.session_key)
+    _print_listing((safe_session(t, username) for t, username in items), next_cursor, options)
+    return 0
+
+def listusers(args: list) -> int:
+    options = _listing_options(args, admin=True)
+    if options is None:
+        print("Invalid arguments", file=sys.stderr)
+        return 2
+    user, code = _session_user(args[:1], 1)
+    if not user:
+        return code
+
+    server_log("COMMAND", f"{user['username']} requested user list.")
+
+    items, next_cursor = page(
+        listings.users(options.after, options.prefix, options.admin),
+        options.limit, listings.user_key)
+    _print_listing(map(safe_user, items), next_cursor, options)
+    return 0
+
+def logout(args: list) -> int:
+    user, code = _session_user(args, 2)
+    if not user:
+        return code
+    target_user_id = args[1]
+
+    if len(token_repository) == 0:
+        print("No active sessions", file=sys.stderr)
+        return 1
+
+    removed_count = len(token_repository.remove_user(str(target_user_id)))
+    token_repository.flush()
+    server_log("COMMAND", f"{user['username']} logged out {removed_count} session(s) for user id {target_user_id}.")
+    return 0
+
+def logoutadmin(args: list) -> int:
+    user, code = _session_user(args, 1)
+    if not user:
+        return code
+
+    if len(token_repository) == 0:
+        print("No active sessions", file=sys.stderr)
+        return 1
+
+    removed_count = len(token_repository.remove_user(user["id"]))
+    token_repository.flush()
+
+    server_log("LOGOUT", f"Dev Admin {user['username']} logged out {removed_count} session(s) for self.")
+    return 0
+
+def logoutall(args: list) -> int:
+    user, code = _session_user(args, 1)
+    if not user:
+        return code
+
+    server_log("COMMAND", f"{user['username']} logged out all sessions.")
+
+    token_repository.clear()
+    token_repository.flush()
+    return 0
+
+def useraction(args: list) -> int:
+    user, code = _session_user(args, 3)
+    if not user:
+        return code
+    action = args[1]
+    user_id = args[2]
+
+    edit = user_repository.get_by_id(user_id)
+    if not edit:
+        print("Invalid user ID", file=sys.stderr)
+        return 1
+
+    if action == "clear_attempts":
+        lockout_tracker.clear(edit["username"])
+        lockout_tracker.flush()
+        server_log("COMMAND", f"{user['username']} cleared failed attempts for '{edit['username']}'.")
+        return 0
+
+    if action not in USER_ACTIONS:
+        server_log("ERROR", f"{user['username']} tried to execute unknown user command: {action}")
+        return 1
+
+    field, value, message = USER_ACTIONS[action]
+    user_repository.update_fields({user_id: {field: value}})
+    server_log("COMMAND", message.format(admin=user["username"], user=edit["username"]))
+    return 0
+
+def _read_bulk_items(source) -> list:
+    """(line number, item or error) for each non-blank NDJSON line of source."""
+    items = []
+    for number, line in enumerate(source, 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            if not isinstance(item, dict) or not isinstance(item.get("action"), str) or not isinstance(item.get("user_id"), str):
+                raise ValueError
+        except ValueError:
+            items.append((number, "Expected {\"action\": ..., \"user_id\": ...}"))
+            continue
+        items.append((number, item))
+    return items
+
+def bulkaction(args: list) -> int:
+    """
+    useraction/logout for many users: NDJSON {"action", "user_id"} lines from
+    a file (or stdin) applied in one pass. The field changes are collected and
+    applied with one write, on records re-read under the store's lock, so a
+    concurrent change to other fields of a user is kept; tokens and failed
+    attempts are written once at the end. Prints one NDJSON result per line; exit code 1 if any
+    line failed.
+    """
+    if len(args) not in (1, 2):
+        print("Invalid arguments", file=sys.stderr)
+        return 2
+
+    user = authenticate_session(args[0])
+    if not user:
+        print("Invalid session", file=sys.stderr)
+        return 1
+
+    try:
+        if len(args) == 1 or args[1] == "-":
+            items = _read_bulk_items(sys.stdin)
+        else:
+            with open(args[1], encoding="utf-8") as f:
+                items = _read_bulk_items(f)
+    except OSError as e:
+        print(f"Cannot read {args[1]}: {e.strerror}", file=sys.stderr)
+        return 2
+
+    server_log("COMMAND", f"{user['username']} started a bulk action of {len(items)} item(s).")
+
+    names = {}  # user id -> username (None for unknown ids)
+    changed = {}  # user id -> {field: value} (several actions on one user stack)
+    results = []
+    tokens_changed = attempts_changed = False
+
+    for number, item in items:
+        if isinstance(item, str):
+            results.append({"line": number, "ok": False, "error": item})
+            continue
+        action, user_id = item["action"], item["user_id"]
+        result = {"line": number, "action": action, "user_id": user_id, "ok": True}
+        results.append(result)
+
+        if action == "logout":
+            removed_count = len(token_repository.remove_user(user_id))
+            tokens_changed = tokens_changed or removed_count > 0
+            result["sessions"] = removed_count
+            server_log("COMMAND", f"{user['username']} logged out {removed_count} session(s) for user id {user_id}.")
+            continue
+
+        if action != "clear_attempts" and action not in USER_ACTIONS:
+            result.update(ok=False, error="Unknown action")
+            continue
+
+        if user_id not in names:
+            edit = user_repository.get_by_id(user_id)
+            names[user_id] = edit["username"] if edit else None
+        username = names[user_id]
+        if username is None:
+            result.update(ok=False, error="Invalid user ID")
+            continue
+
+        if action == "clear_attempts":
+            lockout_tracker.clear(username)
+            attempts_changed = True
+            server_log("COMMAND", f"{user['username']} cleared failed attempts for '{username}'.")
+            continue
+
+        field, value, message = USER_ACTIONS[action]
+        changed.setdefault(user_id, {})[field] = value
+        server_log("COMMAND", message.format(admin=user["username"], user=username))
+
+    saved = user_repository.update_fields(changed) if changed else {}
+    for result in results:
+        # Removed since it was looked up
+        if result.get("user_id") in changed and result["user_id"] not in saved and result["action"] in USER_ACTIONS:
+            result.update(ok=False, error="Invalid user ID")
+    if tokens_changed:
+        token_repository.flush()
+    if attempts_changed:
+        lockout_tracker.flush()
+
+    failed = sum(1 for r in results if not r["ok"])
+    server_log("COMMAND", f"{user['username']} finished a bulk action: {len(results) - failed} applied, {failed} failed, {len(saved)} user(s) saved.")
+
+    for result in results:
+        print(json.dumps(result))
+    return 1 if failed else 0
+
+COMMANDS = {
+    "adminlogin": adminlogin,
+    "bulkaction": bulkaction,
+    "clearallattempts": clearallattempts,
+    "createuser": createuser,
+    "listattempts": listattempts,
+    "listsessions": listsessions,
+    "listusers": listusers,
+    "logout": logout,
+    "logoutadmin": logoutadmin,
+    "logoutall": logoutall,
+    "useraction": useraction,
+}
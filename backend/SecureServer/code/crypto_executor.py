@@ -0,0 +1,72 @@
+import os, signal, asyncio, hashlib, threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from SecureServer.code.environment_variables import CRYPTO_POOL, CRYPTO_WORKERS
+from SecureServer.code.logs import server_log
+
+_executor = None
+_lock = threading.Lock()
+
+def _workers() -> int:
+    return CRYPTO_WORKERS if CRYPTO_WORKERS > 0 else (os.cpu_count() or 1)
+
+def _init_process():
+    # Pool processes may be forked from a server worker: drop its signal handlers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+def _thread_pool():
+    # hashlib releases the GIL while stretching, so threads still run in parallel
+    return ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix="crypto")
+
+def get_executor():
+    """Return the shared CPU-bound crypto executor, creating it on first use."""
+    global _executor
+    with _lock:
+        if _executor is None:
+            if CRYPTO_POOL == "process":
+                try:
+                    _executor = ProcessPoolExecutor(max_workers=_workers(), initializer=_init_process)
+                except (OSError, NotImplementedError) as e:
+                    server_log("WARNING", f"Crypto process pool unavailable ({type(e).__name__}), using threads.")
+                    _executor = _thread_pool()
+            else:
+                _executor = _thread_pool()
+        return _executor
+
+def _fallback_to_threads(broken):
+    global _executor
+    with _lock:
+        if _executor is broken:
+            server_log("WARNING", "Crypto process pool broke, falling back to threads.")
+            _executor = _thread_pool()
+        return _executor
+
+async def pbkdf2(password: bytes, salt: bytes, iterations: int = 600_000, dklen: int = None) -> bytes:
+    """hashlib.pbkdf2_hmac('sha256', ...) run off the event loop."""
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    try:
+        return await loop.run_in_executor(executor, hashlib.pbkdf2_hmac, "sha256", password, salt, iterations, dklen)
+    except BrokenProcessPool:
+        executor = _fallback_to_threads(executor)
+        return await loop.run_in_executor(executor, hashlib.pbkdf2_hmac, "sha256", password, salt, iterations, dklen)
+
+def shutdown(wait: bool = False):
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait, cancel_futures=True)
+            _executor = None
+
+def _after_fork():
+    # A forked worker must not share the parent's pool
+    global _executor, _lock
+    _executor = None
+    _lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
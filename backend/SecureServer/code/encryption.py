@@ -1,194 +1,278 @@
-import hmac, hashlib, json, base64, os, pyotp
-from pathlib import Path
-from base64 import urlsafe_b64decode
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-from cryptography.hazmat.primitives.kdf.hkdf import HKDF
-from cryptography.hazmat.primitives import hashes
-
-from SecureServer.code.environment_variables import SYSTEM_KEY, INTEGRITY_KEY, ENCAPSILATION_KEY, REPLACE_CORRUPTED_FILES
-from SecureServer.code.logs import server_log
-
-# --- JSON logic ---
-def calculate_hmac(data: str) -> str:
-    """HMAC-SHA256 of string data."""
-    return hmac.new(INTEGRITY_KEY.encode(), data.encode(), hashlib.sha256).hexdigest()
-
-def load_json(file):
-    if file.exists():
-        if file.stat().st_size == 0:
-            return []
-        with open(file, "r", encoding="utf-8") as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                return []
-    return []
-
-def write_json(file, data):
-    with open(file, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
-
-def load_encrypted_json(file: str, is_dict: bool = False) -> dict:
-    """Load encrypted JSON dict. Auto-reset if corrupted."""
-    path = Path(file)
-    empty_container = {"data": {}, "signature": calculate_hmac("{}")} if is_dict else {"data": [], "signature": calculate_hmac("[]")} 
-
-    if not path.exists():
-        if REPLACE_CORRUPTED_FILES:
-            server_log("WARNING", f"{file} missing — creating fresh encrypted file.")
-            write_encrypted_json(file, empty_container)
-        return empty_container
-
-    try:
-        enc_data = path.read_text().strip()
-        decrypted = decrypt_vault(enc_data, SYSTEM_KEY)
-        container = json.loads(decrypted)
-
-        # Ensure correct keys
-        if "data" not in container or "signature" not in container:
-            raise ValueError("Missing required keys in container")
-        return container
-
-    except Exception as e:
-        server_log("CORRUPTED ENCRYPTED FILE", f"{file} ({e})")
-        if REPLACE_CORRUPTED_FILES:
-            server_log("RESETTING ENCRYPTED FILE", f"{file}")
-            write_encrypted_json(file, empty_container)
-            return empty_container
-        return {}
-
-def write_encrypted_json(file: str, data: dict):
-    """Write JSON dict as encrypted vault."""
-    Path(file).write_text(encrypt_vault(json.dumps(data), SYSTEM_KEY))
-
-# --- Aes key ---
-def get_aes_key(key: str | bytes) -> bytes:
-    if isinstance(key, str):
-        return urlsafe_b64decode(key)
-    return key 
-
-# --- Vault encryption/decryption ---
-def derive_vault_key(password: str | bytes, salt_hex: str, session_id: str = "default-id") -> bytes:
-    # ensure password is bytes
-    if isinstance(password, str):
-        password_bytes = password.encode()
-    else:
-        password_bytes = password
-
-    salt_bytes = bytes.fromhex(salt_hex)
-
-    base_key = hashlib.pbkdf2_hmac(
-        'sha256',
-        password_bytes,
-        salt_bytes,
-        600_000,
-        dklen=32
-    )
-
-    hkdf = HKDF(
-        algorithm=hashes.SHA256(),
-        length=32,
-        salt=None,
-        info=session_id.encode()
-    )
-
-    return hkdf.derive(base_key)
-
-def generate_vault_master_key() -> str:
-    """
-    Generates a random 256-bit master key for vault encryption.
-    This key is session-independent and stored encrypted.
-    """
-    master_key_bytes = os.urandom(32)
-    return base64.urlsafe_b64encode(master_key_bytes).decode()
-
-def wrap_vault_key(master_key_str: str, kek_str: str) -> str:
-    """
-    Wraps a master key (string) using a key encryption key (string),
-    returns base64-encoded ciphertext including nonce.
-    """
-    master_key_bytes = master_key_str.encode('utf-8')
-    kek_bytes = _derive_key(kek_str)
-
-    aes = AESGCM(kek_bytes)
-    nonce = os.urandom(12)
-    ciphertext = aes.encrypt(nonce, master_key_bytes, None)
-    return base64.urlsafe_b64encode(nonce + ciphertext).decode('utf-8')
-
-def unwrap_vault_key(wrapped_str: str, kek_str: str) -> str:
-    """
-    Unwraps a previously wrapped master key.
-    Returns the original master key as a string.
-    """
-    wrapped_bytes = base64.urlsafe_b64decode(wrapped_str.encode('utf-8'))
-    nonce, ciphertext = wrapped_bytes[:12], wrapped_bytes[12:]
-    kek_bytes = _derive_key(kek_str)
-
-    aes = AESGCM(kek_bytes)
-    master_key_bytes = aes.decrypt(nonce, ciphertext, None)
-    return master_key_bytes.decode('utf-8')
-
-
-def _derive_key(key_str: str) -> bytes:
-        """Derive a 256-bit AES key from a string using SHA256."""
-        return hashlib.sha256(key_str.encode('utf-8')).digest()  # 32 bytes
-
-def encrypt_vault(data: str | bytes, key: str | bytes) -> str:
-    key_bytes = get_aes_key(key)
-    aes = AESGCM(key_bytes)
-    nonce = os.urandom(12)
-
-    # ensure data is bytes
-    if isinstance(data, str):
-        data_bytes = data.encode()
-    else:
-        data_bytes = data
-
-    ciphertext = aes.encrypt(nonce, data_bytes, None)
-    return base64.urlsafe_b64encode(nonce + ciphertext).decode()
-
-def decrypt_vault(enc_data: str, key: str) -> str:
-    if not enc_data:
-        return ""
-    key_bytes = get_aes_key(key)
-    aes = AESGCM(key_bytes)
-    raw = urlsafe_b64decode_padded(enc_data)
-    nonce, ciphertext = raw[:12], raw[12:]
-    return aes.decrypt(nonce, ciphertext, None).decode()
-
-
-# --- Hashing ---
-def hash_pw(password: str) -> str:
-    salt = os.urandom(16)
-    hash_bytes = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, 600_000)
-    return base64.b64encode(salt + hash_bytes).decode()
-
-def verify_pw(password: str, stored: str) -> bool:
-    decoded = base64.b64decode(stored.encode())
-    salt = decoded[:16]
-    stored_hash = decoded[16:]
-    test_hash = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, 600_000)
-    return hmac.compare_digest(test_hash, stored_hash)
-
-# --- Simple hashing ---
-def basic_hash(string: str) -> str:
-    """Hashes a string using SHA3-256 (fast, strong, no salt)."""
-    return hashlib.sha3_256(string.encode()).hexdigest()
-
-# --- Token hashing ---
-def hash_token(token: str) -> str:
-    """Securely hash token using HMAC-SHA256."""
-    return hmac.new(ENCAPSILATION_KEY.encode(), token.encode(), hashlib.sha256).hexdigest()
-
-# --- Safe base64 decoding helper ---
-def urlsafe_b64decode_padded(data: str) -> bytes:
-    """Decode a base64 string safely, adding padding if needed."""
-    data = data.encode() if isinstance(data, str) else data
-    padding = 4 - (len(data) % 4)
-    if padding != 4:
-        data += b"=" * padding
-    return base64.urlsafe_b64decode(data)
-
-# --- random base32 ---
-def random_base32() -> str:
+import hmac, hashlib, json, base64, os, pyotp
+from pathlib import Path
+from base64 import urlsafe_b64decode
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives import hashes
+
+from SecureServer.code.environment_variables import SYSTEM_KEY, INTEGRITY_KEY, ENCAPSILATION_KEY, REPLACE_CORRUPTED_FILES, LOGIN_KEY_SCHEDULE
+from SecureServer.code.logs import server_log
+from SecureServer.code.file_writer import writer
+from SecureServer.code.crypto_executor import pbkdf2
+
+# --- JSON logic ---
+def calculate_hmac(data: str) -> str:
+    """HMAC-SHA256 of string data."""
+    return hmac.new(INTEGRITY_KEY.encode(), data.encode(), hashlib.sha256).hexdigest()
+
+def load_json(file):
+    if file.exists():
+        if file.stat().st_size == 0:
+            return []
+        with open(file, "r", encoding="utf-8") as f:
+            try:
+                return json.load(f)
+            except json.JSONDecodeError:
+                return []
+    return []
+
+def write_json(file, data):
+    with open(file, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+def load_encrypted_json(file: str, is_dict: bool = False) -> dict:
+    """Load encrypted JSON dict. Auto-reset if corrupted."""
+    path = Path(file)
+    empty_container = {"data": {}, "signature": calculate_hmac("{}")} if is_dict else {"data": [], "signature": calculate_hmac("[]")} 
+
+    raw = writer.read(path)
+    if raw is None:
+        if REPLACE_CORRUPTED_FILES:
+            server_log("WARNING", f"{file} missing — creating fresh encrypted file.")
+            write_encrypted_json(file, empty_container)
+        return empty_container
+
+    try:
+        enc_data = raw.decode().strip()
+        decrypted = decrypt_vault(enc_data, SYSTEM_KEY)
+        container = json.loads(decrypted)
+
+        # Ensure correct keys
+        if "data" not in container or "signature" not in container:
+            raise ValueError("Missing required keys in container")
+        return container
+
+    except Exception as e:
+        server_log("CORRUPTED ENCRYPTED FILE", f"{file} ({e})")
+        if REPLACE_CORRUPTED_FILES:
+            server_log("RESETTING ENCRYPTED FILE", f"{file}")
+            write_encrypted_json(file, empty_container)
+            return empty_container
+        return {}
+
+def write_encrypted_json(file: str, data: dict):
+    """Write JSON dict as encrypted vault (atomically, via the group-commit writer)."""
+    writer.write(file, encrypt_vault(json.dumps(data), SYSTEM_KEY).encode())
+
+# --- Aes key ---
+def get_aes_key(key: str | bytes) -> bytes:
+    if isinstance(key, str):
+        return urlsafe_b64decode(key)
+    return key 
+
+# --- Vault encryption/decryption ---
+def stretch_vault_secret(password: str | bytes, salt_hex: str) -> bytes:
+    """Slow PBKDF2 stretch of a login secret (cached per session by session_store)."""
+    # ensure password is bytes
+    if isinstance(password, str):
+        password_bytes = password.encode()
+    else:
+        password_bytes = password
+
+    salt_bytes = bytes.fromhex(salt_hex)
+
+    return hashlib.pbkdf2_hmac(
+        'sha256',
+        password_bytes,
+        salt_bytes,
+        600_000,
+        dklen=32
+    )
+
+async def stretch_vault_secret_async(password: str | bytes, salt_hex: str) -> bytes:
+    """stretch_vault_secret on the crypto executor."""
+    if isinstance(password, str):
+        password = password.encode()
+    return await pbkdf2(password, bytes.fromhex(salt_hex), 600_000, 32)
+
+def expand_vault_key(base_key: bytes, session_id: str = "default-id") -> bytes:
+    """Fast HKDF expansion of a stretched secret into the session KEK."""
+    hkdf = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=session_id.encode()
+    )
+
+    return hkdf.derive(base_key)
+
+def derive_vault_key(password: str | bytes, salt_hex: str, session_id: str = "default-id") -> bytes:
+    base_key = stretch_vault_secret(password, salt_hex)
+    return expand_vault_key(base_key, session_id)
+
+async def derive_vault_key_async(password: str | bytes, salt_hex: str, session_id: str = "default-id") -> bytes:
+    base_key = await stretch_vault_secret_async(password, salt_hex)
+    return expand_vault_key(base_key, session_id)
+
+def generate_vault_master_key() -> str:
+    """
+    Generates a random 256-bit master key for vault encryption.
+    This key is session-independent and stored encrypted.
+    """
+    master_key_bytes = os.urandom(32)
+    return base64.urlsafe_b64encode(master_key_bytes).decode()
+
+def wrap_vault_key(master_key_str: str, kek_str: str) -> str:
+    """
+    Wraps a master key (string) using a key encryption key (string),
+    returns base64-encoded ciphertext including nonce.
+    """
+    master_key_bytes = master_key_str.encode('utf-8')
+    kek_bytes = _derive_key(kek_str)
+
+    aes = AESGCM(kek_bytes)
+    nonce = os.urandom(12)
+    ciphertext = aes.encrypt(nonce, master_key_bytes, None)
+    return base64.urlsafe_b64encode(nonce + ciphertext).decode('utf-8')
+
+def unwrap_vault_key(wrapped_str: str, kek_str: str) -> str:
+    """
+    Unwraps a previously wrapped master key.
+    Returns the original master key as a string.
+    """
+    wrapped_bytes = base64.urlsafe_b64decode(wrapped_str.encode('utf-8'))
+    nonce, ciphertext = wrapped_bytes[:12], wrapped_bytes[12:]
+    kek_bytes = _derive_key(kek_str)
+
+    aes = AESGCM(kek_bytes)
+    master_key_bytes = aes.decrypt(nonce, ciphertext, None)
+    return master_key_bytes.decode('utf-8')
+
+
+def _derive_key(key_str: str) -> bytes:
+        """Derive a 256-bit AES key from a string using SHA256."""
+        return hashlib.sha256(key_str.encode('utf-8')).digest()  # 32 bytes
+
+def encrypt_vault(data: str | bytes, key: str | bytes) -> str:
+    key_bytes = get_aes_key(key)
+    aes = AESGCM(key_bytes)
+    nonce = os.urandom(12)
+
+    # ensure data is bytes
+    if isinstance(data, str):
+        data_bytes = data.encode()
+    else:
+        data_bytes = data
+
+    ciphertext = aes.encrypt(nonce, data_bytes, None)
+    return base64.urlsafe_b64encode(nonce + ciphertext).decode()
+
+def decrypt_vault(enc_data: str, key: str) -> str:
+    if not enc_data:
+        return ""
+    key_bytes = get_aes_key(key)
+    aes = AESGCM(key_bytes)
+    raw = urlsafe_b64decode_padded(enc_data)
+    nonce, ciphertext = raw[:12], raw[12:]
+    return aes.decrypt(nonce, ciphertext, None).decode()
+
+
+# --- Hashing ---
+# Stored password formats:
+#   legacy:        b64(salt + PBKDF2(password))
+#   key schedule:  "ks1$" + b64(salt + HKDF(PBKDF2(password), "verifier"))
+# A legacy hash is exactly the key schedule's master key, so it can be
+# upgraded on the next successful login without another stretch.
+KEY_SCHEDULE_PREFIX = "ks1$"
+
+def _expand(key: bytes, label: bytes) -> bytes:
+    return HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b"SecureServer/" + label).derive(key)
+
+def _split_hash(stored: str) -> tuple[bool, bytes, bytes]:
+    """(uses key schedule, salt, stored hash) of a stored password."""
+    scheduled = stored.startswith(KEY_SCHEDULE_PREFIX)
+    decoded = base64.b64decode(stored.removeprefix(KEY_SCHEDULE_PREFIX).encode())
+    return scheduled, decoded[:16], decoded[16:]
+
+def _encode_hash(salt: bytes, master: bytes) -> str:
+    if LOGIN_KEY_SCHEDULE:
+        return KEY_SCHEDULE_PREFIX + base64.b64encode(salt + _expand(master, b"verifier")).decode()
+    return base64.b64encode(salt + master).decode()
+
+def _check_master(master: bytes, stored: str) -> bytes | None:
+    scheduled, _, stored_hash = _split_hash(stored)
+    test_hash = _expand(master, b"verifier") if scheduled else master
+    return master if hmac.compare_digest(test_hash, stored_hash) else None
+
+def login_keys(master: bytes) -> tuple[bytes, bytes]:
+    """(login_secret, base_key) for a session, split off the stretched password."""
+    login_secret = _expand(master, b"login-secret")
+    return login_secret, session_base_key(login_secret)
+
+def session_base_key(login_secret: bytes) -> bytes:
+    """Base of the session KEK; cheap to rebuild from the session's login secret."""
+    return _expand(login_secret, b"session-kek")
+
+def needs_rehash(stored: str) -> bool:
+    """True for legacy hashes while the key schedule is enabled."""
+    return LOGIN_KEY_SCHEDULE and not stored.startswith(KEY_SCHEDULE_PREFIX)
+
+def rehash_pw(stored: str, master: bytes) -> str:
+    """Re-encode a verified password under the current format (no stretch)."""
+    _, salt, _ = _split_hash(stored)
+    return _encode_hash(salt, master)
+
+# Stand-in hash for unknown usernames. It is random bytes in the current
+# format, so checking it costs exactly one stretch and never matches.
+DUMMY_HASH = _encode_hash(os.urandom(16), os.urandom(32))
+
+def hash_pw(password: str) -> str:
+    salt = os.urandom(16)
+    master = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, 600_000)
+    return _encode_hash(salt, master)
+
+def verify_login(password: str, stored: str) -> bytes | None:
+    """Stretch once; return the master key if the password matches, else None."""
+    _, salt, _ = _split_hash(stored)
+    master = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, 600_000)
+    return _check_master(master, stored)
+
+def verify_pw(password: str, stored: str) -> bool:
+    return verify_login(password, stored) is not None
+
+# --- Hashing (off the event loop) ---
+async def hash_pw_async(password: str) -> str:
+    salt = os.urandom(16)
+    master = await pbkdf2(password.encode(), salt, 600_000)
+    return _encode_hash(salt, master)
+
+async def verify_login_async(password: str, stored: str) -> bytes | None:
+    _, salt, _ = _split_hash(stored)
+    master = await pbkdf2(password.encode(), salt, 600_000)
+    return _check_master(master, stored)
+
+async def verify_pw_async(password: str, stored: str) -> bool:
+    return await verify_login_async(password, stored) is not None
+
+# --- Simple hashing ---
+def basic_hash(string: str) -> str:
+    """Hashes a string using SHA3-256 (fast, strong, no salt)."""
+    return hashlib.sha3_256(string.encode()).hexdigest()
+
+# --- Token hashing ---
+def hash_token(token: str) -> str:
+    """Securely hash token using HMAC-SHA256."""
+    return hmac.new(ENCAPSILATION_KEY.encode(), token.encode(), hashlib.sha256).hexdigest()
+
+# --- Safe base64 decoding helper ---
+def urlsafe_b64decode_padded(data: str) -> bytes:
+    """Decode a base64 string safely, adding padding if needed."""
+    data = data.encode() if isinstance(data, str) else data
+    padding = 4 - (len(data) % 4)
+    if padding != 4:
+        data += b"=" * padding
+    return base64.urlsafe_b64decode(data)
+
+# --- random base32 ---
+def random_base32() -> str:
     return pyotp.random_base32()
\ No newline at end of file
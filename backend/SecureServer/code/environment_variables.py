@@ -1,168 +1,210 @@
-import hashlib, os, base64, sys
-from dotenv import load_dotenv
-from SecureServer.code.logs import server_log
-from SecureServer.code.paths import ENV_FILE
-
-def get_bool_env(name: str, default: bool) -> bool:
-    raw = os.environ.get(name)
-    if raw is None:
-        return default
-    return raw.lower() in ("true", "1", "yes")
-
-def get_int_env(name: str, default: int) -> int:
-    raw = os.environ.get(name)
-    try:
-        return int(raw)
-    except (TypeError, ValueError):
-        return default
-
-def get_str_env(name: str, default: str) -> str:
-    raw = os.environ.get(name)
-    if raw is None:
-        return default
-    # Strip matching quotes (single or double) from start and end
-    if (raw.startswith('"') and raw.endswith('"')) or \
-       (raw.startswith("'") and raw.endswith("'")):
-        raw = raw[1:-1]
-    return raw
-
-def get_list_env(name: str, default: list, separator: str = ",") -> list:
-    """Get a comma-separated list from environment variable"""
-    raw = os.environ.get(name)
-    if raw is None:
-        return default
-    # Strip quotes if present
-    if (raw.startswith('"') and raw.endswith('"')) or \
-       (raw.startswith("'") and raw.endswith("'")):
-        raw = raw[1:-1]
-    # Split and strip whitespace from each item
-    return [item.strip() for item in raw.split(separator) if item.strip()]
-
-def set_env_str(key: str, value: str) -> str:
-    os.environ[key] = value
-    update_env_file(key, value)  # persist in .env
-    return value
-
-def set_env_bool(key: str, value: str) -> bool:
-    norm = value.lower()
-    if norm not in ("true", "false", "1", "0", "yes", "no"):
-        raise ValueError("Invalid boolean value (must be true/false)")
-    os.environ[key] = norm
-    update_env_file(key, norm)
-    return norm in ("true", "1", "yes")
-
-def set_env_int(key: str, value: str) -> int:
-    try:
-        iv = int(value)
-    except ValueError:
-        raise ValueError("Invalid integer value")
-    os.environ[key] = value
-    return iv
-
-def get_env_value(var: str):
-    """Return the current live value of an environment variable."""
-    raw = os.environ.get(var)
-    return raw
-
-def update_env_file(var: str, value: str, env_path=ENV_FILE):
-    """Permanently update an environment variable in the .env file."""
-    try:
-        with open(env_path, "r") as f:
-            lines = f.readlines()
-    except FileNotFoundError:
-        lines = []
-
-    new_lines = []
-    found = False
-
-    for line in lines:
-        if line.strip().startswith(f"{var}="):
-            new_lines.append(f"{var}={value}\n")
-            found = True
-        else:
-            new_lines.append(line)
-
-    if not found:
-        new_lines.append(f"{var}={value}\n")
-
-    with open(env_path, "w") as f:
-        f.writelines(new_lines)
-
-# --- For required cryptographic keys ---
-def get_required_env_key(key_name: str) -> str:
-    """Get a required cryptographic key from environment or fail."""
-    value = os.environ.get(key_name)
-    if not value:
-        raise ValueError(
-            f"CRITICAL: {key_name} environment variable not set. "
-            f"Generate a secure key with: python -c \"import os, base64; print(base64.urlsafe_b64encode(os.urandom(32)).decode())\""
-            f"Set an environment variable with: setx {key_name} \"value\""
-        )
-    if len(value) < 32:
-        raise ValueError(f"CRITICAL: {key_name} must be at least 32 characters")
-    # Hash the provided key to ensure consistent 32-byte length
-    return base64.urlsafe_b64encode(hashlib.sha256(value.encode()).digest()).decode()
-
-# --- Load environment file first ---
-load_dotenv(ENV_FILE, override=True)
-
-# --- Protected environment variables (REQUIRED) ---
-try:
-    SYSTEM_KEY = get_required_env_key("SYSTEM_KEY")  # Server-side main system key
-    INTEGRITY_KEY = get_required_env_key("INTEGRITY_KEY")  # Server-side integrity check key
-    ENCAPSILATION_KEY = get_required_env_key("ENCAPSILATION_KEY")  # Server-side encapsilation key
-    TOKEN_KEY = get_required_env_key("TOKEN_KEY")  # Server-side token encryption key
-except ValueError as e:
-    print(f"FATAL ERROR: {e}")
-    sys.exit(1)
-
-# --- Application Configuration ---
-APP_NAME = get_str_env("APP_NAME", "YourAppName")
-
-# --- Server Configuration ---
-SERVER_HOST = get_str_env("SERVER_HOST", "127.0.0.1")
-SERVER_PORT = get_int_env("SERVER_PORT", 8000)
-HTTPS_HOST = get_str_env("HTTPS_HOST", "0.0.0.0")
-HTTPS_PORT = get_int_env("HTTPS_PORT", 443)
-
-# --- SSL/TLS Configuration ---
-SSL_CERT_FILE = get_str_env("SSL_CERT_FILE", "")
-SSL_KEY_FILE = get_str_env("SSL_KEY_FILE", "")
-SSL_CIPHERS = get_str_env("SSL_CIPHERS", "TLS_AES_256_GCM_SHA384:TLS_CHACHA20_POLY1305_SHA256")
-
-# --- Allowed Hosts (parse comma-separated string) ---
-ALLOWED_HOSTS = get_list_env("ALLOWED_HOSTS", ["localhost", "127.0.0.1", "0.0.0.0"])
-
-# --- Authentication & Security ---
-REPLACE_CORRUPTED_FILES = get_bool_env("REPLACE_CORRUPTED_FILES", True)  # Allow rewriting corrupted encrypted files
-USE_HTTPS = get_bool_env("USE_HTTPS", False)  # Force HTTPS in production
-LOCKOUT_LOGIN_WINDOW = get_int_env("LOCKOUT_LOGIN_WINDOW", 900)  # Lockout duration in seconds
-PW_CHANGE_AUTH_WINDOW = get_int_env("PW_CHANGE_AUTH_WINDOW", 120)  # Password change re-authentication time window in seconds
-MAX_LOGIN_FAILURES = get_int_env("MAX_LOGIN_FAILURES", 5)  # Failed login attempts before lockout
-TOKEN_AGE = get_int_env("TOKEN_AGE", 900)  # Token lifetime in seconds
-
-# --- 2FA Configuration ---
-ENABLE_2FA = get_bool_env("ENABLE_2FA", False)  # Enable 2FA functionality
-REQUIRE_2FA = get_bool_env("REQUIRE_2FA", False)  # Require 2FA for all users
-
-# --- Default User Settings ---
-DEFAULT_USER_2FA = get_bool_env("DEFAULT_USER_2FA", False)  # Enable 2FA by default for new users
-DEFAULT_USER_TAKE_FULL_NAME = get_bool_env("DEFAULT_USER_TAKE_FULL_NAME", True)  # Collect full name during signup
-DEFAULT_USER_TAKE_EMAIL = get_bool_env("DEFAULT_USER_TAKE_EMAIL", False)  # Collect email during signup
-DEFAULT_USER_TAKE_PHONE = get_bool_env("DEFAULT_USER_TAKE_PHONE", False)  # Collect phone during signup
-
-# --- Template User Defaults ---
-TEMPLATE_USER_EMAIL = get_str_env("TEMPLATE_USER_EMAIL", "email@example.com")
-TEMPLATE_USER_PHONE = get_str_env("TEMPLATE_USER_PHONE", "1234567890")
-
-# --- Email Configuration (SMTP) ---
-SMTP_SERVER = get_str_env("SMTP_SERVER", "smtp.gmail.com")
-SMTP_PORT = get_int_env("SMTP_PORT", 587)
-SMTP_USERNAME = get_str_env("SMTP_USERNAME", "")
-SMTP_PASSWORD = get_str_env("SMTP_PASSWORD", "")
-FROM_EMAIL = get_str_env("FROM_EMAIL", "")  # If empty, will use SMTP_USERNAME
-
-# --- SMS Configuration (Twilio) ---
-TWILIO_ACCOUNT_SID = get_str_env("TWILIO_ACCOUNT_SID", "")
-TWILIO_AUTH_TOKEN = get_str_env("TWILIO_AUTH_TOKEN", "")
+import hashlib, os, base64, sys
+from dotenv import load_dotenv
+from SecureServer.code.logs import server_log, set_log_format
+from SecureServer.code.paths import ENV_FILE
+
+def get_bool_env(name: str, default: bool) -> bool:
+    raw = os.environ.get(name)
+    if raw is None:
+        return default
+    return raw.lower() in ("true", "1", "yes")
+
+def get_int_env(name: str, default: int) -> int:
+    raw = os.environ.get(name)
+    try:
+        return int(raw)
+    except (TypeError, ValueError):
+        return default
+
+def get_str_env(name: str, default: str) -> str:
+    raw = os.environ.get(name)
+    if raw is None:
+        return default
+    # Strip matching quotes (single or double) from start and end
+    if (raw.startswith('"') and raw.endswith('"')) or \
+       (raw.startswith("'") and raw.endswith("'")):
+        raw = raw[1:-1]
+    return raw
+
+def get_list_env(name: str, default: list, separator: str = ",") -> list:
+    """Get a comma-separated list from environment variable"""
+    raw = os.environ.get(name)
+    if raw is None:
+        return default
+    # Strip quotes if present
+    if (raw.startswith('"') and raw.endswith('"')) or \
+       (raw.startswith("'") and raw.endswith("'")):
+        raw = raw[1:-1]
+    # Split and strip whitespace from each item
+    return [item.strip() for item in raw.split(separator) if item.strip()]
+
+def set_env_str(key: str, value: str) -> str:
+    os.environ[key] = value
+    update_env_file(key, value)  # persist in .env
+    return value
+
+def set_env_bool(key: str, value: str) -> bool:
+    norm = value.lower()
+    if norm not in ("true", "false", "1", "0", "yes", "no"):
+        raise ValueError("Invalid boolean value (must be true/false)")
+    os.environ[key] = norm
+    update_env_file(key, norm)
+    return norm in ("true", "1", "yes")
+
+def set_env_int(key: str, value: str) -> int:
+    try:
+        iv = int(value)
+    except ValueError:
+        raise ValueError("Invalid integer value")
+    os.environ[key] = value
+    return iv
+
+def get_env_value(var: str):
+    """Return the current live value of an environment variable."""
+    raw = os.environ.get(var)
+    return raw
+
+def update_env_file(var: str, value: str, env_path=ENV_FILE):
+    """Permanently update an environment variable in the .env file."""
+    try:
+        with open(env_path, "r") as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        lines = []
+
+    new_lines = []
+    found = False
+
+    for line in lines:
+        if line.strip().startswith(f"{var}="):
+            new_lines.append(f"{var}={value}\n")
+            found = True
+        else:
+            new_lines.append(line)
+
+    if not found:
+        new_lines.append(f"{var}={value}\n")
+
+    with open(env_path, "w") as f:
+        f.writelines(new_lines)
+
+# --- For required cryptographic keys ---
+def get_required_env_key(key_name: str) -> str:
+    """Get a required cryptographic key from environment or fail."""
+    value = os.environ.get(key_name)
+    if not value:
+        raise ValueError(
+            f"CRITICAL: {key_name} environment variable not set. "
+            f"Generate a secure key with: python -c \"import os, base64; print(base64.urlsafe_b64encode(os.urandom(32)).decode())\""
+            f"Set an environment variable with: setx {key_name} \"value\""
+        )
+    if len(value) < 32:
+        raise ValueError(f"CRITICAL: {key_name} must be at least 32 characters")
+    # Hash the provided key to ensure consistent 32-byte length
+    return base64.urlsafe_b64encode(hashlib.sha256(value.encode()).digest()).decode()
+
+# --- Load environment file first ---
+load_dotenv(ENV_FILE, override=True)
+
+# --- Protected environment variables (REQUIRED) ---
+try:
+    SYSTEM_KEY = get_required_env_key("SYSTEM_KEY")  # Server-side main system key
+    INTEGRITY_KEY = get_required_env_key("INTEGRITY_KEY")  # Server-side integrity check key
+    ENCAPSILATION_KEY = get_required_env_key("ENCAPSILATION_KEY")  # Server-side encapsilation key
+    TOKEN_KEY = get_required_env_key("TOKEN_KEY")  # Server-side token encryption key
+    SESSION_KEY = get_required_env_key("SESSION_KEY") if get_bool_env("PERSIST_SESSIONS", False) else None  # Session store encryption key (only needed with PERSIST_SESSIONS)
+except ValueError as e:
+    print(f"FATAL ERROR: {e}")
+    sys.exit(1)
+
+# --- Application Configuration ---
+APP_NAME = get_str_env("APP_NAME", "YourAppName")
+
+# --- Server Configuration ---
+SERVER_HOST = get_str_env("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = get_int_env("SERVER_PORT", 8000)
+SERVER_WORKERS = get_int_env("SERVER_WORKERS", 1)  # Worker processes sharing the port (>1 needs fork, i.e. not Windows)
+WARM_RESTART = get_bool_env("WARM_RESTART", False)  # SIGHUP re-executes the server in place, keeping the listening socket (not Windows)
+HTTPS_HOST = get_str_env("HTTPS_HOST", "0.0.0.0")
+HTTPS_PORT = get_int_env("HTTPS_PORT", 443)
+
+# --- SSL/TLS Configuration ---
+SSL_CERT_FILE = get_str_env("SSL_CERT_FILE", "")
+SSL_KEY_FILE = get_str_env("SSL_KEY_FILE", "")
+SSL_CIPHERS = get_str_env("SSL_CIPHERS", "TLS_AES_256_GCM_SHA384:TLS_CHACHA20_POLY1305_SHA256")
+
+# --- Allowed Hosts (parse comma-separated string) ---
+ALLOWED_HOSTS = get_list_env("ALLOWED_HOSTS", ["localhost", "127.0.0.1", "0.0.0.0"])
+
+# --- Security Headers (empty = not sent) ---
+CONTENT_SECURITY_POLICY = get_str_env("CONTENT_SECURITY_POLICY", "default-src 'self'; script-src 'self'; style-src 'self' 'unsafe-inline'; frame-ancestors 'none';")
+X_FRAME_OPTIONS = get_str_env("X_FRAME_OPTIONS", "DENY")
+X_CONTENT_TYPE_OPTIONS = get_str_env("X_CONTENT_TYPE_OPTIONS", "nosniff")
+REFERRER_POLICY = get_str_env("REFERRER_POLICY", "strict-origin-when-cross-origin")
+STRICT_TRANSPORT_SECURITY = get_str_env("STRICT_TRANSPORT_SECURITY", "max-age=31536000; includeSubDomains; preload")
+
+# --- Static Files ---
+STATIC_PIPELINE = get_bool_env("STATIC_PIPELINE", True)  # Serve the frontend from a fingerprinted, precompressed build (built on startup when sources change)
+STATIC_CACHE_SIZE = get_int_env("STATIC_CACHE_SIZE", 16 * 1024 * 1024)  # Bytes of static files kept in memory per worker, least recently used dropped first (0 = off)
+STATIC_CACHE_MAX_FILE = get_int_env("STATIC_CACHE_MAX_FILE", 512 * 1024)  # Files larger than this are always streamed from disk
+
+# --- Authentication & Security ---
+REPLACE_CORRUPTED_FILES = get_bool_env("REPLACE_CORRUPTED_FILES", True)  # Allow rewriting corrupted encrypted files
+USE_HTTPS = get_bool_env("USE_HTTPS", False)  # Force HTTPS in production
+LOCKOUT_LOGIN_WINDOW = get_int_env("LOCKOUT_LOGIN_WINDOW", 900)  # Lockout duration in seconds
+PW_CHANGE_AUTH_WINDOW = get_int_env("PW_CHANGE_AUTH_WINDOW", 120)  # Password change re-authentication time window in seconds
+MAX_LOGIN_FAILURES = get_int_env("MAX_LOGIN_FAILURES", 5)  # Failed login attempts before lockout
+LOCKOUT_SNAPSHOT_INTERVAL = get_int_env("LOCKOUT_SNAPSHOT_INTERVAL", 5)  # Seconds between failed attempt snapshots to disk (0 = write on every change)
+SESSION_SWEEP_INTERVAL = get_int_env("SESSION_SWEEP_INTERVAL", 60)  # Seconds between expired session sweeps (0 = off)
+TOKEN_SWEEP_INTERVAL = get_int_env("TOKEN_SWEEP_INTERVAL", 60)  # Seconds between expired token sweeps (0 = off)
+LOCKOUT_SWEEP_INTERVAL = get_int_env("LOCKOUT_SWEEP_INTERVAL", 300)  # Seconds between sweeps of failed logins outside the lockout window (0 = off)
+RATE_LIMIT_MAX_KEYS = get_int_env("RATE_LIMIT_MAX_KEYS", 100000)  # Max rate limited (route, client) pairs kept in memory (least recently seen are dropped)
+TOKEN_AGE = get_int_env("TOKEN_AGE", 900)  # Token lifetime in seconds
+LOGIN_KEY_SCHEDULE = get_bool_env("LOGIN_KEY_SCHEDULE", True)  # One password stretch per login (new hashes + upgrade of old ones on login)
+PERSIST_SESSIONS = get_bool_env("PERSIST_SESSIONS", False)  # Keep sessions in an encrypted sessions.db so a restart does not log everyone out
+SESSION_CACHE_SIZE = get_int_env("SESSION_CACHE_SIZE", 10000)  # Max persisted sessions held in memory (the rest are loaded on first use)
+
+# --- Storage ---
+CRYPTO_POOL = get_str_env("CRYPTO_POOL", "process")  # "process" or "thread" executor for password stretching
+CRYPTO_WORKERS = get_int_env("CRYPTO_WORKERS", 0)  # Crypto executor size (0 = one per CPU core)
+WRITE_BATCH_WINDOW = get_int_env("WRITE_BATCH_WINDOW", 0)  # Milliseconds a data file write waits to share one commit with writes from other threads (0 = commit on the calling thread)
+WRITE_FSYNC = get_bool_env("WRITE_FSYNC", True)  # fsync data files (and their directory) on every commit
+USER_STORAGE = get_str_env("USER_STORAGE", "json")  # "json" (single users.json), "sharded" (one encrypted file per user) or "sqlite"
+VAULT_CHUNK_SIZE = get_int_env("VAULT_CHUNK_SIZE", 64 * 1024)  # Plaintext bytes per encrypted vault chunk (existing vaults keep the size they were written with)
+VAULT_MAX_SIZE = get_int_env("VAULT_MAX_SIZE", 64 * 1024 * 1024)  # Largest vault accepted by /upload_vault, in bytes
+
+# --- Logging ---
+LOG_QUEUE_SIZE = get_int_env("LOG_QUEUE_SIZE", 10000)  # Log records waiting for the log writer thread (0 = format and write on the calling thread)
+LOG_QUEUE_POLICY = get_str_env("LOG_QUEUE_POLICY", "drop")  # Full log queue: "drop" access/debug lines (counted and reported in the log; other lines still wait) or "block" the caller for every line
+LOG_FORMAT = get_str_env("LOG_FORMAT", "text")  # server.log lines: "text" (coloured) or "json" (one object per line, see code/log_query.py)
+set_log_format(LOG_FORMAT)  # applies to every process that logs, including the adminPortal tools
+
+# --- Admin Portal ---
+ADMIN_DAEMON = get_bool_env("ADMIN_DAEMON", True)  # Serve adminPortal commands from a long-lived process on a local Unix socket (started by the first command; not Windows)
+ADMIN_DAEMON_IDLE = get_int_env("ADMIN_DAEMON_IDLE", 900)  # Seconds without a command before the admin daemon exits (0 = never)
+
+# --- 2FA Configuration ---
+ENABLE_2FA = get_bool_env("ENABLE_2FA", False)  # Enable 2FA functionality
+REQUIRE_2FA = get_bool_env("REQUIRE_2FA", False)  # Require 2FA for all users
+
+# --- Default User Settings ---
+DEFAULT_USER_2FA = get_bool_env("DEFAULT_USER_2FA", False)  # Enable 2FA by default for new users
+DEFAULT_USER_TAKE_FULL_NAME = get_bool_env("DEFAULT_USER_TAKE_FULL_NAME", True)  # Collect full name during signup
+DEFAULT_USER_TAKE_EMAIL = get_bool_env("DEFAULT_USER_TAKE_EMAIL", False)  # Collect email during signup
+DEFAULT_USER_TAKE_PHONE = get_bool_env("DEFAULT_USER_TAKE_PHONE", False)  # Collect phone during signup
+
+# --- Template User Defaults ---
+TEMPLATE_USER_EMAIL = get_str_env("TEMPLATE_USER_EMAIL", "email@example.com")
+TEMPLATE_USER_PHONE = get_str_env("TEMPLATE_USER_PHONE", "1234567890")
+
+# --- Email Configuration (SMTP) ---
+SMTP_SERVER = get_str_env("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = get_int_env("SMTP_PORT", 587)
+SMTP_USERNAME = get_str_env("SMTP_USERNAME", "")
+SMTP_PASSWORD = get_str_env("SMTP_PASSWORD", "")
+FROM_EMAIL = get_str_env("FROM_EMAIL", "")  # If empty, will use SMTP_USERNAME
+
+# --- SMS Configuration (Twilio) ---
+TWILIO_ACCOUNT_SID = get_str_env("TWILIO_ACCOUNT_SID", "")
+TWILIO_AUTH_TOKEN = get_str_env("TWILIO_AUTH_TOKEN", "")
 TWILIO_PHONE_NUMBER = get_str_env("TWILIO_PHONE_NUMBER", "")
\ No newline at end of file
@@ -1,86 +1,195 @@
-from pathlib import Path
-import json, hmac, base64, os, threading
-from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-
-from SecureServer.code.encryption import calculate_hmac, load_encrypted_json, write_encrypted_json
-from SecureServer.code.environment_variables import REPLACE_CORRUPTED_FILES, TOKEN_KEY
-from SecureServer.code.paths import USERS_FILE, TOKENS_FILE, FAILED_LOGINS_FILE
-from SecureServer.code.logs import server_log
-
-def load_users():
-    """Load users with integrity check."""
-    container = load_encrypted_json(USERS_FILE)
-
-    # Verify HMAC
-    data_str = json.dumps(container.get("data", []), indent=2, sort_keys=True)
-    if not hmac.compare_digest(container.get("signature", ""), calculate_hmac(data_str)):
-        server_log("CRITICAL", "Users file integrity check failed!")
-        if REPLACE_CORRUPTED_FILES:
-            server_log("RESETTING", "Users file due to integrity error")
-            fresh = {"data": [], "signature": calculate_hmac(json.dumps([]))}
-            write_encrypted_json(USERS_FILE, fresh)
-            return []
-        else:
-            raise ValueError("Data integrity violation detected")
-
-    return container["data"]
-def save_users(users):
-    """Save users with HMAC and encryption."""
-    payload = {
-        "data": users,
-        "signature": calculate_hmac(json.dumps(users, indent=2, sort_keys=True))
-    }
-    write_encrypted_json(USERS_FILE, payload)
-
-def load_tokens():
-    """Load and decrypt the tokens dictionary from file."""
-    if not os.path.exists(TOKENS_FILE):
-        save_tokens({})
-        return {}
-
-    try:
-        aesgcm = AESGCM(base64.urlsafe_b64decode(TOKEN_KEY))  # decode to bytes
-        with open(TOKENS_FILE, "rb") as f:
-            data = f.read()
-            nonce, ciphertext = data[:12], data[12:]
-            decrypted = aesgcm.decrypt(nonce, ciphertext, None)
-            return json.loads(decrypted.decode())
-    except Exception as e:
-        server_log("CORRUPTED ENCRYPTED FILE", 
-            f"{Path(TOKENS_FILE).name}: {type(e).__name__}")
-        if REPLACE_CORRUPTED_FILES:
-            server_log("RESETTING ENCRYPTED FILE", 
-                f"{Path(TOKENS_FILE).name}: {type(e).__name__}")
-            save_tokens({})
-        return {}
-def save_tokens(tokens):
-    """Encrypt and save the tokens dictionary to file."""
-    try:
-        aesgcm = AESGCM(base64.urlsafe_b64decode(TOKEN_KEY))  # decode to bytes
-        nonce = os.urandom(12)
-        encrypted = aesgcm.encrypt(nonce, json.dumps(tokens).encode(), None)
-        with open(TOKENS_FILE, "wb") as f:
-            f.write(nonce + encrypted)
-    except Exception as e:
-        server_log("ERROR", f"Failed to save tokens: {type(e).__name__}")
-        if REPLACE_CORRUPTED_FILES:
-            print(f"RESETTING encrypted file: {TOKENS_FILE}")
-            with open(TOKENS_FILE, "wb") as f:
-                empty_tokens = {}
-                nonce = os.urandom(12)
-                encrypted = aesgcm.encrypt(nonce, json.dumps(empty_tokens).encode(), None)
-                f.write(nonce + encrypted)
-
-
-def load_failed_attempts():
-    """Load failed attempts with encryption."""
-    container = load_encrypted_json(FAILED_LOGINS_FILE, True)
-    return container.get("data", {})
-
-def save_failed_attempts(attempts):
-    """Save failed attempts with encryption."""
-    payload = {
-        "data": attempts,
-        "signature": calculate_hmac(json.dumps(attempts, indent=2, sort_keys=True))
-    }
-    write_encrypted_json(FAILED_LOGINS_FILE, payload)
\ No newline at end of file
+from pathlib import Path
+import json, hmac, base64, os, threading
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from SecureServer.code.encryption import calculate_hmac, load_encrypted_json, write_encrypted_json, encrypt_vault, decrypt_vault, basic_hash
+from SecureServer.code.integrity import MerkleTree, sign_record, verify_record, sign_root
+from SecureServer.code.environment_variables import REPLACE_CORRUPTED_FILES, TOKEN_KEY, SYSTEM_KEY
+from SecureServer.code.paths import USERS_FILE, USERS_DIR, VAULTS_DIR, USERS_INDEX_FILE, TOKENS_FILE, FAILED_LOGINS_FILE
+from SecureServer.code.logs import server_log
+from SecureServer.code.file_writer import writer
+
+def load_signed_users():
+    """
+    Load users and their per-record signatures.
+    Only the root signature is checked here; records are checked with verify_record on use.
+    Returns (users, leaves).
+    """
+    container = load_encrypted_json(USERS_FILE)
+    users = container.get("data", [])
+
+    if "leaves" in container:
+        leaves = container["leaves"]
+        valid = len(leaves) == len(users) and hmac.compare_digest(
+            container.get("signature", ""), sign_root(MerkleTree(leaves)))
+    else:
+        # Legacy whole-file signature, upgraded to per-record signatures on next save
+        data_str = json.dumps(users, indent=2, sort_keys=True)
+        valid = hmac.compare_digest(container.get("signature", ""), calculate_hmac(data_str))
+        leaves = [sign_record(u) for u in users] if valid else []
+
+    if not valid:
+        server_log("CRITICAL", "Users file integrity check failed!")
+        if REPLACE_CORRUPTED_FILES:
+            server_log("RESETTING", "Users file due to integrity error")
+            save_signed_users([], MerkleTree([]))
+            return [], []
+        else:
+            raise ValueError("Data integrity violation detected")
+
+    return users, leaves
+
+def save_signed_users(users, tree):
+    """Save users with already computed record signatures."""
+    payload = {
+        "data": users,
+        "leaves": tree.leaves(),
+        "signature": sign_root(tree)
+    }
+    write_encrypted_json(USERS_FILE, payload)
+
+def load_users():
+    """Load users with integrity check."""
+    users, leaves = load_signed_users()
+
+    # Verify every record
+    for user, leaf in zip(users, leaves):
+        if not verify_record(user, leaf):
+            server_log("CRITICAL", "Users file integrity check failed!")
+            raise ValueError("Data integrity violation detected")
+
+    return users
+def save_users(users):
+    """Save users with HMAC and encryption."""
+    save_signed_users(users, MerkleTree([sign_record(u) for u in users]))
+
+# --- Sharded user storage ---
+def user_shard_path(user_id: str) -> Path:
+    """Shard file for a user record (hashed so ids never touch the path)."""
+    return USERS_DIR / f"{basic_hash(user_id)}.json"
+
+def vault_shard_path(user_id: str) -> Path:
+    return VAULTS_DIR / f"{basic_hash(user_id)}.json"
+
+def _read_shard(path: Path):
+    raw = writer.read(path)
+    if raw is None:
+        return None
+    return json.loads(decrypt_vault(raw.decode().strip(), SYSTEM_KEY))
+
+def _write_shard(path: Path, container: dict):
+    writer.write(path, encrypt_vault(json.dumps(container), SYSTEM_KEY).encode())
+
+def load_user_shard(user_id: str):
+    """Load one user record (without its vault). Returns None if missing."""
+    container = _read_shard(user_shard_path(user_id))
+    if container is None:
+        return None
+    record = container.get("data", {})
+    if record.get("id") != user_id or not verify_record(record, container.get("signature", "")):
+        server_log("CRITICAL", f"User shard integrity check failed for {user_id}!")
+        raise ValueError("Data integrity violation detected")
+    return record
+
+def save_user_shard(record: dict):
+    """Save one user record (the vault is stored separately)."""
+    _write_shard(user_shard_path(record["id"]), {"data": record, "signature": sign_record(record)})
+
+def load_vault_shard(user_id: str) -> str:
+    container = _read_shard(vault_shard_path(user_id))
+    if container is None:
+        return ""
+    vault = container.get("data", "")
+    if not hmac.compare_digest(container.get("signature", ""), calculate_hmac(user_id + vault)):
+        server_log("CRITICAL", f"Vault shard integrity check failed for {user_id}!")
+        raise ValueError("Data integrity violation detected")
+    return vault
+
+def save_vault_shard(user_id: str, vault: str):
+    _write_shard(vault_shard_path(user_id), {"data": vault, "signature": calculate_hmac(user_id + vault)})
+
+def delete_user_shards(user_id: str):
+    for path in (user_shard_path(user_id), vault_shard_path(user_id)):
+        writer.delete(path)
+
+def load_users_index():
+    """
+    Load the username -> id index for sharded storage and the user id ->
+    record digest map signed with it. Returns (index, digests), digests None
+    for an index written before digests were kept, or None if there is no
+    index yet.
+    """
+    if not writer.exists(USERS_INDEX_FILE):
+        return None
+    container = load_encrypted_json(USERS_INDEX_FILE, True)
+    index = container.get("data", {})
+    digests = container.get("digests")
+    signed = index if digests is None else {"data": index, "digests": digests}
+    if not hmac.compare_digest(container.get("signature", ""), calculate_hmac(json.dumps(signed, sort_keys=True))):
+        server_log("CRITICAL", "Users index integrity check failed!")
+        raise ValueError("Data integrity violation detected")
+    return index, digests
+
+def save_users_index(index: dict, digests: dict):
+    payload = {
+        "data": index,
+        "digests": digests,
+        "signature": calculate_hmac(json.dumps({"data": index, "digests": digests}, sort_keys=True))
+    }
+    write_encrypted_json(USERS_INDEX_FILE, payload)
+
+def load_tokens():
+    """Load and decrypt the tokens dictionary from file."""
+    data = writer.read(TOKENS_FILE)
+    if data is None:
+        save_tokens({})
+        return {}
+
+    try:
+        aesgcm = AESGCM(base64.urlsafe_b64decode(TOKEN_KEY))  # decode to bytes
+        nonce, ciphertext = data[:12], data[12:]
+        decrypted = aesgcm.decrypt(nonce, ciphertext, None)
+        return json.loads(decrypted.decode())
+    except Exception as e:
+        server_log("CORRUPTED ENCRYPTED FILE", 
+            f"{Path(TOKENS_FILE).name}: {type(e).__name__}")
+        if REPLACE_CORRUPTED_FILES:
+            server_log("RESETTING ENCRYPTED FILE", 
+                f"{Path(TOKENS_FILE).name}: {type(e).__name__}")
+            save_tokens({})
+        return {}
+def save_tokens(tokens):
+    """Encrypt and save the tokens dictionary to file."""
+    try:
+        aesgcm = AESGCM(base64.urlsafe_b64decode(TOKEN_KEY))  # decode to bytes
+        nonce = os.urandom(12)
+        encrypted = aesgcm.encrypt(nonce, json.dumps(tokens).encode(), None)
+        writer.write(TOKENS_FILE, nonce + encrypted)
+    except Exception as e:
+        server_log("ERROR", f"Failed to save tokens: {type(e).__name__}")
+        if REPLACE_CORRUPTED_FILES:
+            print(f"RESETTING encrypted file: {TOKENS_FILE}")
+            empty_tokens = {}
+            nonce = os.urandom(12)
+            encrypted = aesgcm.encrypt(nonce, json.dumps(empty_tokens).encode(), None)
+            writer.write(TOKENS_FILE, nonce + encrypted)
+
+
+def load_failed_attempts(file=FAILED_LOGINS_FILE):
+    """Load failed attempts with encryption."""
+    container = load_encrypted_json(file, True)
+    return container.get("data", {})
+
+def load_failed_attempts_and_clears(file=FAILED_LOGINS_FILE):
+    """(failed attempts, clears): a clear maps a username ("" = everyone) to the time its earlier failures were cleared."""
+    container = load_encrypted_json(file, True)
+    return container.get("data", {}), container.get("cleared", {})
+
+def save_failed_attempts(attempts, file=FAILED_LOGINS_FILE, cleared=None):
+    """Save failed attempts (and recent clears) with encryption."""
+    payload = {
+        "data": attempts,
+        "cleared": cleared or {},
+        "signature": calculate_hmac(json.dumps(attempts, indent=2, sort_keys=True))
+    }
+    write_encrypted_json(file, payload)
\ No newline at end of file
@@ -0,0 +1,192 @@
+import os, time, atexit, tempfile, threading
+from pathlib import Path
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: single worker only, nothing to coordinate
+    fcntl = None
+
+from SecureServer.code.environment_variables import WRITE_BATCH_WINDOW, WRITE_FSYNC
+from SecureServer.code.logs import server_log
+
+def atomic_write(path, data: bytes, fsync: bool = WRITE_FSYNC):
+    """Write to a temp file next to path, then os.replace it over the target."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+    if fsync:
+        fsync_dir(path.parent)
+
+def fsync_dir(directory):
+    """Make a rename in directory durable (not possible on Windows)."""
+    if os.name == "nt":
+        return
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+@contextmanager
+def file_lock(path):
+    """Exclusive lock (across processes) on path's .lock file, for read-modify-write cycles."""
+    if fcntl is None:
+        yield
+        return
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(path.name + ".lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+class _Batch:
+    """One group commit: writers wait on done, then check errors for their path."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.errors = {}  # path -> exception
+
+class GroupCommitWriter:
+    """
+    Group commit of data file writes. write() queues the data and blocks until
+    the commit holding it is on disk, so a save is never acknowledged before
+    it is durable, and a caller holding file_lock still holds it when its data
+    lands. Writes queued within one window (from other threads) share a
+    commit, and only the latest data for a path is written. A window of 0
+    writes synchronously on the calling thread.
+    """
+    def __init__(self, window_ms: int = WRITE_BATCH_WINDOW, fsync: bool = WRITE_FSYNC):
+        self._window = window_ms / 1000
+        self._fsync = fsync
+        self._pending = {}  # path -> bytes, for the next commit
+        self._inflight = {}  # path -> bytes, being committed
+        self._batch = None  # the _Batch pending writes wait on
+        self._written = {}  # path -> (mtime_ns, size) of our last commit
+        self._lock = threading.Lock()
+        self._commit_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def set_window(self, window_ms: int):
+        """Change the coalescing window; 0 flushes and writes synchronously from now on."""
+        self._window = window_ms / 1000
+        if self._window <= 0:
+            self.flush()
+
+    def _after_fork(self):
+        # The commit thread does not survive fork(); start a fresh one on demand
+        self._lock = threading.Lock()
+        self._commit_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pending = {}
+        self._inflight = {}
+        self._batch = None
+
+    def write(self, path, data: bytes):
+        """Write data to path atomically; returns once it is committed. Raises what the commit raised."""
+        path = str(path)
+        if self._window <= 0:
+            with self._commit_lock:
+                self._commit(path, data)
+            return
+
+        with self._lock:
+            self._pending[path] = data
+            if self._batch is None:
+                self._batch = _Batch()
+            batch = self._batch
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        batch.done.wait()
+        if path in batch.errors:
+            raise batch.errors[path]
+
+    def read(self, path):
+        """Return queued or on-disk bytes for path, or None if it does not exist."""
+        with self._lock:
+            data = self._pending.get(str(path), self._inflight.get(str(path)))
+        if data is not None:
+            return data
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def exists(self, path) -> bool:
+        with self._lock:
+            if str(path) in self._pending or str(path) in self._inflight:
+                return True
+        return os.path.exists(path)
+
+    def delete(self, path):
+        with self._commit_lock:
+            with self._lock:
+                self._pending.pop(str(path), None)
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def flush(self):
+        """Commit everything queued so far and release the writers waiting on it."""
+        with self._commit_lock:
+            with self._lock:
+                batch, self._batch = self._batch, None
+                self._inflight, self._pending = self._pending, {}
+            try:
+                for path, data in self._inflight.items():
+                    try:
+                        self._commit(path, data)
+                    except Exception as e:
+                        server_log("ERROR", f"Group commit failed: {type(e).__name__}")
+                        if batch is not None:
+                            batch.errors[path] = e
+            finally:
+                with self._lock:
+                    self._inflight = {}
+                if batch is not None:
+                    batch.done.set()
+
+    def written_stamp(self, path):
+        """(mtime_ns, size) of the file as this writer last left it, or None."""
+        with self._lock:
+            return self._written.get(str(path))
+
+    def _commit(self, path: str, data: bytes):
+        atomic_write(path, data, self._fsync)
+        st = os.stat(path)
+        with self._lock:
+            self._written[path] = (st.st_mtime_ns, st.st_size)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            time.sleep(self._window)
+            self._wake.clear()
+            self.flush()
+
+writer = GroupCommitWriter()
+atexit.register(writer.flush)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=writer._after_fork)
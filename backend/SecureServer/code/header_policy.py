@@ -0,0 +1,56 @@
+from SecureServer.code.environment_variables import (
+    CONTENT_SECURITY_POLICY, X_FRAME_OPTIONS, X_CONTENT_TYPE_OPTIONS,
+    REFERRER_POLICY, STRICT_TRANSPORT_SECURITY
+)
+
+def default_security_headers() -> dict:
+    """The security headers configured in environment_variables."""
+    return {
+        "Content-Security-Policy": CONTENT_SECURITY_POLICY,
+        "X-Frame-Options": X_FRAME_OPTIONS,
+        "X-Content-Type-Options": X_CONTENT_TYPE_OPTIONS,
+        "Referrer-Policy": REFERRER_POLICY,
+        "Strict-Transport-Security": STRICT_TRANSPORT_SECURITY,
+    }
+
+class HeaderSet:
+    """Headers encoded once as raw ASGI (bytes, bytes) pairs."""
+    __slots__ = ("headers", "pairs", "names")
+
+    def __init__(self, headers: dict):
+        self.headers = dict(headers)
+        # Empty or None values are not sent
+        self.pairs = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers.items() if value]
+        self.names = frozenset(name for name, _ in self.pairs)
+
+    def apply(self, raw_headers) -> list:
+        """raw_headers with these headers added (replacing any with the same name)."""
+        out = [h for h in raw_headers if h[0].lower() not in self.names]
+        out.extend(self.pairs)
+        return out
+
+class HeaderPolicy:
+    """
+    The security headers for every response, shared by SecurityHeadersMiddleware
+    and StaticFilesWithHeaders. Routes can override headers by path prefix;
+    a response gets the set of the longest matching prefix.
+    """
+    def __init__(self, headers: dict = None):
+        self.default = HeaderSet(default_security_headers() if headers is None else headers)
+        self._overrides = []  # (path prefix, HeaderSet), longest prefix first
+
+    def override(self, path_prefix: str, headers: dict) -> None:
+        """Under path_prefix, replace the given headers (None drops one) and keep the rest."""
+        merged = {**self.default.headers, **headers}
+        self._overrides = [(p, s) for p, s in self._overrides if p != path_prefix]
+        self._overrides.append((path_prefix, HeaderSet(merged)))
+        self._overrides.sort(key=lambda item: len(item[0]), reverse=True)
+
+    def for_path(self, path: str) -> HeaderSet:
+        for prefix, header_set in self._overrides:
+            if path.startswith(prefix):
+                return header_set
+        return self.default
+
+    def apply(self, raw_headers, path: str = "/") -> list:
+        return self.for_path(path).apply(raw_headers)
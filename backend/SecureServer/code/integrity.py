@@ -0,0 +1,75 @@
+import hmac, json, hashlib
+
+from SecureServer.code.encryption import calculate_hmac
+
+# --- Per-record signatures ---
+def sign_record(record: dict) -> str:
+    """HMAC of a single record (the leaf of the Merkle tree)."""
+    return calculate_hmac(json.dumps(record, sort_keys=True))
+
+def verify_record(record: dict, signature: str) -> bool:
+    return hmac.compare_digest(signature, sign_record(record))
+
+def sign_root(tree: "MerkleTree") -> str:
+    """HMAC binding the tree root to the record count."""
+    return calculate_hmac(f"{len(tree)}:{tree.root.hex()}")
+
+# --- Merkle tree over record signatures ---
+class MerkleTree:
+    """
+    Binary hash tree over hex leaf signatures.
+    Changing or appending one leaf only re-hashes the path to the root.
+    An odd node at the end of a level is carried up unchanged.
+    """
+    def __init__(self, leaves: list):
+        self._levels = [[bytes.fromhex(l) for l in leaves]]
+        level = self._levels[0]
+        while len(level) > 1:
+            level = [self._parent(level, j) for j in range((len(level) + 1) // 2)]
+            self._levels.append(level)
+
+    def __len__(self):
+        return len(self._levels[0])
+
+    @staticmethod
+    def _parent(level: list, j: int) -> bytes:
+        left = level[2 * j]
+        if 2 * j + 1 < len(level):
+            return hashlib.sha256(b"\x01" + left + level[2 * j + 1]).digest()
+        return left
+
+    @property
+    def root(self) -> bytes:
+        if not self._levels[0]:
+            return hashlib.sha256(b"").digest()
+        return self._levels[-1][0]
+
+    def leaf(self, index: int) -> str:
+        return self._levels[0][index].hex()
+
+    def leaves(self) -> list:
+        return [l.hex() for l in self._levels[0]]
+
+    def update(self, index: int, leaf: str):
+        self._levels[0][index] = bytes.fromhex(leaf)
+        self._rehash(index)
+
+    def append(self, leaf: str):
+        self._levels[0].append(bytes.fromhex(leaf))
+        self._rehash(len(self._levels[0]) - 1)
+
+    def _rehash(self, index: int):
+        depth = 0
+        while len(self._levels[depth]) > 1:
+            j = index // 2
+            if depth + 1 == len(self._levels):
+                self._levels.append([])
+            parents = self._levels[depth + 1]
+            node = self._parent(self._levels[depth], j)
+            if j < len(parents):
+                parents[j] = node
+            else:
+                parents.append(node)
+            index = j
+            depth += 1
+        del self._levels[depth + 1:]
@@ -0,0 +1,142 @@
+"""
+Cursor-paged, filtered listings of users, sessions and failed login attempts,
+shared by the adminPortal list commands and /get_all_users. Each listing is a
+generator in a stable key order (user id, token id, username), so a page only
+holds its own items and paging through a store is one pass over it. A cursor
+is the opaque key of the last item served.
+"""
+import time, base64, bisect, binascii, itertools
+
+from SecureServer.code.user_store import user_repository
+from SecureServer.code.token_store import token_repository
+from SecureServer.code.lockout_store import lockout_tracker
+
+LISTING_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+TIME_FORMATS = (LISTING_TIME_FORMAT, "%Y-%m-%d %H:%M", "%Y-%m-%d")
+
+# --- Parameters ---
+def encode_cursor(key: str) -> str:
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str | None) -> str | None:
+    """The key in a cursor (None for the first page). ValueError if it is not a cursor."""
+    if not cursor:
+        return None
+    try:
+        return base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+def parse_limit(value, maximum: int = None) -> int | None:
+    """A page size (None = everything). ValueError unless it is a positive integer (up to maximum)."""
+    if value is None:
+        return None
+    limit = int(value)
+    if limit <= 0 or (maximum is not None and limit > maximum):
+        raise ValueError("Invalid limit")
+    return limit
+
+def parse_flag(value) -> bool | None:
+    """true/false (also 1/0, yes/no) as a bool, None if not given. ValueError otherwise."""
+    if value is None:
+        return None
+    v = str(value).strip().lower()
+    if v in ("true", "1", "yes"):
+        return True
+    if v in ("false", "0", "no"):
+        return False
+    raise ValueError(f"Invalid flag: {value}")
+
+def parse_time(value: str | None) -> float | None:
+    """A since/until value: epoch seconds or local "YYYY-MM-DD[ HH:MM[:SS]]". ValueError otherwise."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    value = value.strip().replace("T", " ")
+    for fmt in TIME_FORMATS:
+        try:
+            return time.mktime(time.strptime(value, fmt))
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid time: {value}")
+
+def format_ts(ts):
+    if ts is None:
+        return None
+    return time.strftime(LISTING_TIME_FORMAT, time.localtime(ts))
+
+def page(items, limit: int | None, key) -> tuple:
+    """
+    (items, next cursor). Without a limit the iterator is passed through and
+    there is no next page; otherwise the first limit items as a list, with a
+    cursor only if more follow.
+    """
+    if limit is None:
+        return items, None
+    taken = list(itertools.islice(items, limit + 1))
+    if len(taken) <= limit:
+        return taken, None
+    taken = taken[:limit]
+    return taken, encode_cursor(key(taken[-1]))
+
+# --- Listings ---
+def user_key(user: dict) -> str:
+    return user["id"]
+
+def users(after: str = None, prefix: str = None, admin: bool = None, repository=user_repository):
+    """Users in id order after the id `after`, optionally by username prefix and app admin flag."""
+    for user in repository.scan(after):
+        if prefix and not user.get("username", "").startswith(prefix):
+            continue
+        if admin is not None and bool(user.get("admin", False)) != admin:
+            continue
+        yield user
+
+def session_key(item: tuple) -> str:
+    return item[0]["id"]
+
+def sessions(after: str = None, prefix: str = None, since: float = None, until: float = None):
+    """
+    (token, username) in token id order after the token id `after`, optionally by
+    username prefix and login time range. Usernames come from one pass over the
+    users, not a user lookup per token; username is None for a removed user.
+    """
+    names = user_repository.usernames()
+    for token in token_repository.scan(after):
+        username = names.get(token.get("user_id"))
+        if prefix and not (username or "").startswith(prefix):
+            continue
+        auth_time = token.get("auth_time")
+        if since is not None and (auth_time is None or auth_time < since):
+            continue
+        if until is not None and (auth_time is None or auth_time > until):
+            continue
+        yield token, username
+
+def attempt_key(item: tuple) -> str:
+    return item[0]
+
+def attempts(after: str = None, prefix: str = None, since: float = None, until: float = None):
+    """
+    (username, failure timestamps) in username order after the username `after`,
+    optionally by username prefix. With a time range only the failures inside it
+    are kept, and users without any are skipped.
+    """
+    failures = lockout_tracker.all()
+    names = sorted(failures)
+    start = bisect.bisect_right(names, after) if after is not None else 0
+    if prefix:
+        start = max(start, bisect.bisect_left(names, prefix))
+    for username in itertools.islice(names, start, None):
+        if prefix and not username.startswith(prefix):
+            break  # sorted: no later name has the prefix
+        timestamps = failures[username]
+        if since is not None or until is not None:
+            timestamps = [ts for ts in timestamps
+                          if (since is None or ts >= since) and (until is None or ts <= until)]
+            if not timestamps:
+                continue
+        yield username, timestamps
@@ -0,0 +1,219 @@
+import os, time, heapq, atexit, threading
+from collections import deque
+
+from SecureServer.code.file_handling import load_failed_attempts_and_clears, save_failed_attempts
+from SecureServer.code.file_writer import file_lock
+from SecureServer.code.environment_variables import MAX_LOGIN_FAILURES, LOCKOUT_LOGIN_WINDOW, LOCKOUT_SNAPSHOT_INTERVAL
+from SecureServer.code.paths import FAILED_LOGINS_FILE
+from SecureServer.code.logs import server_log
+
+CLEARED_ALL = ""  # clear key for "every user" (not a valid username)
+
+class LockoutTracker:
+    """
+    In-memory view of failed_attempts.json.
+    Each username keeps a ring buffer of its last MAX_LOGIN_FAILURES failure
+    times, so a lockout check is O(1). A global expiry heap drops failures
+    older than LOCKOUT_LOGIN_WINDOW. Changes are snapshotted to disk at most
+    once per LOCKOUT_SNAPSHOT_INTERVAL seconds (and at exit), and the file is
+    reloaded when another process (adminPortal scripts) rewrites it.
+
+    Processes merge instead of overwriting each other: a snapshot re-reads the
+    file under its lock and keeps the union of failures, and a clear is
+    recorded as "failures up to time T are gone" (kept for one window), so
+    neither a clear nor a failure recorded elsewhere is undone.
+    """
+    def __init__(self, file=FAILED_LOGINS_FILE, max_failures: int = MAX_LOGIN_FAILURES,
+                 window: int = LOCKOUT_LOGIN_WINDOW, interval: int = LOCKOUT_SNAPSHOT_INTERVAL):
+        self._file = file
+        self._max = max(1, max_failures)
+        self._window = window
+        self._interval = interval
+        self._lock = threading.RLock()
+        self._failures = {}  # username -> deque of timestamps, oldest first
+        self._expiry = []  # heap of (expires at, username)
+        self._added = {}  # username -> failures recorded here since the last snapshot
+        self._cleared = {}  # username ("" = everyone) -> time its earlier failures were cleared
+        self._stamp = None
+        self._loaded = False
+        self._dirty = False
+        self._timer = None
+
+    # --- Loading ---
+    def _file_stamp(self):
+        try:
+            st = os.stat(self._file)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _refresh(self):
+        """Reload from disk if the file changed since we last read or wrote it."""
+        stamp = self._file_stamp()
+        if stamp is not None and stamp == self._stamp:
+            return
+        if self._loaded and stamp is None:
+            # Nothing on disk yet; memory is already up to date
+            return
+
+        stored, cleared = load_failed_attempts_and_clears(self._file)
+        self._merge(stored or {}, cleared or {}, time.time())
+        self._loaded = True
+        self._stamp = self._file_stamp()
+
+    def _merge(self, stored: dict, cleared: dict, now: float):
+        """Rebuild memory from the file's failures and clears plus the failures and clears not yet snapshotted here."""
+        cutoff = now - self._window
+        for key, ts in cleared.items():
+            if ts > self._cleared.get(key, 0):
+                self._cleared[key] = ts
+        self._cleared = {key: ts for key, ts in self._cleared.items() if ts > cutoff}
+
+        everyone = self._cleared.get(CLEARED_ALL, 0)
+        self._failures = {}
+        self._expiry = []
+        for username in set(stored) | set(self._added):
+            since = max(cutoff, everyone, self._cleared.get(username, 0))
+            timestamps = set(stored.get(username, ())) | set(self._added.get(username, ()))
+            for ts in sorted(ts for ts in timestamps if ts > since)[-self._max:]:
+                self._add(username, ts)
+
+    def _add(self, username: str, ts: float):
+        ring = self._failures.get(username)
+        if ring is None:
+            ring = self._failures[username] = deque(maxlen=self._max)
+        ring.append(ts)
+        heapq.heappush(self._expiry, (ts + self._window, username))
+
+    def _prune(self, now: float) -> int:
+        """Drop failures that left the window, oldest first. Returns how many were dropped."""
+        cutoff = now - self._window
+        dropped = 0
+        while self._expiry and self._expiry[0][0] <= now:
+            _, username = heapq.heappop(self._expiry)
+            ring = self._failures.get(username)
+            if ring is None:
+                continue
+            while ring and ring[0] <= cutoff:
+                ring.popleft()
+                dropped += 1
+                self._dirty = True
+            if not ring:
+                del self._failures[username]
+
+        # Heap entries for cleared users or ring-overwritten failures pile up
+        if len(self._expiry) > 2 * self._max * len(self._failures) + 64:
+            self._expiry = [(ts + self._window, u) for u, ring in self._failures.items() for ts in ring]
+            heapq.heapify(self._expiry)
+        return dropped
+
+    # --- Queries ---
+    def locked(self, username: str, now: float = None):
+        """Seconds left on username's lockout, or None if it may try to log in."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._refresh()
+            self._prune(now)
+            ring = self._failures.get(username)
+            if ring is None or len(ring) < self._max:
+                return None
+            return self._window - (now - ring[0])
+
+    def count(self, username: str) -> int:
+        with self._lock:
+            self._refresh()
+            self._prune(time.time())
+            return len(self._failures.get(username, ()))
+
+    def all(self) -> dict:
+        """username -> recent failure timestamps (the failed_attempts.json layout)."""
+        with self._lock:
+            self._refresh()
+            self._prune(time.time())
+            return {u: list(ring) for u, ring in self._failures.items()}
+
+    # --- Mutations ---
+    def record_failure(self, username: str, now: float = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._refresh()
+            self._prune(now)
+            self._add(username, now)
+            self._added.setdefault(username, []).append(now)
+            self._changed()
+
+    def clear(self, username: str) -> bool:
+        """
+        Forget username's failures. The clear is recorded (and snapshotted)
+        even if this process has none, since another process may hold some it
+        has not written yet. Returns True if it had any here.
+        """
+        with self._lock:
+            self._refresh()
+            self._added.pop(username, None)
+            had_failures = self._failures.pop(username, None) is not None
+            self._cleared[username] = time.time()
+            self._changed()
+            return had_failures
+
+    def prune(self, now: float = None) -> int:
+        """Drop failures that left the window and snapshot the result. Returns how many were dropped."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._refresh()
+            dropped = self._prune(now)
+            if dropped:
+                self._changed()
+            return dropped
+
+    def clear_all(self):
+        with self._lock:
+            self._failures = {}
+            self._expiry = []
+            self._added = {}
+            self._cleared = {CLEARED_ALL: time.time()}
+            self._changed()
+
+    # --- Persistence ---
+    def _changed(self):
+        self._dirty = True
+        if self._interval <= 0:
+            self.flush()
+        elif self._timer is None:
+            self._timer = threading.Timer(self._interval, self._snapshot)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _snapshot(self):
+        with self._lock:
+            self._timer = None
+            try:
+                self.flush()
+            except Exception as e:
+                server_log("ERROR", f"Failed attempts snapshot failed: {type(e).__name__}")
+
+    def flush(self) -> bool:
+        """Write failed_attempts.json if anything changed. Returns True if written."""
+        with self._lock:
+            if not self._dirty:
+                return False
+            # Under the file lock: merge with whatever another process wrote since we last read
+            with file_lock(self._file):
+                self._refresh()
+                save_failed_attempts({u: list(ring) for u, ring in self._failures.items()}, self._file, self._cleared)
+            self._added = {}
+            self._dirty = False
+            self._stamp = self._file_stamp()
+            return True
+
+    def _after_fork(self):
+        # The snapshot timer does not survive fork()
+        self._lock = threading.RLock()
+        self._timer = None
+        if self._dirty:
+            self._changed()
+
+lockout_tracker = LockoutTracker()
+atexit.register(lockout_tracker.flush)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=lockout_tracker._after_fork)
@@ -0,0 +1,178 @@
+"""
+Query server.log and its rotated files (oldest first) without loading them:
+lines are streamed one at a time and files outside the time range are skipped
+by their first/last timestamp. Reads JSON lines (LOG_FORMAT=json) and the
+coloured text lines, which only have ts, prefix, message and status.
+
+Usage: python -m SecureServer.code.log_query [filters] [--json] [files ...]
+  --since/--until  "2026-10-18 14:00", "2026-10-18T14:00:05" or relative: 15m, 2h, 1d
+  --prefix ERROR --user alice --route /login --status 404|4xx --min-latency 250
+  --field key=value (any JSON field), --contains text (in the message), --limit N
+"""
+import os, re, sys, json, time, argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+from SecureServer.code.paths import SERVER_LOGS_FILE
+from SecureServer.code.logs import JSON_TIME_FORMAT, ANSI_ESCAPE_PATTERN, format_server_log
+
+TEXT_LINE_PATTERN = re.compile(r"^\[(\d{4}-\d\d-\d\d) (\d\d:\d\d:\d\d)\] ([^:]*):\s*(.*)$")
+TEXT_STATUS_PATTERN = re.compile(r" ([1-5]\d\d) - [A-Za-z ]+$")  # " 404 - Not Found" appended by the text format
+RELATIVE_TIME_PATTERN = re.compile(r"^(\d+)([smhd])$")
+UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+TAIL_BYTES = 64 * 1024
+
+def log_files(log_file: Path = SERVER_LOGS_FILE) -> list:
+    """log_file and its RotatingFileHandler backups, oldest first."""
+    backups = []
+    for path in log_file.parent.glob(log_file.name + ".*"):
+        suffix = path.name[len(log_file.name) + 1:]
+        if suffix.isdigit():
+            backups.append((int(suffix), path))
+    return [path for _, path in sorted(backups, reverse=True)] + ([log_file] if log_file.exists() else [])
+
+def parse_time(value: str) -> str:
+    """A --since/--until value as a timestamp prefix comparable with the "ts" field."""
+    m = RELATIVE_TIME_PATTERN.match(value)
+    if m:
+        return time.strftime(JSON_TIME_FORMAT, time.localtime(time.time() - int(m.group(1)) * UNITS[m.group(2)]))
+    return value.strip().replace(" ", "T")
+
+def parse_line(line: str) -> dict | None:
+    """A log line as an event dict (JSON or text format), or None if it is neither."""
+    if line.startswith("{"):
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+    m = TEXT_LINE_PATTERN.match(ANSI_ESCAPE_PATTERN.sub("", line.rstrip("\n")))
+    if m is None:
+        return None
+    event = {"ts": f"{m.group(1)}T{m.group(2)}", "prefix": m.group(3).strip(), "message": m.group(4)}
+    status = TEXT_STATUS_PATTERN.search(event["message"])
+    if status:
+        event["message"] = event["message"][:status.start()]
+        event["status"] = int(status.group(1))
+    return event
+
+def _edge_ts(path: Path, last: bool) -> str | None:
+    """Timestamp of the first or last event in a file (reads at most TAIL_BYTES)."""
+    with open(path, "rb") as f:
+        if last:
+            f.seek(max(0, os.fstat(f.fileno()).st_size - TAIL_BYTES))
+        lines = f.read(TAIL_BYTES).decode("utf-8", "replace").splitlines()
+    for line in (reversed(lines) if last else lines):
+        event = parse_line(line)
+        if event is not None:
+            return event.get("ts")
+    return None
+
+def in_range(ts: str, since: str = None, until: str = None) -> bool:
+    # Timestamps compare as strings; until is inclusive at its own precision
+    if ts is None:
+        return since is None and until is None
+    if since is not None and ts < since:
+        return False
+    if until is not None and ts[:len(until)] > until:
+        return False
+    return True
+
+def matches_status(status, wanted: str) -> bool:
+    if status is None:
+        return False
+    wanted = wanted.lower()
+    if len(wanted) == 3 and wanted.endswith("xx"):
+        return str(status)[0] == wanted[0]
+    return str(status) == wanted
+
+def query(files: list, since: str = None, until: str = None, prefix: str = None, user: str = None,
+          route: str = None, status: str = None, min_latency: float = None, fields: dict = None, contains: str = None):
+    """Stream the events of files that match every given filter."""
+    fields = fields or {}
+    # A JSON line that does not contain these (as encoded) cannot match: skip it unparsed
+    needles = [json.dumps(value, ensure_ascii=False)[1:-1] for value in (user, route, contains) if value]
+    for path in files:
+        if since is not None:
+            last = _edge_ts(path, last=True)
+            if last is not None and last < since:
+                continue
+        if until is not None:
+            first = _edge_ts(path, last=False)
+            if first is not None and first[:len(until)] > until:
+                continue
+
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if needles and line.startswith("{") and not all(needle in line for needle in needles):
+                    continue
+                event = parse_line(line)
+                if event is None or not in_range(event.get("ts"), since, until):
+                    continue
+                if prefix is not None and str(event.get("prefix", "")).upper() != prefix.upper():
+                    continue
+                if user is not None and event.get("user") != user:
+                    continue
+                if route is not None and not str(event.get("route", "")).startswith(route):
+                    continue
+                if status is not None and not matches_status(event.get("status"), status):
+                    continue
+                if min_latency is not None and (event.get("latency_ms") or 0) < min_latency:
+                    continue
+                if any(str(event.get(key)) != value for key, value in fields.items()):
+                    continue
+                if contains is not None and contains not in str(event.get("message", "")):
+                    continue
+                yield event
+
+def render(event: dict, color: bool) -> str:
+    """The coloured text view of an event, as the text format would have written it."""
+    line = format_server_log(str(event.get("prefix", "INFO")), str(event.get("message", "")), event.get("status")) or ""
+    extra = " ".join(f"{key}={event[key]}" for key in ("user", "latency_ms") if event.get(key) is not None)
+    if extra:
+        line = f"{line} ({extra})"
+    if not color:
+        line = ANSI_ESCAPE_PATTERN.sub("", line)
+    return f"[{str(event.get('ts', '')).replace('T', ' ')}] {line}"
+
+def main(argv: list) -> int:
+    parser = argparse.ArgumentParser(prog="log_query", description="Filter server.log and its rotated files.")
+    parser.add_argument("files", nargs="*", type=Path, help="log files, oldest first (default: server.log and its backups)")
+    parser.add_argument("--since")
+    parser.add_argument("--until")
+    parser.add_argument("--prefix")
+    parser.add_argument("--user")
+    parser.add_argument("--route", help="route prefix, e.g. /api")
+    parser.add_argument("--status", help="e.g. 404 or 4xx")
+    parser.add_argument("--min-latency", type=float, help="milliseconds")
+    parser.add_argument("--field", action="append", default=[], metavar="KEY=VALUE")
+    parser.add_argument("--contains")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--json", action="store_true", help="print events as JSON lines")
+    args = parser.parse_args(argv)
+
+    fields = {}
+    for item in args.field:
+        key, sep, value = item.partition("=")
+        if not sep:
+            parser.error(f"--field needs KEY=VALUE, got {item!r}")
+        fields[key] = value
+
+    events = query(
+        args.files or log_files(),
+        since=parse_time(args.since) if args.since else None,
+        until=parse_time(args.until) if args.until else None,
+        prefix=args.prefix, user=args.user, route=args.route, status=args.status,
+        min_latency=args.min_latency, fields=fields, contains=args.contains,
+    )
+    color = sys.stdout.isatty()
+    try:
+        for count, event in enumerate(events, 1):
+            print(json.dumps(event, ensure_ascii=False) if args.json else render(event, color))
+            if args.limit is not None and count >= args.limit:
+                break
+    except BrokenPipeError:  # e.g. piped into head
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
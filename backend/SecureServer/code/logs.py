@@ -1,147 +1,350 @@
-import logging, re
-from logging.handlers import RotatingFileHandler
-from SecureServer.code.paths import SERVER_LOGS_FILE
-
-IGNORED_LOG_PATTERNS = [
-    "CTRL+C", # Python instructions
-    "/.well-known/appspecific/com.chrome.devtools", # Chrome devtools
-]
-
-logger = logging.getLogger("vault_system")
-logger.setLevel(logging.INFO)
-
-handler = RotatingFileHandler(
-    SERVER_LOGS_FILE,
-    maxBytes=10*1024*1024,  # 10MB per file
-    backupCount=5,           # Keep 5 backup files
-    encoding='utf-8'
-)
-
-formatter = logging.Formatter(
-    '[%(asctime)s] %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
-handler.setFormatter(formatter)
-logger.addHandler(handler)
-
-# --- Uvicorn Server logs handling ---
-class UvicornForwardHandler(logging.Handler):
-    def emit(self, record):
-        prefix = record.levelname  # INFO / WARNING / ERROR
-        msg = record.getMessage()
-        server_log(prefix, msg)
-
-uvicorn_handler = UvicornForwardHandler()
-uvicorn_handler.setFormatter(formatter)
-
-for name in ["uvicorn", "uvicorn.error", "uvicorn.access"]:
-    l = logging.getLogger(name)
-    l.handlers = []          # Remove default handlers
-    l.propagate = False
-    l.addHandler(uvicorn_handler)
-    l.setLevel(logging.INFO)
-
-def server_log(prefix: str, text: str = None):
-    message = sanitize_log_input(text)
-    if message is None:
-        # If it's a true "PREFIX: message"
-        if re.match(r"^(INFO|WARNING|ERROR|DEBUG|CRITICAL|NOTICE|ADMIN|COMMAND|RISK)\b", prefix):
-            if ":" in prefix:
-                pfx, msg = prefix.split(":", 1)
-                prefix = pfx.strip()
-                message = msg.lstrip()
-            else:
-                message = prefix
-                prefix = "INFO"
-        else:
-            # Access log → do NOT split by colon
-            message = prefix
-            prefix = "INFO"
-
-    # Filter out ignored patterns
-    if any(pattern in (message or "") for pattern in IGNORED_LOG_PATTERNS):
-        return
-
-    http_code = None
-    status_text = None
-
-    m = re.search(r"\b([1-5][0-9]{2})\b(?!.*\b[1-5][0-9]{2}\b)", message)
-    if m:
-        http_code = int(m.group(1))
-
-        # Map codes to reason phrases
-        http_reason_map = {
-            1: "Error",
-            100: "Continue",
-            200: "OK",
-            201: "Created",
-            204: "No Content",
-            301: "Moved Permanently",
-            302: "Found",
-            307: "Temporary Redirect",
-            308: "Permanent Redirect",
-            400: "Bad Request",
-            401: "Unauthorized",
-            403: "Forbidden",
-            404: "Not Found",
-            405: "Method Not Allowed",
-            409: "Conflict",
-            422: "Unprocessable Entity",
-            429: "Too Many Requests",
-            500: "Internal Server Error",
-            502: "Bad Gateway",
-            503: "Service Unavailable",
-        }
-
-        status_text = http_reason_map.get(http_code, "Unknown")
-        message = message[:m.start()] + message[m.end():]
-        message = message.strip()
-
-    append_info = ""
-    append_color = "\033[0m"
-    if http_code:
-        if 200 <= http_code < 300:
-            append_info = f" {http_code} - {status_text}"
-            append_color = "\033[32m"
-        elif 300 <= http_code < 400:
-            append_info = f" {http_code} - {status_text}"
-            append_color = "\033[36m"
-        elif 400 <= http_code < 500:
-            append_info = f" {http_code} - {status_text}"
-            append_color = "\033[33m"
-        elif 500 <= http_code < 600:
-            append_info = f" {http_code} - {status_text}"
-            append_color = "\033[31m"
-
-    pad_len = max(1, 9 - len(prefix))
-    padding = " " * pad_len
-
-    color = "\033[35m"
-
-    if "INFO" in prefix:
-        color = "\033[32m"
-    if any(x in prefix for x in ["WARNING", "ENCRYPTED", "DEBUG", "RESETTING", "NOTICE"]):
-        color = "\033[33m"
-    if any(x in prefix for x in ["ADMIN", "COMMAND"]):
-        color = "\033[36m"
-    if any(x in prefix for x in ["RISK", "CRITICAL", "ERROR"]):
-        color = "\033[31m"
-
-    output = f"{color}{prefix}\033[0m:{padding}{message}{append_color}{append_info}\033[0m"
-
-    logger.info(output)
-    # print(f"{output}\n", end="")
-
-def sanitize_log_input(text: str) -> str:
-    """Remove ANSI escape sequences and control characters from log input."""
-    # Remove ANSI escape sequences
-    ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-    text = ansi_escape.sub('', text)
-    # Remove other control characters except newline/tab
-    text = ''.join(char for char in text if ord(char) >= 32 or char in '\n\t')
-    # Replace newlines to prevent log injection
-    text = text.replace('\n', '\\n').replace('\r', '\\r')
-    return text
-
-def debug_log(message: str):
-    server_log("DEBUG", message)
\ No newline at end of file
+import logging, re, os, time, json, queue, atexit
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from SecureServer.code.paths import SERVER_LOGS_FILE
+
+IGNORED_LOG_PATTERNS = [
+    "CTRL+C", # Python instructions
+    "/.well-known/appspecific/com.chrome.devtools", # Chrome devtools
+]
+
+LOG_PREFIX_PATTERN = re.compile(r"^(INFO|WARNING|ERROR|DEBUG|CRITICAL|NOTICE|ADMIN|COMMAND|RISK)\b")
+HTTP_CODE_PATTERN = re.compile(r"\b([1-5][0-9]{2})\b(?!.*\b[1-5][0-9]{2}\b)")
+ANSI_ESCAPE_PATTERN = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+CONTROL_CHARS_PATTERN = re.compile(r"[\x00-\x08\x0b-\x1f]")  # control characters except tab and newline
+
+# Map codes to reason phrases
+HTTP_REASONS = {
+    1: "Error",
+    100: "Continue",
+    200: "OK",
+    201: "Created",
+    204: "No Content",
+    301: "Moved Permanently",
+    302: "Found",
+    307: "Temporary Redirect",
+    308: "Permanent Redirect",
+    400: "Bad Request",
+    401: "Unauthorized",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    422: "Unprocessable Entity",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+    502: "Bad Gateway",
+    503: "Service Unavailable",
+}
+
+logger = logging.getLogger("vault_system")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
+handler = RotatingFileHandler(
+    SERVER_LOGS_FILE,
+    maxBytes=10*1024*1024,  # 10MB per file
+    backupCount=5,           # Keep 5 backup files
+    encoding='utf-8'
+)
+
+formatter = logging.Formatter(
+    '[%(asctime)s] %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+handler.setFormatter(formatter)
+
+# --- Log file format ---
+LOG_FORMATS = ("text", "json")
+JSON_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+json_formatter = logging.Formatter("%(message)s")  # the JSON object carries its own timestamp
+json_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=str)
+_log_format = "text"
+_json_second = (None, "")  # (whole second, formatted) of the last JSON record: strftime once per second
+
+def set_log_format(log_format: str) -> None:
+    """Store log lines as coloured text ("text") or as one JSON object per line ("json")."""
+    global _log_format
+    if log_format not in LOG_FORMATS:
+        server_log("WARNING", f"Unknown LOG_FORMAT {log_format!r}, using text.")
+        log_format = "text"
+    _log_format = log_format
+    handler.setFormatter(json_formatter if log_format == "json" else formatter)
+
+def render_server_log(record: logging.LogRecord) -> bool:
+    """
+    Handler filter: turn a server_log() record into its output line (coloured
+    text or JSON). Runs wherever the file handler runs (the log thread when
+    queued). False drops ignored lines.
+    """
+    if hasattr(record, "log_prefix"):
+        if _log_format == "json":
+            output = format_json_log(record)
+        else:
+            output = format_server_log(record.log_prefix, record.log_text, record.fields.get("status"))
+        if output is None:
+            return False
+        record.msg, record.args = output, None
+    return True
+
+handler.addFilter(render_server_log)
+logger.addHandler(handler)
+
+# --- Uvicorn Server logs handling ---
+class UvicornForwardHandler(logging.Handler):
+    def emit(self, record):
+        prefix = record.levelname  # INFO / WARNING / ERROR
+        msg = record.getMessage()
+        server_log(prefix, msg)
+
+uvicorn_handler = UvicornForwardHandler()
+uvicorn_handler.setFormatter(formatter)
+
+for name in ["uvicorn", "uvicorn.error", "uvicorn.access"]:
+    l = logging.getLogger(name)
+    l.handlers = []          # Remove default handlers
+    l.propagate = False
+    l.addHandler(uvicorn_handler)
+    l.setLevel(logging.INFO)
+
+# --- Queued logging ---
+DROPPABLE_LOG_PREFIXES = {"INFO", "DEBUG"}  # access and debug lines; security, audit and error lines are never dropped
+
+def is_droppable_log(record: logging.LogRecord) -> bool:
+    """True for server_log() access/debug lines, the only ones a full queue may drop."""
+    prefix = getattr(record, "log_prefix", None)
+    if prefix is None:
+        return False
+    if record.log_text is None:
+        # One-argument form, as split by split_log_prefix (without sanitising the message)
+        if LOG_PREFIX_PATTERN.match(prefix) and ":" in prefix:
+            prefix = prefix.split(":", 1)[0].strip()
+        else:
+            prefix = "INFO"
+    return prefix in DROPPABLE_LOG_PREFIXES
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Hands records to the log thread unformatted. On a full queue the "drop"
+    policy drops (and counts) access and debug lines only; every other line,
+    and every line under "block", waits for room.
+    """
+    def __init__(self, log_queue: queue.Queue, block: bool = False):
+        super().__init__(log_queue)
+        self.block = block
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record  # formatted, sanitised and written by the listener thread
+
+    def enqueue(self, record):
+        if self.block or not is_droppable_log(record):
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class ServerLogListener(QueueListener):
+    """Writes queued records through the file handler and reports records dropped on a full queue."""
+    def __init__(self, queue_handler: BoundedQueueHandler):
+        super().__init__(queue_handler.queue, handler)
+        self.queue_handler = queue_handler
+        self.reported = 0
+
+    def handle(self, record):
+        dropped = self.queue_handler.dropped
+        if dropped != self.reported:
+            super().handle(ServerLogRecord("WARNING", f"Log queue full, {dropped - self.reported} record(s) dropped."))
+            self.reported = dropped
+        super().handle(record)
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)  # the queue is bounded: wait for room
+
+_queue_handler = None
+_listener = None
+
+def start_log_queue(size: int, policy: str = "drop") -> None:
+    """
+    Move log formatting, sanitising and file writes (with rotation) to a
+    background thread; server_log then only enqueues a record. policy is
+    "drop" or "block" for when size records are already waiting. size 0
+    keeps logging synchronous. Security and audit lines always wait for
+    room; "drop" only applies to access and debug lines.
+    """
+    global _queue_handler, _listener
+    stop_log_queue()
+    if size <= 0:
+        return
+    _queue_handler = BoundedQueueHandler(queue.Queue(size), block=policy == "block")
+    _listener = ServerLogListener(_queue_handler)
+    _listener.start()
+    logger.removeHandler(handler)
+    logger.addHandler(_queue_handler)
+
+def stop_log_queue() -> None:
+    """Write out everything queued and go back to writing on the caller."""
+    global _queue_handler, _listener
+    if _listener is None:
+        return
+    logger.removeHandler(_queue_handler)
+    logger.addHandler(handler)
+    _listener.stop()
+    _queue_handler = _listener = None
+
+def flush_logs() -> None:
+    """Block until every queued record has been written."""
+    if _listener is not None:
+        _listener.queue.join()
+
+def _after_fork():
+    # The copied queue holds the parent's records (the parent writes them) and
+    # possibly a lock held by a parent thread: start over with a fresh one
+    global _queue_handler, _listener
+    if _listener is None:
+        return
+    logger.removeHandler(_queue_handler)
+    fresh = BoundedQueueHandler(queue.Queue(_queue_handler.queue.maxsize), block=_queue_handler.block)
+    _queue_handler, _listener = fresh, ServerLogListener(fresh)
+    _listener.start()
+    logger.addHandler(_queue_handler)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+atexit.register(stop_log_queue)
+
+class ServerLogRecord(logging.LogRecord):
+    """
+    A server_log() line as a LogRecord. Only the creation time and the raw
+    prefix/text are set per call (LogRecord.__init__ looks up the caller's
+    file, thread and process); the rest are class defaults.
+    """
+    name = logger.name
+    levelno, levelname = logging.INFO, "INFO"
+    pathname, filename, module, lineno, funcName = __file__, "logs.py", "logs", 0, "server_log"
+    msg = args = exc_info = exc_text = stack_info = None
+    thread = threadName = process = processName = taskName = None
+    relativeCreated = 0
+
+    def __init__(self, prefix: str, text: str = None, fields: dict = None):
+        self.created = time.time()
+        self.msecs = int(self.created * 1000) % 1000
+        self.log_prefix = prefix
+        self.log_text = text
+        self.fields = fields or {}
+
+def server_log(prefix: str, text: str = None, **fields):
+    """
+    Log a line; it is formatted by render_server_log when the file handler runs.
+    Keyword fields (user, route, status, latency_ms, ...) are stored as is in
+    the JSON format; the text format uses status for the coloured status suffix.
+    """
+    logger.handle(ServerLogRecord(prefix, text, fields))
+
+def split_log_prefix(prefix: str, text: str = None) -> tuple:
+    """(prefix, sanitised message) of server_log(prefix, text), including the one-argument "PREFIX: message" form."""
+    message = sanitize_log_input(text)
+    if message is None:
+        # If it's a true "PREFIX: message"
+        if LOG_PREFIX_PATTERN.match(prefix):
+            if ":" in prefix:
+                pfx, msg = prefix.split(":", 1)
+                prefix = pfx.strip()
+                message = msg.lstrip()
+            else:
+                message = prefix
+                prefix = "INFO"
+        else:
+            # Access log → do NOT split by colon
+            message = prefix
+            prefix = "INFO"
+    return prefix, message
+
+def is_ignored_log(message: str) -> bool:
+    return any(pattern in (message or "") for pattern in IGNORED_LOG_PATTERNS)
+
+def format_json_log(record: "ServerLogRecord") -> str | None:
+    """One JSON object for a server_log() record (no text parsing), or None if it is ignored."""
+    global _json_second
+    prefix, message = split_log_prefix(record.log_prefix, record.log_text)
+    if is_ignored_log(message):
+        return None
+    second = int(record.created)
+    if _json_second[0] != second:
+        _json_second = (second, time.strftime(JSON_TIME_FORMAT, time.localtime(second)))
+    event = {"ts": f"{_json_second[1]}.{record.msecs:03d}", "prefix": prefix, "message": message}
+    event.update(record.fields)
+    return json_encoder.encode(event)
+
+def format_server_log(prefix: str, text: str = None, status: int = None) -> str | None:
+    """
+    The coloured output line for server_log(prefix, text), or None if it is ignored.
+    Without a status, an HTTP status code is looked for at the end of the message.
+    """
+    prefix, message = split_log_prefix(prefix, text)
+
+    # Filter out ignored patterns
+    if is_ignored_log(message):
+        return None
+
+    http_code = None
+    status_text = None
+
+    if status is not None:
+        http_code = int(status)
+    else:
+        m = HTTP_CODE_PATTERN.search(message)
+        if m:
+            http_code = int(m.group(1))
+            message = message[:m.start()] + message[m.end():]
+            message = message.strip()
+    if http_code:
+        status_text = HTTP_REASONS.get(http_code, "Unknown")
+
+    append_info = ""
+    append_color = "\033[0m"
+    if http_code:
+        if 200 <= http_code < 300:
+            append_info = f" {http_code} - {status_text}"
+            append_color = "\033[32m"
+        elif 300 <= http_code < 400:
+            append_info = f" {http_code} - {status_text}"
+            append_color = "\033[36m"
+        elif 400 <= http_code < 500:
+            append_info = f" {http_code} - {status_text}"
+            append_color = "\033[33m"
+        elif 500 <= http_code < 600:
+            append_info = f" {http_code} - {status_text}"
+            append_color = "\033[31m"
+
+    pad_len = max(1, 9 - len(prefix))
+    padding = " " * pad_len
+
+    color = "\033[35m"
+
+    if "INFO" in prefix:
+        color = "\033[32m"
+    if any(x in prefix for x in ["WARNING", "ENCRYPTED", "DEBUG", "RESETTING", "NOTICE"]):
+        color = "\033[33m"
+    if any(x in prefix for x in ["ADMIN", "COMMAND"]):
+        color = "\033[36m"
+    if any(x in prefix for x in ["RISK", "CRITICAL", "ERROR"]):
+        color = "\033[31m"
+
+    return f"{color}{prefix}\033[0m:{padding}{message}{append_color}{append_info}\033[0m"
+
+def sanitize_log_input(text: str) -> str:
+    """Remove ANSI escape sequences and control characters from log input."""
+    if text is None:
+        return None
+    # Remove ANSI escape sequences
+    text = ANSI_ESCAPE_PATTERN.sub('', text)
+    # Remove other control characters except newline/tab
+    text = CONTROL_CHARS_PATTERN.sub('', text)
+    # Replace newlines to prevent log injection
+    text = text.replace('\n', '\\n').replace('\r', '\\r')
+    return text
+
+def debug_log(message: str):
+    server_log("DEBUG", message)
@@ -1,46 +1,124 @@
-import os
-from fastapi import Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from fastapi.staticfiles import StaticFiles
-from SecureServer.code.environment_variables import USE_HTTPS
-
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
-        response = await call_next(request)
-        
-        response.headers["Content-Security-Policy"] = (
-            "default-src 'self'; "
-            "script-src 'self'; "
-            "style-src 'self' 'unsafe-inline'; " 
-            "frame-ancestors 'none';"
-        )
-        
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-        
-        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains; preload" 
-        
-        return response
-    
-class HTTPSRedirectMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
-        if request.url.scheme != "https" and USE_HTTPS:
-            url = request.url.replace(scheme="https")
-            return Response(status_code=301, headers={"Location": str(url)})
-        return await call_next(request)
-    
-class StaticFilesWithHeaders(StaticFiles):
-    """StaticFiles with security headers."""
-    async def get_response(self, path: str, scope):
-        response = await super().get_response(path, scope)
-        # Apply security headers
-        response.headers["Content-Security-Policy"] = (
-            "default-src 'self'; "
-            "script-src 'self'; "
-            "style-src 'self' 'unsafe-inline'; "
-            "frame-ancestors 'none';"
-        )
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        return response
\ No newline at end of file
+import os, time, anyio
+from fastapi import Response
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import URL, Headers
+from starlette.staticfiles import NotModifiedResponse
+from SecureServer.code.environment_variables import USE_HTTPS
+from SecureServer.code.header_policy import HeaderPolicy
+from SecureServer.code.static_cache import StaticFileCache
+from SecureServer.code.logs import server_log
+
+class SecurityHeadersMiddleware:
+    """Adds the header policy's headers to every HTTP response (replacing any the app set)."""
+    def __init__(self, app, policy: HeaderPolicy = None):
+        self.app = app
+        self.policy = policy or HeaderPolicy()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        header_set = self.policy.for_path(scope["path"])
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": header_set.apply(message.get("headers", ()))}
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+class HTTPSRedirectMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if USE_HTTPS and scope["type"] == "http" and scope.get("scheme") != "https":
+            url = URL(scope=scope).replace(scheme="https")
+            response = Response(status_code=301, headers={"Location": str(url)})
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+class AccessLogMiddleware:
+    """
+    One access log line per HTTP request (in place of uvicorn's), logged when
+    the response is done, with the route, status, latency and the user an
+    auth guard put in request.state as separate fields.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        scope.setdefault("state", {})
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.log(scope, status, (time.perf_counter() - start) * 1000)
+
+    @staticmethod
+    def log(scope, status: int, latency_ms: float) -> None:
+        client = scope.get("client")
+        client = f"{client[0]}:{client[1]}" if client else "-"
+        path = scope.get("root_path", "") + scope["path"]
+        query = scope.get("query_string", b"")
+        full_path = f"{path}?{query.decode('ascii', 'replace')}" if query else path
+        fields = {
+            "client": client, "method": scope["method"], "route": path,
+            "status": status, "latency_ms": round(latency_ms, 2),
+        }
+        user = scope["state"].get("user")
+        if isinstance(user, dict) and user.get("username"):
+            fields["user"] = user["username"]
+        # Same text as uvicorn's access log; the status is a field, not parsed from the text
+        server_log("INFO", f'{client} - "{scope["method"]} {full_path} HTTP/{scope.get("http_version", "1.1")}"', **fields)
+
+class StaticFilesWithHeaders(StaticFiles):
+    """StaticFiles with the header policy's security headers and an optional in-memory file cache."""
+    vary_encoding = False  # True if the response depends on Accept-Encoding (part of the cache key)
+
+    def __init__(self, *args, policy: HeaderPolicy = None, cache: StaticFileCache = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.policy = policy or HeaderPolicy()
+        self.cache = cache
+
+    async def get_response(self, path: str, scope):
+        if self.cache is not None and scope["method"] == "GET":
+            response = await self._cached_response(path, scope)
+        else:
+            response = await super().get_response(path, scope)
+        response.raw_headers = self.policy.apply(response.raw_headers, scope["path"])
+        return response
+
+    async def _cached_response(self, path: str, scope):
+        request_headers = Headers(scope=scope)
+        if "range" in request_headers:
+            return await super().get_response(path, scope)
+
+        key = (scope["path"], request_headers.get("accept-encoding", "")) if self.vary_encoding else scope["path"]
+        entry = self.cache.get(key)
+        if entry is None:
+            response = await super().get_response(path, scope)
+            if not self.cache.cacheable(response):
+                return response
+            entry = await anyio.to_thread.run_sync(self.cache.load, response)
+            if entry is None:
+                return response
+            self.cache.put(key, entry)
+
+        if self.is_not_modified(entry.headers, request_headers):
+            return NotModifiedResponse(entry.headers)
+        return entry.response()
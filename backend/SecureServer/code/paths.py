@@ -1,16 +1,24 @@
-from pathlib import Path
-
-CODE = Path(__file__).parent
-BACKEND = CODE.parent
-EXE_PATH = BACKEND.parent
-CONSOLE_PATH = BACKEND / "console.py"
-SERVER_PATH = BACKEND / "server.py"
-DATA = BACKEND / "data"
-BASE_DIR = BACKEND.parent
-FRONTEND = BASE_DIR / "frontend"
-USERS_FILE = DATA / "users.json"
-TOKENS_FILE = DATA / "tokens.json"
-FAILED_LOGINS_FILE = DATA / "failed_attempts.json"
-SERVER_LOGS_FILE = BACKEND / "server.log"
-ENV_FILE = EXE_PATH / ".env"
-PID_FILE = BACKEND / "server.pid"
\ No newline at end of file
+from pathlib import Path
+
+CODE = Path(__file__).parent
+BACKEND = CODE.parent
+EXE_PATH = BACKEND.parent
+CONSOLE_PATH = BACKEND / "console.py"
+SERVER_PATH = BACKEND / "server.py"
+DATA = BACKEND / "data"
+BASE_DIR = BACKEND.parent
+FRONTEND = BASE_DIR / "frontend"
+STATIC_BUILD_DIR = BACKEND / "static_build"
+USERS_FILE = DATA / "users.json"
+USERS_DIR = DATA / "users"
+VAULTS_DIR = DATA / "vaults"
+VAULT_CHUNKS_DIR = DATA / "vault_chunks"
+USERS_INDEX_FILE = DATA / "users_index.json"
+USERS_DB_FILE = DATA / "users.db"
+SESSIONS_DB_FILE = DATA / "sessions.db"
+TOKENS_FILE = DATA / "tokens.json"
+FAILED_LOGINS_FILE = DATA / "failed_attempts.json"
+SERVER_LOGS_FILE = BACKEND / "server.log"
+ENV_FILE = EXE_PATH / ".env"
+PID_FILE = BACKEND / "server.pid"
+ADMIN_SOCKET_FILE = BACKEND / "admin.sock"
\ No newline at end of file
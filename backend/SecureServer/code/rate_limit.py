@@ -0,0 +1,103 @@
+import re, math, inspect
+from functools import wraps
+from itertools import count
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+from SecureServer.code.state_backend import state
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400, "week": 604800, "month": 2592000, "year": 31536000}
+LIMIT_PATTERN = re.compile(r"^\s*(\d+)\s*(?:/|per)\s*(\d+)?\s*(second|minute|hour|day|week|month|year)s?\s*$", re.IGNORECASE)
+
+class RateLimit:
+    """One limit ("6/minute"): `amount` requests per `period` seconds, as GCRA parameters."""
+    __slots__ = ("amount", "period", "text", "interval", "burst")
+
+    def __init__(self, amount: int, multiplier: int, unit: str):
+        self.amount = amount
+        self.period = multiplier * PERIODS[unit]
+        self.text = f"{amount} per {multiplier} {unit}"
+        self.interval = self.period / amount  # one request is earned back every interval
+        self.burst = self.period - self.interval  # so `amount` requests may come back to back
+
+    def __str__(self):
+        return self.text
+
+def parse_limits(limit_string: str) -> list:
+    """Parse "10/minute", "3 per 2 hours" or several of them separated by ";" or ","."""
+    limits = []
+    for part in re.split(r"[;,]", limit_string):
+        match = LIMIT_PATTERN.match(part)
+        if not match or int(match.group(1)) < 1:
+            raise ValueError(f"Invalid rate limit: {part!r}")
+        amount, multiplier, unit = match.groups()
+        limits.append(RateLimit(int(amount), int(multiplier or 1), unit.lower()))
+    return limits
+
+def client_address(request: Request) -> str:
+    return request.client.host if request.client else "127.0.0.1"
+
+class RateLimitExceeded(Exception):
+    def __init__(self, limit: RateLimit, retry_after: float):
+        super().__init__(f"Rate limit exceeded: {limit}")
+        self.limit = limit
+        self.retry_after = retry_after
+
+def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded) -> JSONResponse:
+    return JSONResponse(
+        {"error": f"Rate limit exceeded: {exc.limit}"},
+        status_code=429,
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))}
+    )
+
+class RateLimiter:
+    """
+    Route decorators for "<amount>/<period>" limits, enforced per client with
+    GCRA in the state backend's rate limit table (shared by all workers).
+    Only decorated routes pay for it; there is no middleware pass.
+    """
+    def __init__(self, key_func=client_address):
+        self.key_func = key_func
+        self.enabled = True
+        self._scopes = count()
+
+    def limit(self, limit_string: str, key_func=None, when=None):
+        """Limit a route; with when(request), only the requests it returns True for count and are limited."""
+        limits = parse_limits(limit_string)
+        key_func = key_func or self.key_func
+
+        def decorator(func):
+            if "request" not in inspect.signature(func).parameters:
+                raise TypeError(f'Rate limited route "{func.__name__}" needs a "request" argument')
+
+            # Short numeric scopes keep table keys compact; workers are forked after
+            # the routes are declared, so the numbering is the same in all of them
+            scopes = [next(self._scopes) for _ in limits]
+
+            def check(args, kwargs):
+                if not self.enabled:
+                    return
+                request = kwargs.get("request")
+                if request is None:
+                    request = next((a for a in args if isinstance(a, Request)), None)
+                if when is not None and not when(request):
+                    return
+                client = key_func(request)
+                items = [(f"{scope}:{client}", l.interval, l.burst) for scope, l in zip(scopes, limits)]
+                denied = state.rate_limits.acquire(items)
+                if denied is not None:
+                    index, retry_after = denied
+                    raise RateLimitExceeded(limits[index], retry_after)
+
+            if inspect.iscoroutinefunction(func):
+                @wraps(func)
+                async def wrapper(*args, **kwargs):
+                    check(args, kwargs)
+                    return await func(*args, **kwargs)
+            else:
+                @wraps(func)
+                def wrapper(*args, **kwargs):
+                    check(args, kwargs)
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
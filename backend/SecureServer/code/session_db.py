@@ -0,0 +1,123 @@
+import os, json, time, base64, sqlite3, threading
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from SecureServer.code.encryption import calculate_hmac
+from SecureServer.code.environment_variables import SESSION_KEY
+from SecureServer.code.paths import SESSIONS_DB_FILE
+from SecureServer.code.logs import server_log
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id   TEXT PRIMARY KEY,
+    exp  INTEGER NOT NULL,
+    data BLOB NOT NULL
+)
+"""
+EXP_INDEX = "CREATE INDEX IF NOT EXISTS sessions_exp ON sessions (exp)"
+
+SELECT_BY_ID = "SELECT exp, data FROM sessions WHERE id = ?"
+SELECT_COUNT = "SELECT COUNT(*) FROM sessions WHERE exp >= ?"
+DELETE_BY_ID = "DELETE FROM sessions WHERE id = ?"
+DELETE_EXPIRED = "DELETE FROM sessions WHERE exp < ?"
+UPSERT = """
+INSERT INTO sessions (id, exp, data) VALUES (?, ?, ?)
+ON CONFLICT(id) DO UPDATE SET exp = excluded.exp, data = excluded.data
+"""
+
+class SessionDatabase:
+    """
+    Encrypted on-disk copy of the login sessions (PERSIST_SESSIONS).
+    Rows are keyed by an HMAC of the session id and sealed with AES-GCM
+    under SESSION_KEY, with the session id as associated data, so the file
+    alone neither names nor opens a session. One connection per thread.
+    """
+    def __init__(self, file=SESSIONS_DB_FILE, key: str = SESSION_KEY):
+        self._file = file
+        self._aesgcm = AESGCM(base64.urlsafe_b64decode(key)) if key else None
+        self._local = threading.local()
+        self._setup_lock = threading.Lock()
+        self._ready = False
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    # --- Connections ---
+    def _after_fork(self):
+        # SQLite connections must not be used across fork()
+        self._local = threading.local()
+        self._setup_lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self._aesgcm is None:
+                raise ValueError("SESSION_KEY is required to persist sessions")
+            self._file.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self._file, timeout=30, isolation_level=None, cached_statements=16)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        if not self._ready:
+            with self._setup_lock:
+                conn.execute(SCHEMA)
+                conn.execute(EXP_INDEX)
+                self._ready = True
+        return conn
+
+    # --- Row encoding ---
+    @staticmethod
+    def _row_id(session_id: str) -> str:
+        return calculate_hmac(f"session:{session_id}")
+
+    def _seal(self, session_id: str, session: dict) -> bytes:
+        payload = {
+            "login_secret": session["login_secret"].hex(),
+            "base_key": session["base_key"].hex() if session.get("base_key") else None,
+            "key_schedule": session.get("key_schedule", False),
+            "exp": session["exp"],
+        }
+        nonce = os.urandom(12)
+        return nonce + self._aesgcm.encrypt(nonce, json.dumps(payload).encode(), session_id.encode())
+
+    def _open(self, session_id: str, data: bytes) -> dict:
+        payload = json.loads(self._aesgcm.decrypt(data[:12], data[12:], session_id.encode()))
+        payload["login_secret"] = bytes.fromhex(payload["login_secret"])
+        if payload.get("base_key"):
+            payload["base_key"] = bytes.fromhex(payload["base_key"])
+        return payload
+
+    # --- Access ---
+    def get(self, session_id: str, now: float = None):
+        """The stored session, or None if missing, expired or unreadable."""
+        now = time.time() if now is None else now
+        row_id = self._row_id(session_id)
+        conn = self._conn()
+        row = conn.execute(SELECT_BY_ID, (row_id,)).fetchone()
+        if row is None:
+            return None
+        exp, data = row
+        if exp < now:
+            conn.execute(DELETE_BY_ID, (row_id,))
+            return None
+        try:
+            return self._open(session_id, data)
+        except Exception as e:
+            # Tampered row or a rotated SESSION_KEY: the user just logs in again
+            server_log("WARNING", f"Dropped unreadable persisted session: {type(e).__name__}")
+            conn.execute(DELETE_BY_ID, (row_id,))
+            return None
+
+    def save(self, session_id: str, session: dict):
+        self._conn().execute(UPSERT, (self._row_id(session_id), int(session["exp"]), self._seal(session_id, session)))
+
+    def delete(self, session_id: str):
+        self._conn().execute(DELETE_BY_ID, (self._row_id(session_id),))
+
+    def delete_expired(self, now: float = None) -> int:
+        """Drop expired rows. Returns how many were removed."""
+        now = time.time() if now is None else now
+        return self._conn().execute(DELETE_EXPIRED, (now,)).rowcount
+
+    def count(self, now: float = None) -> int:
+        now = time.time() if now is None else now
+        return self._conn().execute(SELECT_COUNT, (now,)).fetchone()[0]
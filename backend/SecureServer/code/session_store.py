@@ -1,37 +1,70 @@
-import time
-import threading
-
-_session_store = {}
-_lock = threading.Lock()
-
-SESSION_TTL = 3600  # seconds
-
-def create_session(session_id: str, login_secret: bytes):
-    with _lock:
-        _session_store[session_id] = {
-            "login_secret": login_secret,
-            "exp": int(time.time()) + SESSION_TTL
-        }
-
-def get_session(session_id: str):
-    with _lock:
-        session = _session_store.get(session_id)
-        if not session:
-            return None
-
-        if session["exp"] < time.time():
-            del _session_store[session_id]
-            return None
-
-        return session
-
-def destroy_session(session_id: str):
-    with _lock:
-        _session_store.pop(session_id, None)
-
-def cleanup_expired():
-    now = int(time.time())
-    with _lock:
-        expired = [sid for sid, s in _session_store.items() if s["exp"] < now]
-        for sid in expired:
-            del _session_store[sid]
+import time
+import threading
+from collections import OrderedDict
+
+from SecureServer.code.state_backend import state
+
+# Sessions live in the state backend (shared between workers); the KEK cache is per process
+_kek_cache = OrderedDict()  # session_id -> stretched login secret, in LRU order
+_lock = threading.Lock()
+
+SESSION_TTL = 3600  # seconds
+KEK_CACHE_SIZE = 4096  # max cached session keys
+
+def create_session(session_id: str, login_secret: bytes, key_schedule: bool = False, base_key: bytes = None):
+    """base_key is kept with the session so other workers and restarts skip the stretch."""
+    state.sessions.set(session_id, {
+        "login_secret": login_secret,
+        "base_key": base_key,
+        "key_schedule": key_schedule,
+        "exp": int(time.time()) + SESSION_TTL
+    })
+
+def get_session(session_id: str):
+    session = state.sessions.get(session_id)
+    if not session:
+        with _lock:
+            _kek_cache.pop(session_id, None)
+        return None
+    return session
+
+def destroy_session(session_id: str):
+    state.sessions.delete(session_id)
+    with _lock:
+        _kek_cache.pop(session_id, None)
+
+def cleanup_expired() -> int:
+    """Drop expired sessions and their cached keys. Returns how many sessions were dropped."""
+    now = int(time.time())
+    dropped = state.sessions.cleanup(now)
+    with _lock:
+        # Bounded by KEK_CACHE_SIZE, so a scan is cheap
+        stale = [sid for sid, k in _kek_cache.items() if k["exp"] < now]
+        for sid in stale:
+            del _kek_cache[sid]
+    return dropped
+
+# --- Derived KEK cache ---
+def cache_kek(session_id: str, base_key: bytes):
+    """Remember the stretched secret for a session so requests skip PBKDF2."""
+    session = state.sessions.get(session_id)
+    exp = session["exp"] if session else int(time.time()) + SESSION_TTL
+    with _lock:
+        _kek_cache[session_id] = {"key": base_key, "exp": exp}
+        _kek_cache.move_to_end(session_id)
+
+        while len(_kek_cache) > KEK_CACHE_SIZE:
+            _kek_cache.popitem(last=False)
+
+def get_cached_kek(session_id: str):
+    with _lock:
+        entry = _kek_cache.get(session_id)
+        if not entry:
+            return None
+
+        if entry["exp"] < time.time():
+            del _kek_cache[session_id]
+            return None
+
+        _kek_cache.move_to_end(session_id)
+        return entry["key"]
@@ -0,0 +1,219 @@
+import os, json, sqlite3, threading
+from contextlib import contextmanager
+
+from SecureServer.code.encryption import encrypt_vault, decrypt_vault, calculate_hmac
+from SecureServer.code.integrity import sign_record, verify_record
+from SecureServer.code.environment_variables import SYSTEM_KEY
+from SecureServer.code.paths import USERS_DB_FILE, USERS_FILE, USERS_INDEX_FILE
+from SecureServer.code.logs import server_log
+from SecureServer.code import vault_store
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id            TEXT PRIMARY KEY,
+    username_hash TEXT NOT NULL UNIQUE,
+    data          TEXT NOT NULL,
+    vault         TEXT,
+    signature     TEXT NOT NULL
+)
+"""
+
+SELECT_BY_ID = "SELECT id, data, vault, signature FROM users WHERE id = ?"
+SELECT_BY_USERNAME = "SELECT id, data, vault, signature FROM users WHERE username_hash = ?"
+SELECT_ALL = "SELECT id, data, vault, signature FROM users ORDER BY rowid"
+SELECT_PAGE = "SELECT id, data, vault, signature FROM users WHERE id > ? ORDER BY id LIMIT ?"
+SELECT_NAMES = "SELECT id, data FROM users"
+SELECT_IDS = "SELECT id FROM users"
+SELECT_EXISTS = "SELECT 1 FROM users WHERE username_hash = ?"
+SELECT_COUNT = "SELECT COUNT(*) FROM users"
+DELETE_BY_ID = "DELETE FROM users WHERE id = ?"
+UPSERT = """
+INSERT INTO users (id, username_hash, data, vault, signature) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(id) DO UPDATE SET
+    username_hash = excluded.username_hash,
+    data = excluded.data,
+    vault = excluded.vault,
+    signature = excluded.signature
+"""
+
+SCAN_BATCH = 256  # rows read per query by scan()
+
+class SqliteUserRepository:
+    """
+    Same interface as UserRepository, backed by SQLite in WAL mode.
+    One connection per thread; every save is its own transaction and
+    only touches the rows involved. Column values are encrypted with
+    SYSTEM_KEY and usernames are only stored as an HMAC for lookups.
+    """
+    def __init__(self, file=USERS_DB_FILE):
+        self._file = file
+        self._local = threading.local()
+        self._setup_lock = threading.Lock()
+        self._ready = False
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    # --- Connections ---
+    def _after_fork(self):
+        # SQLite connections must not be used across fork()
+        self._local = threading.local()
+        self._setup_lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self._file.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self._file, timeout=30, isolation_level=None, cached_statements=64)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        if not self._ready:
+            self._setup(conn)
+        return conn
+
+    def _setup(self, conn: sqlite3.Connection):
+        with self._setup_lock:
+            if self._ready:
+                return
+            conn.execute(SCHEMA)
+            if conn.execute("PRAGMA user_version").fetchone()[0] == 0:
+                self._migrate(conn)
+            self._ready = True
+
+    def _migrate(self, conn: sqlite3.Connection):
+        """One-shot import of the existing JSON (or sharded) user store."""
+        if USERS_INDEX_FILE.exists():
+            from SecureServer.code.user_store import ShardedUserRepository
+            users = ShardedUserRepository().all()
+        elif USERS_FILE.exists():
+            from SecureServer.code.file_handling import load_users
+            users = load_users()
+        else:
+            users = []
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] == 0:
+                conn.executemany(UPSERT, [self._row(u) for u in users])
+                conn.execute("PRAGMA user_version = 1")
+                server_log("NOTICE", f"Migrated {len(users)} user(s) to SQLite storage.")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # --- Row encoding ---
+    @staticmethod
+    def _username_hash(username: str) -> str:
+        return calculate_hmac(f"username:{username}")
+
+    def _row(self, user: dict) -> tuple:
+        record = {k: v for k, v in user.items() if k != "vault"}
+        return (
+            user["id"],
+            self._username_hash(user["username"]),
+            encrypt_vault(json.dumps(record), SYSTEM_KEY),
+            encrypt_vault(user["vault"], SYSTEM_KEY) if "vault" in user else None,
+            sign_record(user),
+        )
+
+    def _decode(self, row):
+        if row is None:
+            return None
+        user_id, data, vault, signature = row
+        user = json.loads(decrypt_vault(data, SYSTEM_KEY))
+        if vault is not None:
+            user["vault"] = decrypt_vault(vault, SYSTEM_KEY)
+        if user.get("id") != user_id or not verify_record(user, signature):
+            server_log("CRITICAL", f"User row integrity check failed for {user_id}!")
+            raise ValueError("Data integrity violation detected")
+        return user
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # --- Queries ---
+    def get_by_id(self, user_id: str):
+        return self._decode(self._conn().execute(SELECT_BY_ID, (user_id,)).fetchone())
+
+    def get_by_username(self, username: str):
+        user = self._decode(self._conn().execute(SELECT_BY_USERNAME, (self._username_hash(username),)).fetchone())
+        if not user or user["username"] != username:
+            return None
+        return user
+
+    def exists(self, username: str) -> bool:
+        return self._conn().execute(SELECT_EXISTS, (self._username_hash(username),)).fetchone() is not None
+
+    def all(self) -> list:
+        return [self._decode(row) for row in self._conn().execute(SELECT_ALL)]
+
+    def __len__(self):
+        return self._conn().execute(SELECT_COUNT).fetchone()[0]
+
+    def scan(self, after: str = None):
+        """Users in id order, starting after the id `after`, read SCAN_BATCH rows at a time."""
+        after = after or ""
+        while True:
+            rows = self._conn().execute(SELECT_PAGE, (after, SCAN_BATCH)).fetchall()
+            for row in rows:
+                yield self._decode(row)
+            if len(rows) < SCAN_BATCH:
+                return
+            after = rows[-1][0]
+
+    def usernames(self) -> dict:
+        """id -> username of every user; vaults are not read (the record signature is checked when a user is loaded)."""
+        return {user_id: json.loads(decrypt_vault(data, SYSTEM_KEY))["username"]
+                for user_id, data in self._conn().execute(SELECT_NAMES)}
+
+    # --- Persistence ---
+    def save_all(self, users: list):
+        """Replace the whole user list in one transaction. Removed users' vault files are deleted."""
+        rows = [self._row(u) for u in users]
+        keep = {u["id"] for u in users}
+        with self._transaction() as conn:
+            existing = {row[0] for row in conn.execute(SELECT_IDS)}
+            conn.executemany(DELETE_BY_ID, [(user_id,) for user_id in existing - keep])
+            conn.executemany(UPSERT, rows)
+        for user_id in existing - keep:
+            vault_store.delete(user_id)
+
+    def save_user(self, user: dict):
+        """Insert or replace a single user row (matched by id)."""
+        row = self._row(user)
+        with self._transaction() as conn:
+            conn.execute(UPSERT, row)
+
+    def save_many(self, users: list):
+        """Insert or replace several user rows (matched by id) in one transaction."""
+        rows = [self._row(u) for u in users]
+        with self._transaction() as conn:
+            conn.executemany(UPSERT, rows)
+
+    def update_fields(self, changes: dict) -> dict:
+        """
+        Set fields (not id or username) on several users in one transaction:
+        {user_id: {field: value}}. Rows are read inside the transaction, so
+        changes made elsewhere to other fields are kept. Returns the updated
+        records by id; unknown ids are skipped.
+        """
+        updated = {}
+        with self._transaction() as conn:
+            for user_id, fields in changes.items():
+                user = self._decode(conn.execute(SELECT_BY_ID, (user_id,)).fetchone())
+                if user is None:
+                    continue
+                user.update(fields)
+                conn.execute(UPSERT, self._row(user))
+                updated[user_id] = user
+        return updated
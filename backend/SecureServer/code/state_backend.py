@@ -0,0 +1,217 @@
+import os, time, heapq, signal, threading, multiprocessing
+from collections import OrderedDict
+from multiprocessing.connection import arbitrary_address
+from multiprocessing.managers import BaseManager
+
+from SecureServer.code.token_store import token_repository
+from SecureServer.code.lockout_store import lockout_tracker
+from SecureServer.code.file_writer import writer
+from SecureServer.code.session_db import SessionDatabase
+from SecureServer.code.environment_variables import PERSIST_SESSIONS, SESSION_CACHE_SIZE, RATE_LIMIT_MAX_KEYS
+from SecureServer.code.logs import server_log
+
+class SessionTable:
+    """
+    Login sessions by id, in least recently used order, with an expiry heap
+    so cleanup() only touches sessions that expired. Expired sessions are
+    also dropped when read. With a persistent store every session
+    is also written there; memory then only keeps the `limit` most recently
+    used ones and the rest are loaded back from the store on first use.
+    """
+    def __init__(self, store=None, limit: int = 0):
+        self._sessions = OrderedDict()
+        self._store = store
+        # Without a store an evicted session would be gone, so memory stays unbounded
+        self._limit = limit if store is not None else 0
+        self._expiry = []  # heap of (exp, session id)
+        self._lock = threading.Lock()
+
+    def _remember(self, session_id: str, session: dict):
+        self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+        heapq.heappush(self._expiry, (session["exp"], session_id))
+        if self._limit > 0:
+            while len(self._sessions) > self._limit:
+                self._sessions.popitem(last=False)
+
+    def set(self, session_id: str, session: dict):
+        with self._lock:
+            if self._store is not None:
+                self._store.save(session_id, session)
+            self._remember(session_id, session)
+
+    def get(self, session_id: str, now: float = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None and self._store is not None:
+                session = self._store.get(session_id, now)
+                if session is not None:
+                    self._remember(session_id, session)
+            if session is None:
+                return None
+            if session["exp"] < now:
+                self._drop(session_id)
+                return None
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def _drop(self, session_id: str):
+        self._sessions.pop(session_id, None)
+        if self._store is not None:
+            self._store.delete(session_id)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._drop(session_id)
+
+    def cleanup(self, now: float = None) -> int:
+        """Drop expired sessions, oldest first. Returns how many were dropped."""
+        now = time.time() if now is None else now
+        with self._lock:
+            dropped = 0
+            while self._expiry and self._expiry[0][0] < now:
+                exp, session_id = heapq.heappop(self._expiry)
+                session = self._sessions.get(session_id)
+                # Skip heap entries left behind by deleted, evicted or replaced sessions
+                if session is None or session["exp"] != exp:
+                    continue
+                del self._sessions[session_id]
+                dropped += 1
+
+            if len(self._expiry) > 2 * len(self._sessions) + 64:
+                self._expiry = [(s["exp"], sid) for sid, s in self._sessions.items()]
+                heapq.heapify(self._expiry)
+
+            if self._store is not None:
+                # Every persisted session is in the store, including the ones just dropped
+                dropped = self._store.delete_expired(now)
+            return dropped
+
+    def count(self) -> int:
+        with self._lock:
+            if self._store is not None:
+                return self._store.count()
+            return len(self._sessions)
+
+class RateLimitTable:
+    """
+    GCRA rate limit state: per key only the theoretical arrival time (TAT)
+    of its next request. Keys are kept in least recently used order and the
+    oldest are dropped past max_keys; by then their TAT has almost always
+    passed, which is the same as having no entry at all.
+    """
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self._tat = OrderedDict()
+        self._max = max(1, max_keys)
+        self._lock = threading.Lock()
+
+    def acquire(self, items: list, now: float = None):
+        """
+        Take one request for every (key, interval, burst) in items, or for none.
+        Returns None if allowed, else (index of the first exceeded item, seconds to wait).
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            tats = []
+            for index, (key, interval, burst) in enumerate(items):
+                tat = max(self._tat.get(key, now), now)
+                if tat - burst > now:
+                    return index, tat - burst - now
+                tats.append(tat + interval)
+
+            for (key, _, _), tat in zip(items, tats):
+                self._tat[key] = tat
+                self._tat.move_to_end(key)
+            while len(self._tat) > self._max:
+                self._tat.popitem(last=False)
+            return None
+
+    def reset(self):
+        with self._lock:
+            self._tat.clear()
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._tat)
+
+# --- Shared state server ---
+SESSION_METHODS = ("set", "get", "delete", "cleanup", "count")
+RATE_LIMIT_METHODS = ("acquire", "reset", "count")
+TOKEN_METHODS = ("get", "for_user", "all", "add", "remove", "remove_user", "clear", "prune", "flush")
+LOCKOUT_METHODS = ("locked", "count", "all", "record_failure", "clear", "clear_all", "prune", "flush")
+
+class StateManager(BaseManager):
+    """Serves the state server's tables to worker processes over a local socket."""
+
+# The callables run in the state server, which only ever holds local tables
+StateManager.register("sessions", callable=lambda: state.sessions, exposed=SESSION_METHODS)
+StateManager.register("rate_limits", callable=lambda: state.rate_limits, exposed=RATE_LIMIT_METHODS)
+StateManager.register("tokens", callable=lambda: state.tokens, exposed=TOKEN_METHODS)
+StateManager.register("lockouts", callable=lambda: state.lockouts, exposed=LOCKOUT_METHODS)
+
+class StateBackend:
+    """
+    Where sessions, rate limit state, tokens and login lockouts live.
+    With one worker they are plain objects in this process. With several,
+    a state server process owns them and every worker talks to it through
+    proxies with the same methods, so a user's session is valid on any worker.
+    """
+    def __init__(self):
+        self.shared = False
+        self.sessions = SessionTable(SessionDatabase() if PERSIST_SESSIONS else None, SESSION_CACHE_SIZE)
+        self.rate_limits = RateLimitTable()
+        self.tokens = token_repository
+        self.lockouts = lockout_tracker
+
+    def start_server(self):
+        """Fork the state server. Returns (process, address, authkey) for connect()."""
+        address = arbitrary_address("AF_UNIX")
+        authkey = os.urandom(32)
+        writer.flush()
+        process = multiprocessing.get_context("fork").Process(
+            target=_serve, args=(address, authkey), name="state-server", daemon=True
+        )
+        process.start()
+        return process, address, authkey
+
+    def connect(self, address: str, authkey: bytes, timeout: float = 10):
+        """Switch this (worker) process over to the state server's tables."""
+        manager = StateManager(address=address, authkey=authkey)
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                manager.connect()
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+        self.sessions = manager.sessions()
+        self.rate_limits = manager.rate_limits()
+        self.tokens = manager.tokens()
+        self.lockouts = manager.lockouts()
+        self.shared = True
+
+        # Other workers read the same user files, so writes must land right away
+        writer.set_window(0)
+
+def _serve(address: str, authkey: bytes):
+    # Ctrl-C reaches the whole process group; the supervisor stops us after the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)  # a warm restart is driven by the supervisor
+    server = StateManager(address=address, authkey=authkey).get_server()
+    signal.signal(signal.SIGTERM, lambda sig, frame: server.stop_event.set())
+    try:
+        server.serve_forever()
+    except SystemExit:
+        pass
+    finally:
+        state.tokens.flush()
+        state.lockouts.flush()
+        writer.flush()
+        server_log("SHUTDOWN", "State server stopped.")
+
+state = StateBackend()
@@ -0,0 +1,199 @@
+import os, re, sys, gzip, json, shutil, hashlib, mimetypes
+from pathlib import Path, PurePosixPath
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse
+
+from SecureServer.code.middleware import StaticFilesWithHeaders
+from SecureServer.code.logs import server_log
+
+try:
+    import brotli
+except ImportError:  # optional; gzip variants are always built
+    brotli = None
+
+BUILD_VERSION = 1
+ASSETS_SUFFIX = ".assets.json"  # the asset table is kept beside (not inside) the served build
+
+COMPRESSIBLE = {".html", ".css", ".js", ".mjs", ".json", ".map", ".webmanifest", ".svg", ".txt", ".xml", ".ico"}
+MIN_SAVING = 0.9  # keep a variant only if it is at most 90% of the original
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# Files whose references to other files are rewritten to the fingerprinted names
+REFERENCE_PATTERNS = {
+    ".html": re.compile(r"""(\b(?:src|href)\s*=\s*)(["'])(.*?)\2""", re.IGNORECASE),
+    ".css": re.compile(r"""(url\(\s*)(["']?)([^"')]+)\2"""),
+    ".webmanifest": re.compile(r"""("src"\s*:\s*)(")([^"]+)\2"""),
+}
+
+# (Content-Encoding, file suffix, compress), best first
+ENCODINGS = [("gzip", ".gz", lambda data: gzip.compress(data, 9, mtime=0))]
+if brotli is not None:
+    ENCODINGS.insert(0, ("br", ".br", lambda data: brotli.compress(data, quality=11)))
+
+# --- Build ---
+def _source_signature(files: list, source: Path) -> str:
+    digest = hashlib.sha256(f"{BUILD_VERSION}:{[e for e, _, _ in ENCODINGS]}".encode())
+    for rel in files:
+        st = (source / rel).stat()
+        digest.update(f"{rel}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+def _build_order(rel: str) -> int:
+    """Plain assets first, then stylesheets/manifests (may point at assets), then pages."""
+    suffix = PurePosixPath(rel).suffix.lower()
+    return {".css": 1, ".webmanifest": 1, ".html": 2}.get(suffix, 0)
+
+def _fingerprinted(rel: str, digest: str) -> str:
+    path = PurePosixPath(rel)
+    return str(path.with_name(f"{path.stem}.{digest}{path.suffix}"))
+
+def _rewrite(rel: str, text: str, hashed: dict) -> str:
+    """Point references in a page/stylesheet/manifest at fingerprinted names."""
+    pattern = REFERENCE_PATTERNS[PurePosixPath(rel).suffix.lower()]
+    base = PurePosixPath(rel).parent
+
+    def replace(match):
+        prefix, quote, ref = match.groups()
+        if not ref or ref.startswith(("#", "//", "data:", "mailto:")) or "://" in ref:
+            return match.group(0)
+        cut = re.search(r"[?#]", ref)
+        path, tail = (ref[:cut.start()], ref[cut.start():]) if cut else (ref, "")
+        target = path.lstrip("/") if path.startswith("/") else os.path.normpath(str(base / path)).replace(os.sep, "/")
+        if target not in hashed:
+            return match.group(0)
+        new_path = path[:len(path) - len(PurePosixPath(path).name)] + PurePosixPath(hashed[target]).name
+        return f"{prefix}{quote}{new_path}{tail}{quote}"
+
+    return pattern.sub(replace, text)
+
+def _write_variants(path: Path, data: bytes) -> list:
+    """Write precompressed copies next to path. Returns the encodings written."""
+    if path.suffix.lower() not in COMPRESSIBLE:
+        return []
+    written = []
+    for encoding, suffix, compress in ENCODINGS:
+        compressed = compress(data)
+        if len(compressed) <= len(data) * MIN_SAVING:
+            path.with_name(path.name + suffix).write_bytes(compressed)
+            written.append(encoding)
+    return written
+
+def build_assets(source: Path, target: Path) -> dict:
+    """
+    Build target from source: every file, a content-hashed copy of every
+    non-HTML file, HTML/CSS/manifest references rewritten to the hashed
+    names, and gzip (and brotli, if installed) variants. Returns the asset
+    table (relative path -> hash, encodings, immutable), also saved as
+    <target>.assets.json. Nothing is rebuilt if source has not changed.
+    """
+    source, target = Path(source), Path(target)
+    files = sorted(
+        str(p.relative_to(source)).replace(os.sep, "/") for p in source.rglob("*") if p.is_file()
+    )
+    signature = _source_signature(files, source)
+    table = target.with_name(target.name + ASSETS_SUFFIX)
+
+    try:
+        built = json.loads(table.read_text())
+        if built.get("signature") == signature:
+            return built["assets"]
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+
+    staging = target.with_name(target.name + ".building")
+    shutil.rmtree(staging, ignore_errors=True)
+    assets, hashed = {}, {}
+    for rel in sorted(files, key=_build_order):
+        data = (source / rel).read_bytes()
+        suffix = PurePosixPath(rel).suffix.lower()
+        if suffix in REFERENCE_PATTERNS:
+            data = _rewrite(rel, data.decode("utf-8"), hashed).encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()[:12]
+
+        names = [rel]
+        if suffix and suffix != ".html":
+            hashed[rel] = _fingerprinted(rel, digest)
+            names.append(hashed[rel])
+
+        for name in names:
+            out = staging / name
+            out.parent.mkdir(parents=True, exist_ok=True)
+            out.write_bytes(data)
+            assets[name] = {
+                "hash": digest,
+                "encodings": _write_variants(out, data),
+                "immutable": name != rel,
+            }
+
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(staging, target)
+    table.write_text(json.dumps({"signature": signature, "assets": assets}, indent=2))
+    server_log("NOTICE", f"Built {len(files)} static file(s) into {target.name} ({len(hashed)} fingerprinted).")
+    return assets
+
+# --- Serving ---
+def accepted_encodings(header: str) -> set:
+    """Content codings allowed by an Accept-Encoding header (q=0 excluded)."""
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q=") and q[2:].strip() in ("0", "0.0", "0.00", "0.000"):
+            continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+class PrecompressedStaticFiles(StaticFilesWithHeaders):
+    """
+    Serves a build_assets() directory: picks the best precompressed variant
+    the client accepts, uses the content hash as ETag (304 on match) and
+    marks fingerprinted files immutable; everything else is revalidated.
+    """
+    vary_encoding = True
+
+    def __init__(self, *args, assets: dict = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.assets = assets or {}
+        self._root = os.path.realpath(self.directory)
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        rel = os.path.relpath(os.path.realpath(full_path), self._root).replace(os.sep, "/")
+        asset = self.assets.get(rel)
+        if asset is None:
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        request_headers = Headers(scope=scope)
+        path, encoding = full_path, None
+        if asset["encodings"]:
+            accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+            for name, suffix, _ in ENCODINGS:
+                if name in asset["encodings"] and name in accepted:
+                    path, encoding = f"{full_path}{suffix}", name
+                    break
+
+        media_type = mimetypes.guess_type(str(full_path))[0] or "text/plain"
+        if encoding is not None:
+            stat_result = os.stat(path)
+        response = FileResponse(path, status_code=status_code, stat_result=stat_result, media_type=media_type)
+        response.headers["etag"] = f'"{asset["hash"]}-{encoding}"' if encoding else f'"{asset["hash"]}"'
+        response.headers["cache-control"] = IMMUTABLE if asset["immutable"] else REVALIDATE
+        if asset["encodings"]:
+            response.headers["vary"] = "Accept-Encoding"
+        if encoding is not None:
+            response.headers["content-encoding"] = encoding
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+if __name__ == "__main__":
+    # Build ahead of time: python -m SecureServer.code.static_assets <source dir> <build dir>
+    if len(sys.argv) != 3:
+        print("Usage: python -m SecureServer.code.static_assets <source dir> <build dir>", file=sys.stderr)
+        sys.exit(2)
+    built = build_assets(Path(sys.argv[1]), Path(sys.argv[2]))
+    print(f"{len(built)} file(s) in {sys.argv[2]}")
+    sys.exit(0)
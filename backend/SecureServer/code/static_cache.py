@@ -0,0 +1,95 @@
+import os
+from collections import OrderedDict
+from starlette.datastructures import Headers
+from starlette.responses import Response, FileResponse
+
+class CachedFile:
+    """One static file response held in memory: body plus the headers FileResponse built for it."""
+    __slots__ = ("path", "mtime", "size", "body", "raw_headers", "headers")
+
+    def __init__(self, path: str, stat_result: os.stat_result, body: bytes, raw_headers: list):
+        self.path = path
+        self.mtime = stat_result.st_mtime_ns
+        self.size = stat_result.st_size
+        self.body = body
+        self.raw_headers = raw_headers
+        self.headers = Headers(raw=raw_headers)
+
+    def is_current(self) -> bool:
+        """False once the file on disk was changed or removed."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return False
+        return st.st_mtime_ns == self.mtime and st.st_size == self.size
+
+    def response(self) -> Response:
+        response = Response(self.body)
+        response.raw_headers = list(self.raw_headers)
+        return response
+
+class StaticFileCache:
+    """
+    LRU cache of small static files, bounded by max_bytes of body data.
+    Entries are checked against the file's mtime/size on every hit, so edits
+    on disk are picked up immediately. Files over max_file_size are never
+    cached and keep streaming from disk.
+    """
+    def __init__(self, max_bytes: int, max_file_size: int):
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self.total = 0
+        self.hits = self.misses = 0
+        self._entries = OrderedDict()  # key -> CachedFile, least recently used first
+
+    def get(self, key) -> CachedFile | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if not entry.is_current():
+            self._drop(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def cacheable(self, response) -> bool:
+        return (
+            isinstance(response, FileResponse) and response.status_code == 200
+            and response.stat_result is not None and response.stat_result.st_size <= self.max_file_size
+        )
+
+    @staticmethod
+    def load(response: FileResponse) -> CachedFile | None:
+        """Read a FileResponse's file (blocking; run in a thread). None if it changed while reading."""
+        try:
+            with open(response.path, "rb") as f:
+                st = os.fstat(f.fileno())
+                body = f.read()
+        except OSError:
+            return None
+        if len(body) != st.st_size or st.st_size != response.stat_result.st_size:
+            return None
+        return CachedFile(os.fspath(response.path), st, body, list(response.raw_headers))
+
+    def put(self, key, entry: CachedFile) -> None:
+        if key in self._entries:
+            self._drop(key)
+        if entry.size > self.max_file_size or entry.size > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self.total += entry.size
+        while self.total > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key) -> None:
+        self.total -= self._entries.pop(key).size
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.total = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
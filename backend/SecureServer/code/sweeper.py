@@ -0,0 +1,80 @@
+import time, asyncio
+from contextlib import asynccontextmanager
+
+from SecureServer.code.state_backend import state
+from SecureServer.code.session_store import cleanup_expired, destroy_session
+from SecureServer.code.environment_variables import SESSION_SWEEP_INTERVAL, TOKEN_SWEEP_INTERVAL, LOCKOUT_SWEEP_INTERVAL
+from SecureServer.code.logs import server_log
+
+class ExpirySweeper:
+    """
+    Background task that drops expired sessions, tokens and lockout failures,
+    so memory and data files track live state rather than past traffic.
+    Every store keeps an expiry heap, so a sweep only touches what expired.
+    Counts of evicted items are kept per store in `evicted`.
+    """
+    def __init__(self, sessions: int = SESSION_SWEEP_INTERVAL, tokens: int = TOKEN_SWEEP_INTERVAL,
+                 lockouts: int = LOCKOUT_SWEEP_INTERVAL):
+        self.intervals = {"sessions": sessions, "tokens": tokens, "lockouts": lockouts}
+        self.evicted = {name: 0 for name in self.intervals}
+        self.sweeps = {name: 0 for name in self.intervals}
+        self.last_sweep = {}  # name -> {"at", "evicted", "ms"}
+        self._tasks = []
+
+    # --- Sweeps ---
+    def sweep_sessions(self) -> int:
+        return cleanup_expired()
+
+    def sweep_tokens(self) -> int:
+        removed = state.tokens.prune()
+        # A session is useless once its token expired
+        for t in removed:
+            destroy_session(t.get("session_id"))
+        state.tokens.flush()
+        return len(removed)
+
+    def sweep_lockouts(self) -> int:
+        return state.lockouts.prune()
+
+    def sweep(self, name: str) -> int:
+        """Run one sweep of a store ("sessions", "tokens" or "lockouts") and record it."""
+        start = time.perf_counter()
+        evicted = getattr(self, f"sweep_{name}")()
+        self.evicted[name] += evicted
+        self.sweeps[name] += 1
+        self.last_sweep[name] = {"at": time.time(), "evicted": evicted, "ms": (time.perf_counter() - start) * 1000}
+        return evicted
+
+    # --- Background tasks ---
+    async def _run(self, name: str, interval: int):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                # Sweeps may write files or talk to the state server, so keep them off the event loop
+                evicted = await asyncio.to_thread(self.sweep, name)
+                if evicted:
+                    server_log("SWEEP", f"Evicted {evicted} expired {name} ({self.last_sweep[name]['ms']:.1f} ms).")
+            except Exception as e:
+                server_log("ERROR", f"Expired {name} sweep failed: {type(e).__name__}")
+
+    def start(self):
+        for name, interval in self.intervals.items():
+            if interval > 0:
+                self._tasks.append(asyncio.create_task(self._run(name, interval), name=f"sweep-{name}"))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    @asynccontextmanager
+    async def lifespan(self, app):
+        """FastAPI lifespan: sweep while the app is being served."""
+        self.start()
+        try:
+            yield
+        finally:
+            await self.stop()
+
+sweeper = ExpirySweeper()
@@ -0,0 +1,186 @@
+import os, time, heapq, bisect, threading
+
+from SecureServer.code.file_handling import load_tokens, save_tokens
+from SecureServer.code.file_writer import writer, file_lock
+from SecureServer.code.paths import TOKENS_FILE
+
+SCAN_BATCH = 256  # tokens taken per lock by scan()
+
+class TokenRepository:
+    """
+    In-memory view of tokens.json.
+    Indexed by hashed token id and by user id, with an expiry heap for cleanup.
+    Changes are only written back by flush(), and only if something changed.
+    The file is reloaded when another process (adminPortal scripts) rewrites it;
+    changes not yet flushed are kept and applied on top of the reloaded tokens,
+    so neither process's adds or removals undo the other's.
+    """
+    def __init__(self, file=TOKENS_FILE):
+        self._file = file
+        self._lock = threading.RLock()
+        self._by_id = {}
+        self._by_user = {}
+        self._expiry = []  # heap of (exp, token id)
+        self._sorted_ids = None  # token ids in order, for scan(); rebuilt after a change
+        self._stamp = None
+        self._loaded = False
+        self._changes = {}  # token id -> token (added) or None (removed), since the last flush
+
+    # --- Loading ---
+    def _file_stamp(self):
+        try:
+            st = os.stat(self._file)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _refresh(self):
+        """Reload from disk if the file changed since we last read or wrote it."""
+        stamp = self._file_stamp()
+        if self._loaded and stamp == self._stamp:
+            return
+        if self._loaded and stamp is not None and stamp == writer.written_stamp(self._file):
+            # Our own write; memory is already up to date
+            self._stamp = stamp
+            return
+
+        tokens = load_tokens() or []
+        self._by_id = {}
+        self._by_user = {}
+        self._expiry = []
+        self._sorted_ids = None
+        for t in tokens:
+            self._index(t)
+        # Re-apply what this process changed but has not written yet
+        for token_id, token in self._changes.items():
+            self._unindex(token_id)
+            if token is not None:
+                self._index(token)
+        self._loaded = True
+        self._stamp = self._file_stamp()
+
+    def _index(self, token: dict):
+        self._sorted_ids = None
+        self._by_id[token["id"]] = token
+        self._by_user.setdefault(token["user_id"], set()).add(token["id"])
+        heapq.heappush(self._expiry, (token["exp"], token["id"]))
+
+    def _unindex(self, token_id: str):
+        token = self._by_id.pop(token_id, None)
+        if token is None:
+            return None
+        self._sorted_ids = None
+        ids = self._by_user.get(token["user_id"])
+        if ids is not None:
+            ids.discard(token_id)
+            if not ids:
+                del self._by_user[token["user_id"]]
+        return token
+
+    # --- Queries ---
+    def get(self, token_id: str):
+        with self._lock:
+            self._refresh()
+            return self._by_id.get(token_id)
+
+    def for_user(self, user_id: str) -> list:
+        with self._lock:
+            self._refresh()
+            return [self._by_id[i] for i in self._by_user.get(user_id, ())]
+
+    def all(self) -> list:
+        with self._lock:
+            self._refresh()
+            return list(self._by_id.values())
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._by_id)
+
+    def scan(self, after: str = None):
+        """Tokens in id order, starting after the id `after` (for paged listings), SCAN_BATCH at a time."""
+        while True:
+            with self._lock:
+                self._refresh()
+                if self._sorted_ids is None:
+                    self._sorted_ids = sorted(self._by_id)
+                start = bisect.bisect_right(self._sorted_ids, after) if after is not None else 0
+                batch = [self._by_id[token_id] for token_id in self._sorted_ids[start:start + SCAN_BATCH]]
+            yield from batch
+            if len(batch) < SCAN_BATCH:
+                return
+            after = batch[-1]["id"]
+
+    # --- Mutations ---
+    def add(self, token: dict):
+        with self._lock:
+            self._refresh()
+            self._unindex(token["id"])
+            self._index(token)
+            self._changes[token["id"]] = token
+
+    def remove(self, token_id: str):
+        with self._lock:
+            self._refresh()
+            token = self._unindex(token_id)
+            if token is not None:
+                self._changes[token_id] = None
+            return token
+
+    def remove_user(self, user_id: str) -> list:
+        """Remove every token for a user. Returns the removed tokens."""
+        with self._lock:
+            self._refresh()
+            removed = [self._unindex(i) for i in list(self._by_user.get(user_id, ()))]
+            for token in removed:
+                self._changes[token["id"]] = None
+            return removed
+
+    def clear(self):
+        with self._lock:
+            self._refresh()
+            for token_id in self._by_id:
+                self._changes[token_id] = None
+            self._by_id = {}
+            self._by_user = {}
+            self._expiry = []
+            self._sorted_ids = None
+
+    def prune(self, now: int = None) -> list:
+        """Drop expired tokens, oldest first. Returns the removed tokens."""
+        now = int(time.time()) if now is None else now
+        removed = []
+        with self._lock:
+            self._refresh()
+            while self._expiry and self._expiry[0][0] <= now:
+                exp, token_id = heapq.heappop(self._expiry)
+                token = self._by_id.get(token_id)
+                # Skip heap entries left behind by removed or replaced tokens
+                if token is None or token["exp"] != exp:
+                    continue
+                removed.append(self._unindex(token_id))
+
+            if len(self._expiry) > 2 * len(self._by_id) + 64:
+                self._expiry = [(t["exp"], i) for i, t in self._by_id.items()]
+                heapq.heapify(self._expiry)
+
+            for token in removed:
+                self._changes[token["id"]] = None
+        return removed
+
+    # --- Persistence ---
+    def flush(self) -> bool:
+        """Write tokens.json if the token set changed. Returns True if written."""
+        with self._lock:
+            if not self._changes:
+                return False
+            # Under the file lock, so another process cannot write between our reload and our write
+            with file_lock(self._file):
+                self._refresh()
+                save_tokens(list(self._by_id.values()))
+            self._changes = {}
+            self._stamp = self._file_stamp()
+            return True
+
+token_repository = TokenRepository()
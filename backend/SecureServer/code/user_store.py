@@ -0,0 +1,456 @@
+import os, copy, bisect, threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from SecureServer.code.file_handling import (
+    load_signed_users, save_signed_users, load_users,
+    load_user_shard, save_user_shard, load_vault_shard, save_vault_shard, delete_user_shards,
+    user_shard_path, vault_shard_path, load_users_index, save_users_index
+)
+from SecureServer.code.integrity import MerkleTree, sign_record, verify_record
+from SecureServer.code.environment_variables import USER_STORAGE
+from SecureServer.code.file_writer import writer, file_lock
+from SecureServer.code.paths import USERS_FILE, USERS_INDEX_FILE
+from SecureServer.code.logs import server_log
+from SecureServer.code import vault_store
+
+SCAN_BATCH = 256  # records copied per lock by scan()
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+class UserRepository:
+    """
+    In-memory view of users.json, decrypted once and indexed by id and username.
+    Each record carries its own signature under a Merkle root. The root is
+    checked on load and each record on first access, so a single-user save
+    only re-signs that record and its path to the root.
+    Reloads when the file's mtime or size changes, so writes from the
+    adminPortal scripts are picked up.
+    Records are handed out as copies; write changes back with save_user().
+    """
+    def __init__(self, file=USERS_FILE):
+        self._file = file
+        self._lock = threading.RLock()
+        self._users = []
+        self._tree = MerkleTree([])
+        self._verified = set()
+        self._by_id = {}
+        self._by_username = {}
+        self._sorted_ids = None  # ids in order, for scan(); rebuilt after an id is added or removed
+        self._stamp = None
+
+    # --- Loading ---
+    def _file_stamp(self):
+        return _file_stamp(self._file)
+
+    def _refresh(self):
+        """Reload from disk if the file changed since we last read or wrote it."""
+        stamp = self._file_stamp()
+        if stamp is not None and stamp == self._stamp:
+            return
+        if self._stamp is not None and stamp is not None and stamp == writer.written_stamp(self._file):
+            # Our own write; memory is already up to date
+            self._stamp = stamp
+            return
+        users, leaves = load_signed_users()
+        self._users = users
+        self._tree = MerkleTree(leaves)
+        self._verified = set()
+        self._reindex()
+        self._stamp = self._file_stamp()
+
+    def _reindex(self):
+        self._sorted_ids = None
+        self._by_id = {u["id"]: i for i, u in enumerate(self._users)}
+        self._by_username = {u["username"]: i for i, u in enumerate(self._users)}
+
+    def _checked(self, index: int) -> dict:
+        """Return the record at index, verifying its signature on first access."""
+        user = self._users[index]
+        if index not in self._verified:
+            if not verify_record(user, self._tree.leaf(index)):
+                server_log("CRITICAL", "Users file integrity check failed!")
+                raise ValueError("Data integrity violation detected")
+            self._verified.add(index)
+        return user
+
+    # --- Queries ---
+    def get_by_id(self, user_id: str):
+        with self._lock:
+            self._refresh()
+            index = self._by_id.get(user_id)
+            return copy.deepcopy(self._checked(index)) if index is not None else None
+
+    def get_by_username(self, username: str):
+        with self._lock:
+            self._refresh()
+            index = self._by_username.get(username)
+            return copy.deepcopy(self._checked(index)) if index is not None else None
+
+    def exists(self, username: str) -> bool:
+        with self._lock:
+            self._refresh()
+            index = self._by_username.get(username)
+            return index is not None and self._checked(index)["username"] == username
+
+    def all(self) -> list:
+        with self._lock:
+            self._refresh()
+            return [copy.deepcopy(self._checked(i)) for i in range(len(self._users))]
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._users)
+
+    def scan(self, after: str = None):
+        """Users (copies) in id order, starting after the id `after`. For paged listings: SCAN_BATCH records are copied at a time."""
+        while True:
+            with self._lock:
+                self._refresh()
+                if self._sorted_ids is None:
+                    self._sorted_ids = sorted(self._by_id)
+                start = bisect.bisect_right(self._sorted_ids, after) if after is not None else 0
+                batch = [copy.deepcopy(self._checked(self._by_id[user_id]))
+                         for user_id in self._sorted_ids[start:start + SCAN_BATCH]]
+            yield from batch
+            if len(batch) < SCAN_BATCH:
+                return
+            after = batch[-1]["id"]
+
+    def usernames(self) -> dict:
+        """id -> username of every user, in one pass without copying records."""
+        with self._lock:
+            self._refresh()
+            return {user["id"]: user["username"] for user in map(self._checked, range(len(self._users)))}
+
+    # --- Persistence ---
+    def save_all(self, users: list):
+        """Replace the whole user list (re-signs every record). Removed users' vault files are deleted."""
+        with self._lock, file_lock(self._file):
+            try:
+                self._refresh()
+            except ValueError:
+                pass  # a corrupt file is replaced as a whole anyway
+            removed = set(self._by_id) - {u["id"] for u in users}
+            self._users = copy.deepcopy(users)
+            self._tree = MerkleTree([sign_record(u) for u in self._users])
+            self._verified = set(range(len(self._users)))
+            self._reindex()
+            self._write()
+        for user_id in removed:
+            vault_store.delete(user_id)
+
+    def save_user(self, user: dict):
+        """Insert or replace a single user record (matched by id)."""
+        self.save_many([user])
+
+    def save_many(self, users: list):
+        """Insert or replace several user records (matched by id) with one write of the file."""
+        with self._lock, file_lock(self._file):
+            self._refresh()
+            for user in users:
+                self._put(copy.deepcopy(user))
+            self._write()
+
+    def update_fields(self, changes: dict) -> dict:
+        """
+        Set fields (not id or username) on several users with one write:
+        {user_id: {field: value}}. The file is re-read under its lock first,
+        so changes made elsewhere to other fields are kept. Returns the
+        updated records by id; unknown ids are skipped.
+        """
+        with self._lock, file_lock(self._file):
+            self._refresh()
+            updated = {}
+            for user_id, fields in changes.items():
+                index = self._by_id.get(user_id)
+                if index is None:
+                    continue
+                user = copy.deepcopy(self._checked(index))
+                user.update(fields)
+                self._put(user)
+                updated[user_id] = copy.deepcopy(user)
+            if updated:
+                self._write()
+            return updated
+
+    def _put(self, user: dict):
+        index = self._by_id.get(user["id"])
+        if index is None:
+            index = len(self._users)
+            self._users.append(user)
+            self._sorted_ids = None
+            self._tree.append(sign_record(user))
+        else:
+            self._by_username.pop(self._users[index]["username"], None)
+            self._users[index] = user
+            self._tree.update(index, sign_record(user))
+        self._by_id[user["id"]] = index
+        self._by_username[user["username"]] = index
+        self._verified.add(index)
+
+    def _write(self):
+        save_signed_users(self._users, self._tree)
+        self._stamp = self._file_stamp()
+
+class ShardedUserRepository:
+    """
+    Same interface as UserRepository, but every user record and every vault
+    is its own encrypted file, with a small encrypted username -> id index.
+    Reads only touch the files of the user involved; records are cached per
+    user and re-read when their files change.
+    The signed index also holds a digest of every user's record and vault,
+    checked on load, so an older (validly signed) copy of one user's shard
+    cannot be put back; every save of a user rewrites the index too.
+    """
+    CACHE_SIZE = 1024
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._index = {}
+        self._digests = {}  # id -> sign_record() of the user with its vault
+        self._index_stamp = None
+        self._index_locked = False  # this repository holds file_lock(USERS_INDEX_FILE)
+        self._sorted_ids = None  # ids in order, for scan(); rebuilt when the index changes
+        self._cache = OrderedDict()  # id -> (stamps, digest, record)
+
+    # --- Index ---
+    @contextmanager
+    def _index_lock(self):
+        """self._lock plus file_lock(USERS_INDEX_FILE); re-entrant, unlike file_lock itself."""
+        with self._lock:
+            if self._index_locked:
+                yield
+                return
+            with file_lock(USERS_INDEX_FILE):
+                self._index_locked = True
+                try:
+                    yield
+                finally:
+                    self._index_locked = False
+
+    def _refresh(self):
+        stamp = _file_stamp(USERS_INDEX_FILE)
+        if stamp is not None and stamp == self._index_stamp:
+            return
+        loaded = load_users_index()
+        if loaded is None:
+            self._migrate()
+            return
+        index, digests = loaded
+        self._index = index
+        self._sorted_ids = None
+        self._index_stamp = _file_stamp(USERS_INDEX_FILE)
+        if digests is None:
+            # Index written before digests were kept, upgraded from the shards as they are now
+            with self._index_lock():
+                records = {user_id: self._read_user(user_id) for user_id in index.values()}
+                self._digests = {user_id: sign_record(r) for user_id, r in records.items() if r is not None}
+                self._save_index()
+        else:
+            self._digests = digests
+
+    def _migrate(self):
+        """One-shot move from users.json into per-user shards."""
+        users = load_users() if USERS_FILE.exists() else []
+        self._digests = {}
+        for user in users:
+            self._write_user(user)
+        self._index = {u["username"]: u["id"] for u in users}
+        self._save_index()
+        server_log("NOTICE", f"Migrated {len(users)} user(s) to sharded storage.")
+
+    def _save_index(self):
+        self._sorted_ids = None
+        save_users_index(self._index, self._digests)
+        self._index_stamp = _file_stamp(USERS_INDEX_FILE)
+
+    # --- Records ---
+    def _stamps(self, user_id: str):
+        return (_file_stamp(user_shard_path(user_id)), _file_stamp(vault_shard_path(user_id)))
+
+    @staticmethod
+    def _read_user(user_id: str):
+        record = load_user_shard(user_id)
+        if record is not None:
+            record["vault"] = load_vault_shard(user_id)
+        return record
+
+    def _load(self, user_id: str):
+        """The user's record (cached), checked against the index digest. Call _refresh() first."""
+        stamps = self._stamps(user_id)
+        cached = self._cache.get(user_id)
+        if cached and cached[0] == stamps and cached[1] == self._digests.get(user_id):
+            self._cache.move_to_end(user_id)
+            return cached[2]
+
+        record = self._read_user(user_id)
+        if record is None:
+            self._cache.pop(user_id, None)
+            return None
+        digest = sign_record(record)
+        if digest != self._digests.get(user_id):
+            # Another process may be between writing the shard and the index: look again under its lock
+            with self._index_lock():
+                self._refresh()
+                stamps = self._stamps(user_id)
+                record = self._read_user(user_id)
+                digest = sign_record(record) if record is not None else None
+                if record is not None and digest != self._digests.get(user_id):
+                    server_log("CRITICAL", f"User shard does not match the users index for {user_id}!")
+                    raise ValueError("Data integrity violation detected")
+            if record is None:
+                self._cache.pop(user_id, None)
+                return None
+        self._remember(user_id, stamps, digest, record)
+        return record
+
+    def _remember(self, user_id: str, stamps: tuple, digest: str, record: dict):
+        self._cache[user_id] = (stamps, digest, record)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    def _write_user(self, user: dict, previous: dict = None) -> bool:
+        """Write the user's changed shards and record its digest (the index is saved by the caller). True if anything changed."""
+        record = {k: v for k, v in user.items() if k != "vault"}
+        changed = False
+        if previous is None or {k: v for k, v in previous.items() if k != "vault"} != record:
+            save_user_shard(record)
+            changed = True
+        if previous is None or previous.get("vault", "") != user.get("vault", ""):
+            save_vault_shard(user["id"], user.get("vault", ""))
+            changed = True
+        user.setdefault("vault", "")
+        digest = sign_record(user)
+        self._digests[user["id"]] = digest
+        self._remember(user["id"], self._stamps(user["id"]), digest, user)
+        return changed
+
+    # --- Queries ---
+    def get_by_id(self, user_id: str):
+        with self._lock:
+            self._refresh()
+            record = self._load(user_id)
+            return copy.deepcopy(record) if record else None
+
+    def get_by_username(self, username: str):
+        with self._lock:
+            self._refresh()
+            user_id = self._index.get(username)
+            record = self._load(user_id) if user_id else None
+            if not record or record["username"] != username:
+                return None
+            return copy.deepcopy(record)
+
+    def exists(self, username: str) -> bool:
+        with self._lock:
+            self._refresh()
+            return username in self._index
+
+    def all(self) -> list:
+        with self._lock:
+            self._refresh()
+            records = (self._load(user_id) for user_id in self._index.values())
+            return [copy.deepcopy(r) for r in records if r]
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._index)
+
+    def scan(self, after: str = None):
+        """Users (copies) in id order, starting after the id `after`. For paged listings: SCAN_BATCH records are read at a time."""
+        while True:
+            with self._lock:
+                self._refresh()
+                if self._sorted_ids is None:
+                    self._sorted_ids = sorted(self._index.values())
+                start = bisect.bisect_right(self._sorted_ids, after) if after is not None else 0
+                ids = self._sorted_ids[start:start + SCAN_BATCH]
+                batch = [copy.deepcopy(record) for record in map(self._load, ids) if record]
+            yield from batch
+            if len(ids) < SCAN_BATCH:
+                return
+            after = ids[-1]
+
+    def usernames(self) -> dict:
+        """id -> username of every user, from the index alone."""
+        with self._lock:
+            self._refresh()
+            return {user_id: username for username, user_id in self._index.items()}
+
+    # --- Persistence ---
+    def save_all(self, users: list):
+        """Replace the whole user list. Removed users' shards and vault files are deleted."""
+        with self._index_lock():
+            self._refresh()
+            keep = {u["id"] for u in users}
+            for user_id in set(self._index.values()) - keep:
+                delete_user_shards(user_id)
+                vault_store.delete(user_id)
+                self._cache.pop(user_id, None)
+                self._digests.pop(user_id, None)
+            for user in users:
+                self._write_user(copy.deepcopy(user), self._load(user["id"]))
+            self._index = {u["username"]: u["id"] for u in users}
+            self._save_index()
+
+    def save_user(self, user: dict):
+        """Insert or replace a single user record (matched by id)."""
+        self.save_many([user])
+
+    def save_many(self, users: list):
+        """Insert or replace several user records (matched by id); the index is written at most once."""
+        with self._index_lock():
+            self._refresh()
+            index_changed = False
+            for user in users:
+                user = copy.deepcopy(user)
+                previous = self._load(user["id"])
+                index_changed = self._write_user(user, previous) or index_changed
+
+                # The username map only changes on signup or rename
+                if self._index.get(user["username"]) != user["id"]:
+                    if previous:
+                        self._index.pop(previous["username"], None)
+                    self._index[user["username"]] = user["id"]
+                    index_changed = True
+            if index_changed:
+                self._save_index()
+
+    def update_fields(self, changes: dict) -> dict:
+        """
+        Set fields (not id or username) on several users: {user_id: {field: value}}.
+        Each record is re-read under the index lock first, so changes made
+        elsewhere to other fields are kept. Returns the updated records by
+        id; unknown ids are skipped.
+        """
+        with self._index_lock():
+            self._refresh()
+            updated = {}
+            for user_id, fields in changes.items():
+                previous = self._load(user_id)
+                if previous is None:
+                    continue
+                user = copy.deepcopy(previous)
+                user.update(fields)
+                self._write_user(user, previous)
+                updated[user_id] = copy.deepcopy(user)
+            if updated:
+                self._save_index()
+            return updated
+
+if USER_STORAGE == "sharded":
+    user_repository = ShardedUserRepository()
+elif USER_STORAGE == "sqlite":
+    from SecureServer.code.sqlite_store import SqliteUserRepository
+    user_repository = SqliteUserRepository()
+else:
+    user_repository = UserRepository()
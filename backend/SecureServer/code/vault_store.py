@@ -0,0 +1,257 @@
+"""
+Chunked vault storage: one file per user under data/vault_chunks, outside the
+user record. The plaintext is cut into fixed-size chunks and each chunk is
+sealed with AES-GCM on its own, so a vault is written and read one chunk at a
+time (uploads and downloads never hold the whole vault) and a byte range only
+decrypts the chunks it touches.
+
+File layout:
+    header  MAGIC (4) | chunk size (4, big endian) | file id (16)
+    chunks  nonce (12) | ciphertext (<= chunk size) | tag (16), repeated
+The associated data of every chunk is the user id, the header, the chunk index
+and a last chunk flag, so chunks cannot be moved to another vault, reordered or
+cut off the end without failing authentication. An empty vault is one empty
+last chunk.
+"""
+import os, struct, tempfile
+from pathlib import Path
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from SecureServer.code.encryption import get_aes_key, decrypt_vault, basic_hash
+from SecureServer.code.environment_variables import VAULT_CHUNK_SIZE, VAULT_MAX_SIZE, WRITE_FSYNC
+from SecureServer.code.paths import VAULT_CHUNKS_DIR
+from SecureServer.code.file_writer import fsync_dir
+from SecureServer.code.logs import server_log
+
+MAGIC = b"SVC1"
+HEADER = struct.Struct(">4sI16s")
+NONCE_SIZE = 12
+TAG_SIZE = 16
+OVERHEAD = NONCE_SIZE + TAG_SIZE
+
+class VaultTooLarge(ValueError):
+    pass
+
+def vault_path(user_id: str) -> Path:
+    """Chunk file for a user's vault (hashed so ids never touch the path)."""
+    return VAULT_CHUNKS_DIR / f"{basic_hash(user_id)}.vault"
+
+def _aad(user_id: str, header: bytes, index: int, last: bool) -> bytes:
+    return user_id.encode() + header + struct.pack(">QB", index, last)
+
+def _layout(header: bytes, file_size: int) -> tuple:
+    """(chunk size, plaintext size, chunk count) of a chunk file. ValueError if it is not one."""
+    magic, chunk_size, _ = HEADER.unpack(header)
+    if magic != MAGIC or chunk_size <= 0:
+        raise ValueError("Not a vault chunk file")
+    record = chunk_size + OVERHEAD
+    full, rest = divmod(file_size - HEADER.size, record)
+    if rest == 0 and full > 0:
+        return chunk_size, full * chunk_size, full
+    if rest < OVERHEAD:
+        raise ValueError("Truncated vault chunk file")
+    return chunk_size, full * chunk_size + rest - OVERHEAD, full + 1
+
+def _read_header(f) -> tuple:
+    header = f.read(HEADER.size)
+    if len(header) != HEADER.size:
+        raise ValueError("Truncated vault chunk file")
+    return (header,) + _layout(header, os.fstat(f.fileno()).st_size)
+
+def exists(user_id: str) -> bool:
+    return vault_path(user_id).exists()
+
+def size(user_id: str) -> int | None:
+    """Plaintext size of a user's chunked vault (None if there is none); nothing is decrypted."""
+    try:
+        with open(vault_path(user_id), "rb") as f:
+            return _read_header(f)[2]
+    except FileNotFoundError:
+        return None
+
+def size_of(user: dict) -> int | None:
+    """Vault size for listings: the chunked vault, else the length of a vault still in the record."""
+    try:
+        stored = size(user["id"])
+    except (OSError, ValueError):
+        return None
+    return stored if stored is not None else len(user.get("vault", ""))
+
+def delete(user_id: str) -> None:
+    vault_path(user_id).unlink(missing_ok=True)
+
+class VaultWriter:
+    """
+    Streams a new vault to a temp file next to the user's chunk file; commit()
+    replaces the old vault atomically, abort() (or leaving the with block on an
+    error) drops it. Holds at most two chunks of plaintext.
+    """
+    def __init__(self, user_id: str, key: str | bytes, chunk_size: int = VAULT_CHUNK_SIZE,
+                 max_size: int = VAULT_MAX_SIZE, fsync: bool = WRITE_FSYNC):
+        self.user_id = user_id
+        self.path = vault_path(user_id)
+        self.size = 0
+        self._aes = AESGCM(get_aes_key(key))
+        self._chunk_size = chunk_size
+        self._max_size = max_size
+        self._fsync = fsync
+        self._header = HEADER.pack(MAGIC, chunk_size, os.urandom(16))
+        self._buffer = bytearray()
+        self._index = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, self._tmp = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".tmp")
+        self._file = os.fdopen(fd, "wb")
+        self._file.write(self._header)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None or self._file is not None:
+            self.abort()
+
+    def _seal(self, plaintext: bytes, last: bool) -> None:
+        nonce = os.urandom(NONCE_SIZE)
+        aad = _aad(self.user_id, self._header, self._index, last)
+        self._file.write(nonce + self._aes.encrypt(nonce, plaintext, aad))
+        self._index += 1
+
+    def write(self, data: bytes) -> None:
+        """Append plaintext. VaultTooLarge once the vault passes max_size."""
+        self.size += len(data)
+        if self.size > self._max_size:
+            raise VaultTooLarge(f"Vault is larger than {self._max_size} bytes")
+        self._buffer += data
+        # Keep the last full chunk back: only commit() knows which chunk is the last one
+        while len(self._buffer) > self._chunk_size:
+            self._seal(bytes(self._buffer[:self._chunk_size]), False)
+            del self._buffer[:self._chunk_size]
+
+    def commit(self) -> None:
+        self._seal(bytes(self._buffer), True)
+        self._buffer.clear()
+        try:
+            if self._fsync:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+            os.replace(self._tmp, self.path)
+        except BaseException:
+            self.abort()
+            raise
+        if self._fsync:
+            fsync_dir(self.path.parent)
+
+    def abort(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        try:
+            os.unlink(self._tmp)
+        except FileNotFoundError:
+            pass
+
+def write(user_id: str, key: str | bytes, data: bytes) -> int:
+    """Replace a user's vault with data in one call. Returns its size."""
+    with VaultWriter(user_id, key) as vault:
+        vault.write(data)
+        vault.commit()
+    return vault.size
+
+class VaultReader:
+    """
+    An open chunk file. The file is opened once, so a vault replaced while it
+    is read is still read whole from the old version. ValueError if a chunk
+    fails authentication.
+    """
+    def __init__(self, user_id: str, key: str | bytes):
+        self.user_id = user_id
+        self._aes = AESGCM(get_aes_key(key))
+        self._file = open(vault_path(user_id), "rb")
+        try:
+            self._header, self._chunk_size, self.size, self._count = _read_header(self._file)
+        except BaseException:
+            self._file.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def _chunk(self, index: int) -> bytes:
+        self._file.seek(HEADER.size + index * (self._chunk_size + OVERHEAD))
+        raw = self._file.read(self._chunk_size + OVERHEAD)
+        aad = _aad(self.user_id, self._header, index, index == self._count - 1)
+        try:
+            return self._aes.decrypt(raw[:NONCE_SIZE], raw[NONCE_SIZE:], aad)
+        except InvalidTag:
+            server_log("CRITICAL", f"Vault chunk integrity check failed for {self.user_id}!")
+            raise ValueError("Data integrity violation detected")
+
+    def read(self, start: int = 0, end: int = None):
+        """Plaintext of bytes start..end-1 (end defaults to the size), one chunk at a time."""
+        end = self.size if end is None else min(end, self.size)
+        if start >= end:
+            return
+        for index in range(start // self._chunk_size, (end - 1) // self._chunk_size + 1):
+            offset = index * self._chunk_size
+            chunk = self._chunk(index)
+            if offset < start or offset + len(chunk) > end:
+                chunk = chunk[max(start - offset, 0):end - offset]
+            yield chunk
+
+def open_vault(user_id: str, key: str | bytes) -> VaultReader | None:
+    """A reader for a user's chunked vault, None if there is none."""
+    try:
+        return VaultReader(user_id, key)
+    except FileNotFoundError:
+        return None
+
+def iter_range(reader: VaultReader, start: int = 0, end: int = None):
+    """reader.read(start, end), closing the reader when done (for streamed responses)."""
+    try:
+        yield from reader.read(start, end)
+    finally:
+        reader.close()
+
+def parse_range(value: str | None, total: int) -> tuple | None:
+    """
+    (start, end) of a single "bytes=a-b", "bytes=a-" or "bytes=-n" Range
+    header, end exclusive. None when there is no range or it is not one we
+    serve (several ranges, or an invalid one such as "bytes=5-3", which
+    RFC 9110 says to ignore): the whole vault is sent. ValueError if it
+    cannot be satisfied (it starts past the end).
+    """
+    if not value or not value.startswith("bytes=") or "," in value:
+        return None
+    first, sep, last = value[6:].strip().partition("-")
+    if not sep or not (first.isdigit() or last.isdigit()) or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if first and last and int(last) < int(first):
+        return None
+    if not first:
+        start, end = max(total - int(last), 0), total
+    else:
+        start, end = int(first), min(int(last) + 1, total) if last else total
+    if start >= total or start >= end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+def read_text(user: dict, key: str | bytes) -> str:
+    """
+    Whole vault as text: the chunked vault, else a vault still stored in the
+    user record (written before chunked storage).
+    """
+    reader = open_vault(user["id"], key)
+    if reader is None:
+        return decrypt_vault(user.get("vault", ""), key)
+    with reader:
+        return b"".join(reader.read()).decode()
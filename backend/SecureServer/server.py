@@ -1,191 +1,361 @@
-import ssl, time, sys, signal, os, atexit, pyotp, uuid, string, random
-from uvicorn import Config, Server
-
-from SecureServer.app import SecureApp
-
-import SecureServer.code.encryption as en
-from SecureServer.code.paths import PID_FILE
-from SecureServer.code.request_validation import *
-from SecureServer.code.environment_variables import (
-    SERVER_HOST, SERVER_PORT, HTTPS_HOST, HTTPS_PORT, USE_HTTPS,
-    ENABLE_2FA, REQUIRE_2FA,
-    SSL_CERT_FILE, SSL_KEY_FILE, SSL_CIPHERS,
-    TEMPLATE_USER_EMAIL, TEMPLATE_USER_PHONE,
-    REPLACE_CORRUPTED_FILES
-)
-
-class Encryptor:
-    def calculate_hmac(data: str) -> str:
-        return en.calculate_hmac(data)
-
-    def get_aes_key(key: str) -> bytes:
-        return en.get_aes_key(key)
-
-    def derive_vault_key(password: str, salt_hex: str) -> bytes:
-        """Derives KEK from password - used to wrap/unwrap vault master key"""
-        return en.derive_vault_key(password, salt_hex)
-    
-    def generate_vault_master_key() -> str:
-        """Generates a new random vault master key"""
-        return en.generate_vault_master_key()
-    
-    def wrap_vault_key(master_key: str, kek: str) -> str:
-        """Wraps (encrypts) vault master key with password-derived KEK"""
-        return en.wrap_vault_key(master_key, kek)
-    
-    def unwrap_vault_key(wrapped_key: str, kek: str) -> str:
-        """Unwraps (decrypts) vault master key using password-derived KEK"""
-        return en.unwrap_vault_key(wrapped_key, kek)
-
-    def encrypt_vault(data: str, key: str) -> str:
-        """Encrypts vault data with master key"""
-        return en.encrypt_vault(data, key)
-    
-    def decrypt_vault(enc_data: str, key: str) -> str:
-        """Decrypts vault data with master key"""
-        return en.decrypt_vault(enc_data, key)
-
-    def hash_pw(password: str) -> str:
-        return en.hash_pw(password)
-
-    def verify_pw(password: str, stored: str) -> bool:
-        return en.verify_pw(password, stored)
-
-    def basic_hash(string: str) -> str:
-        return en.basic_hash(string)
-    
-    def url_b64decode(data: str) -> bytes:
-        return en.urlsafe_b64decode(data)
-
-    def urlsafe_b64decode_padded(data: str) -> bytes:
-        return en.urlsafe_b64decode_padded(data)
-    
-    def random_base32() -> str:
-        return en.random_base32()
-
-class SecureServer:
-    app: SecureApp
-    port: int
-    host: str
-    cert_file: str
-    key_file: str
-
-    _config: Config
-    _server: Server
-    
-    def __init__(self):
-        self.port = SERVER_PORT
-        self.host = SERVER_HOST
-
-    def LoadConfig(self) -> Config:
-        # Register the signal handler for graceful shutdown
-        signal.signal(signal.SIGINT, self._signal_handler)
-        signal.signal(signal.SIGTERM, self._signal_handler)
-
-        if USE_HTTPS:
-            if not SSL_CERT_FILE or not SSL_KEY_FILE:
-                print("CRITICAL", "SSL_CERT_FILE and SSL_KEY_FILE must be set in production")
-                time.sleep(1)
-                sys.exit(1)
-            self._config = Config(
-                self.app.main,
-                host=HTTPS_HOST,
-                port=HTTPS_PORT,
-                ssl_certfile=SSL_CERT_FILE,
-                ssl_keyfile=SSL_KEY_FILE,
-                ssl_version=ssl.PROTOCOL_TLS_SERVER,
-                ssl_ciphers=SSL_CIPHERS,
-                log_config=None
-            )
-        else: 
-            self._config = Config(
-                self.app.main,
-                host=SERVER_HOST,
-                port=SERVER_PORT,
-                log_config=None
-            )
-        
-        self._server = Server(self._config)
-        return self._config
-    
-    def _generate_unique_char_string(self, length: int) -> str:
-        characters = string.ascii_letters + string.digits
-        
-        # Check if the requested length is possible with the available characters
-        if length > len(characters):
-            return "Error: Length requested is more than available unique characters."
-
-        # Randomly sample unique characters for the specified length and join them
-        unique_string = ''.join(random.sample(characters, k=length))
-        
-        return unique_string
-    def _cleanup_pid(self):
-        """Clean up PID file on shutdown"""
-        try:
-            if os.path.exists(PID_FILE):
-                os.remove(PID_FILE)
-        except Exception as e:
-            print(f"Error cleaning up PID file: {e}")
-    def _signal_handler(self, sig, frame):
-        """Handle shutdown signals gracefully"""
-        self._cleanup_pid()
-        self.app._signal_handler(sig, frame)
-    def _create_template_user(self) -> dict:
-        self.app.database.log("NOTICE", "Created template user for later user creation.")
-        new_user = {
-            "id": str(uuid.uuid4()),
-            "username": "template",
-            "password": Encryptor.hash_pw(self._generate_unique_char_string(72)),
-            "admin": False,
-            "salt": os.urandom(16).hex(),
-            "vault": "",
-            "root_auth": False,
-            "dev_admin": False,
-            "2fa_enabled": (self.app.DEFAULT_USER.DEFAULT_2FA or REQUIRE_2FA) and ENABLE_2FA,
-            "2fa_secret": pyotp.random_base32(),
-            "2fa_set_up_complete": False,
-            "frozen": False,
-        }
-        if self.app.DEFAULT_USER.TAKE_FULL_NAME:
-            new_user["first_name"] = "first"
-            new_user["last_name"] = "last"
-        if self.app.DEFAULT_USER.TAKE_EMAIL:
-            new_user["email"] = "email@example.com"
-            new_user["preferred_contact_method"] = "email"
-        if self.app.DEFAULT_USER.TAKE_PHONE:
-            new_user["phone"] = "1234567890"
-            new_user["preferred_contact_method"] = "sms"
-
-        for i in range(len(self.app.DEFAULT_USER.keys)):
-            new_user[self.app.DEFAULT_USER.keys[i]] = self.app.DEFAULT_USER.defaults
-
-        return new_user
-
-    def run(self) -> None:
-        # Warning notice for REPLACE_CORRUPTED_FILES
-        if REPLACE_CORRUPTED_FILES:
-            self.app.database.log("WARNING", "REPLACE_CORRUPTED_FILES is marked as True, this should only be toggled if debugging.")
-            
-        # Make sure there is a template user
-        users = self.app.database.load_users()
-        template = next((u for u in users if u["username"] == "template"), None)
-        if not template:
-            new = self._create_template_user()
-            users.append(new)
-            self.app.database.save_users(users)
-                
-        try:
-            # Write PID file
-            with open(PID_FILE, 'w') as f:
-                f.write(str(os.getpid()))
-            
-            # Register cleanup to run on normal exit
-            atexit.register(self._cleanup_pid)
-
-            # Run the server
-            self._server.run()
-        except Exception as e:
-            self.app.database.log("ERROR", f"Server run error: {e}")
-        finally:
-            # Ensure cleanup happens even if server crashes
+import ssl, time, sys, signal, os, atexit, socket, pyotp, uuid, string, random
+from uvicorn import Config, Server
+
+from SecureServer.app import SecureApp
+
+import SecureServer.code.encryption as en
+from SecureServer.code.paths import PID_FILE
+from SecureServer.code.state_backend import state
+from SecureServer.code.file_writer import writer
+from SecureServer.code import crypto_executor
+from SecureServer.code.logs import flush_logs
+from SecureServer.code.middleware import AccessLogMiddleware
+from SecureServer.code.request_validation import *
+from SecureServer.code.environment_variables import (
+    SERVER_HOST, SERVER_PORT, SERVER_WORKERS, WARM_RESTART, HTTPS_HOST, HTTPS_PORT, USE_HTTPS,
+    PERSIST_SESSIONS,
+    ENABLE_2FA, REQUIRE_2FA,
+    SSL_CERT_FILE, SSL_KEY_FILE, SSL_CIPHERS,
+    TEMPLATE_USER_EMAIL, TEMPLATE_USER_PHONE,
+    REPLACE_CORRUPTED_FILES
+)
+
+LISTEN_FD_ENV = "SECURESERVER_LISTEN_FD"  # Listening socket handed over by a warm restart
+
+class Encryptor:
+    def calculate_hmac(data: str) -> str:
+        return en.calculate_hmac(data)
+
+    def get_aes_key(key: str) -> bytes:
+        return en.get_aes_key(key)
+
+    def derive_vault_key(password: str, salt_hex: str) -> bytes:
+        """Derives KEK from password - used to wrap/unwrap vault master key"""
+        return en.derive_vault_key(password, salt_hex)
+
+    async def derive_vault_key_async(password: str, salt_hex: str) -> bytes:
+        """derive_vault_key run on the crypto executor"""
+        return await en.derive_vault_key_async(password, salt_hex)
+    
+    def generate_vault_master_key() -> str:
+        """Generates a new random vault master key"""
+        return en.generate_vault_master_key()
+    
+    def wrap_vault_key(master_key: str, kek: str) -> str:
+        """Wraps (encrypts) vault master key with password-derived KEK"""
+        return en.wrap_vault_key(master_key, kek)
+    
+    def unwrap_vault_key(wrapped_key: str, kek: str) -> str:
+        """Unwraps (decrypts) vault master key using password-derived KEK"""
+        return en.unwrap_vault_key(wrapped_key, kek)
+
+    def encrypt_vault(data: str, key: str) -> str:
+        """Encrypts vault data with master key"""
+        return en.encrypt_vault(data, key)
+    
+    def decrypt_vault(enc_data: str, key: str) -> str:
+        """Decrypts vault data with master key"""
+        return en.decrypt_vault(enc_data, key)
+
+    def hash_pw(password: str) -> str:
+        return en.hash_pw(password)
+
+    def verify_pw(password: str, stored: str) -> bool:
+        return en.verify_pw(password, stored)
+
+    async def hash_pw_async(password: str) -> str:
+        return await en.hash_pw_async(password)
+
+    async def verify_pw_async(password: str, stored: str) -> bool:
+        return await en.verify_pw_async(password, stored)
+
+    def basic_hash(string: str) -> str:
+        return en.basic_hash(string)
+    
+    def url_b64decode(data: str) -> bytes:
+        return en.urlsafe_b64decode(data)
+
+    def urlsafe_b64decode_padded(data: str) -> bytes:
+        return en.urlsafe_b64decode_padded(data)
+    
+    def random_base32() -> str:
+        return en.random_base32()
+
+class SecureServer:
+    app: SecureApp
+    port: int
+    host: str
+    cert_file: str
+    key_file: str
+    workers: int
+    warm_restart: bool
+
+    _config: Config
+    _server: Server
+    
+    def __init__(self, workers: int = SERVER_WORKERS, warm_restart: bool = WARM_RESTART):
+        self.port = SERVER_PORT
+        self.host = SERVER_HOST
+        self.workers = max(1, workers)
+        self.warm_restart = warm_restart
+        self._restarting = False
+
+    def LoadConfig(self) -> Config:
+        # Register the signal handler for graceful shutdown
+        signal.signal(signal.SIGINT, self._signal_handler)
+        signal.signal(signal.SIGTERM, self._signal_handler)
+
+        if USE_HTTPS:
+            if not SSL_CERT_FILE or not SSL_KEY_FILE:
+                print("CRITICAL", "SSL_CERT_FILE and SSL_KEY_FILE must be set in production")
+                time.sleep(1)
+                sys.exit(1)
+            self._config = Config(
+                AccessLogMiddleware(self.app.main),
+                host=HTTPS_HOST,
+                port=HTTPS_PORT,
+                ssl_certfile=SSL_CERT_FILE,
+                ssl_keyfile=SSL_KEY_FILE,
+                ssl_version=ssl.PROTOCOL_TLS_SERVER,
+                ssl_ciphers=SSL_CIPHERS,
+                log_config=None,
+                access_log=False  # AccessLogMiddleware logs requests with structured fields
+            )
+        else: 
+            self._config = Config(
+                AccessLogMiddleware(self.app.main),
+                host=SERVER_HOST,
+                port=SERVER_PORT,
+                log_config=None,
+                access_log=False  # AccessLogMiddleware logs requests with structured fields
+            )
+        
+        self._server = Server(self._config)
+        return self._config
+    
+    def _generate_unique_char_string(self, length: int) -> str:
+        characters = string.ascii_letters + string.digits
+        
+        # Check if the requested length is possible with the available characters
+        if length > len(characters):
+            return "Error: Length requested is more than available unique characters."
+
+        # Randomly sample unique characters for the specified length and join them
+        unique_string = ''.join(random.sample(characters, k=length))
+        
+        return unique_string
+    def _cleanup_pid(self):
+        """Clean up PID file on shutdown"""
+        try:
+            if os.path.exists(PID_FILE):
+                os.remove(PID_FILE)
+        except Exception as e:
+            print(f"Error cleaning up PID file: {e}")
+    def _signal_handler(self, sig, frame):
+        """Handle shutdown signals gracefully"""
+        self._cleanup_pid()
+        self.app._signal_handler(sig, frame)
+    def _create_template_user(self) -> dict:
+        self.app.database.log("NOTICE", "Created template user for later user creation.")
+        new_user = {
+            "id": str(uuid.uuid4()),
+            "username": "template",
+            "password": Encryptor.hash_pw(self._generate_unique_char_string(72)),
+            "admin": False,
+            "salt": os.urandom(16).hex(),
+            "vault": "",
+            "root_auth": False,
+            "dev_admin": False,
+            "2fa_enabled": (self.app.DEFAULT_USER.DEFAULT_2FA or REQUIRE_2FA) and ENABLE_2FA,
+            "2fa_secret": pyotp.random_base32(),
+            "2fa_set_up_complete": False,
+            "frozen": False,
+        }
+        if self.app.DEFAULT_USER.TAKE_FULL_NAME:
+            new_user["first_name"] = "first"
+            new_user["last_name"] = "last"
+        if self.app.DEFAULT_USER.TAKE_EMAIL:
+            new_user["email"] = "email@example.com"
+            new_user["preferred_contact_method"] = "email"
+        if self.app.DEFAULT_USER.TAKE_PHONE:
+            new_user["phone"] = "1234567890"
+            new_user["preferred_contact_method"] = "sms"
+
+        for i in range(len(self.app.DEFAULT_USER.keys)):
+            new_user[self.app.DEFAULT_USER.keys[i]] = self.app.DEFAULT_USER.defaults
+
+        return new_user
+
+    # --- Warm restart ---
+    def _listen_socket(self) -> socket.socket:
+        """The listening socket: inherited from a warm restart, or freshly bound."""
+        fd = os.environ.pop(LISTEN_FD_ENV, None)
+        if fd is not None:
+            return socket.socket(fileno=int(fd))
+        return self._config.bind_socket()
+
+    def _restart_handler(self, sig, frame):
+        """SIGHUP: finish in-flight requests, then re-execute in place."""
+        self.app.database.log("NOTICE", "Warm restart requested.")
+        self._restarting = True
+        if self.workers > 1:
+            sys.exit(0)  # leaves the supervisor loop, which stops workers and state server
+        self._server.should_exit = True
+
+    def _exec_restart(self, sock: socket.socket) -> None:
+        """
+        Replace this process with a fresh copy of the server (same pid).
+        The listening socket is passed on, so clients queue in its backlog
+        instead of being refused. Persisted sessions are reloaded lazily.
+        """
+        state.tokens.flush()
+        state.lockouts.flush()
+        writer.flush()
+        crypto_executor.shutdown(wait=True)
+
+        os.set_inheritable(sock.fileno(), True)
+        os.environ[LISTEN_FD_ENV] = str(sock.fileno())
+        self.app.database.log("STARTUP", "Warm restart: re-executing server.")
+        flush_logs()
+        os.execv(sys.executable, [sys.executable] + sys.orig_argv[1:])
+
+    def _run_single(self) -> None:
+        if not self.warm_restart:
+            self._server.run()
+            return
+
+        sock = self._listen_socket()
+        # uvicorn closes the sockets it serves on, so it gets a duplicate
+        self._server.run(sockets=[sock.dup()])
+        if self._restarting:
+            self._exec_restart(sock)
+        sock.close()
+
+    # --- Workers ---
+    def _run_workers(self) -> None:
+        """Pre-fork self.workers uvicorn workers on one listening socket, sharing one state server."""
+        if not hasattr(os, "fork"):
+            self.app.database.log("WARNING", "Multiple workers need fork(); running a single worker.")
+            self._run_single()
+            return
+
+        sock = self._listen_socket()
+        state_server, address, authkey = state.start_server()
+        workers = {}
+
+        def spawn():
+            pid = os.fork()
+            if pid == 0:
+                self._run_worker(sock, address, authkey)
+            workers[pid] = True
+
+        self.app.database.log("STARTUP", f"Starting {self.workers} workers.")
+        try:
+            for _ in range(self.workers):
+                spawn()
+
+            # Replace workers that die; a shutdown signal exits this loop via sys.exit.
+            # Only worker pids are waited on: the state server is reaped by its Process object.
+            while True:
+                if not state_server.is_alive():
+                    # Workers cannot run without it: start a new one and move every worker over
+                    self.app.database.log("ERROR", f"State server exited ({state_server.exitcode}), restarting it and all workers.")
+                    self._stop_workers(workers)
+                    workers.clear()
+                    time.sleep(1)
+                    state_server, address, authkey = state.start_server()
+                    for _ in range(self.workers):
+                        spawn()
+                    continue
+
+                for pid in list(workers):
+                    done, status = os.waitpid(pid, os.WNOHANG)
+                    if done:
+                        workers.pop(pid)
+                        self.app.database.log("ERROR", f"Worker {pid} exited ({os.waitstatus_to_exitcode(status)}), restarting.")
+                        time.sleep(1)
+                        spawn()
+                time.sleep(0.5)
+        finally:
+            self._stop_workers(workers)
+            state_server.terminate()
+            state_server.join(10)
+            if self._restarting:
+                self._exec_restart(sock)
+            sock.close()
+
+    @staticmethod
+    def _stop_workers(workers: dict) -> None:
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in workers:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+
+    def _run_worker(self, sock, address: str, authkey: bytes) -> None:
+        """Body of a forked worker; never returns."""
+        code = 0
+        try:
+            # uvicorn handles signals while serving and re-raises them afterwards
+            signal.signal(signal.SIGINT, lambda sig, frame: sys.exit(0))
+            signal.signal(signal.SIGTERM, lambda sig, frame: sys.exit(0))
+            if hasattr(signal, "SIGHUP"):
+                signal.signal(signal.SIGHUP, signal.SIG_IGN)  # the supervisor drives warm restarts
+            state.connect(address, authkey)
+            Server(self._config).run(sockets=[sock])
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 0
+        except BaseException as e:
+            self.app.database.log("ERROR", f"Worker {os.getpid()} failed: {e}")
+            code = 1
+        finally:
+            writer.flush()
+            crypto_executor.shutdown(wait=True)
+            flush_logs()
+            os._exit(code)
+
+    def run(self) -> None:
+        # Warning notice for REPLACE_CORRUPTED_FILES
+        if REPLACE_CORRUPTED_FILES:
+            self.app.database.log("WARNING", "REPLACE_CORRUPTED_FILES is marked as True, this should only be toggled if debugging.")
+            
+        # Make sure there is a template user
+        users = self.app.database.load_users()
+        template = next((u for u in users if u["username"] == "template"), None)
+        if not template:
+            new = self._create_template_user()
+            users.append(new)
+            self.app.database.save_users(users)
+                
+        try:
+            # Write PID file
+            with open(PID_FILE, 'w') as f:
+                f.write(str(os.getpid()))
+            
+            # Register cleanup to run on normal exit
+            atexit.register(self._cleanup_pid)
+
+            if self.warm_restart:
+                if not hasattr(signal, "SIGHUP"):
+                    self.app.database.log("WARNING", "WARM_RESTART needs SIGHUP and is not available on this platform.")
+                    self.warm_restart = False
+                else:
+                    if not PERSIST_SESSIONS:
+                        self.app.database.log("WARNING", "WARM_RESTART without PERSIST_SESSIONS logs every user out on restart.")
+                    signal.signal(signal.SIGHUP, self._restart_handler)
+
+            # Run the server
+            if self.workers > 1:
+                self._run_workers()
+            else:
+                self._run_single()
+        except Exception as e:
+            self.app.database.log("ERROR", f"Server run error: {e}")
+        finally:
+            # Ensure cleanup happens even if server crashes
             self._cleanup_pid()
\ No newline at end of file
@@ -0,0 +1,83 @@
+"""
+Incident response on many accounts: freezing and logging out every user one
+command at a time (useraction + logout per user, as already served by the
+admin daemon, so without the process launches) vs. one bulkaction pass.
+Counts the writes of users.json and tokens.json. Runs against a temp dir;
+nothing under data/ is touched.
+
+Usage: python benchmarks/admin_bulk.py [users]
+"""
+import sys, io, json, time, uuid, tempfile
+from pathlib import Path
+from contextlib import redirect_stdout
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from SecureServer.code import file_handling, user_store, token_store
+from SecureServer.code.user_store import user_repository
+from SecureServer.code.token_store import token_repository
+from SecureServer.code.encryption import hash_token
+from SecureServer.code.file_writer import writer
+from SecureServer.adminPortal import commands
+
+SESSION = "bench-admin-session"
+writes = {"users": 0, "tokens": 0}
+
+def counted(name: str, save):
+    def wrapper(*args):
+        writes[name] += 1
+        return save(*args)
+    return wrapper
+
+def use_scratch_data(scratch: Path) -> None:
+    """Point the user and token stores at files in scratch."""
+    file_handling.USERS_FILE = user_repository._file = scratch / "users.json"
+    file_handling.TOKENS_FILE = token_repository._file = scratch / "tokens.json"
+    user_store.save_signed_users = counted("users", file_handling.save_signed_users)
+    token_store.save_tokens = counted("tokens", file_handling.save_tokens)
+
+def populate(count: int) -> list:
+    admin_id = str(uuid.uuid4())
+    ids = [str(uuid.uuid4()) for _ in range(count)]
+    users = [{"id": admin_id, "username": "root", "dev_admin": True, "root_auth": True}]
+    users += [{"id": user_id, "username": f"user{i}", "salt": "00", "vault": "x" * 512} for i, user_id in enumerate(ids)]
+    user_repository.save_all(users)
+    exp = int(time.time()) + 3600
+    token_repository.add({"id": hash_token(SESSION), "user_id": admin_id, "exp": exp})
+    for i, user_id in enumerate(ids):
+        token_repository.add({"id": f"token{i}", "user_id": user_id, "exp": exp})
+    token_repository.flush()
+    return ids
+
+def one_at_a_time(ids: list) -> None:
+    for user_id in ids:
+        assert commands.useraction([SESSION, "freeze", user_id]) == 0
+        assert commands.logout([SESSION, user_id]) == 0
+
+def bulk(ids: list) -> None:
+    lines = [json.dumps({"action": action, "user_id": user_id}) for user_id in ids for action in ("freeze", "logout")]
+    sys.stdin = io.StringIO("\n".join(lines))
+    assert commands.bulkaction([SESSION]) == 0
+
+def run(name: str, func, count: int) -> None:
+    ids = populate(count)
+    for key in writes:
+        writes[key] = 0
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        func(ids)
+    writer.flush()
+    elapsed = time.perf_counter() - start
+    assert all(u.get("freeze") for u in user_repository.all() if u["username"] != "root")
+    assert len(token_repository) == 1
+    print(f"{name:<16} {count:5d} users {elapsed * 1000:9.1f} ms   users.json written {writes['users']:4d}x"
+          f"   tokens.json written {writes['tokens']:4d}x")
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    writer.set_window(0)  # as in the admin daemon
+
+    with tempfile.TemporaryDirectory() as scratch:
+        use_scratch_data(Path(scratch))
+        commands.server_log = lambda *args, **kwargs: None  # keep the benchmark out of server.log
+        run("one at a time", one_at_a_time, count)
+        run("bulkaction", bulk, count)
@@ -0,0 +1,55 @@
+"""
+Latency of one adminPortal command as the C# front end runs it (a new
+python process per command): the command imported and run in that process
+(old), vs. the script forwarding it to a running admin daemon. Also the
+daemon round trip alone. Uses a made-up session, so every call does the
+full session check (and fails it, exit code 1) without changing any data;
+each call logs one failed session line.
+
+Usage: python benchmarks/admin_daemon.py [calls]
+"""
+import sys, time, subprocess, statistics
+from pathlib import Path
+
+BACKEND = Path(__file__).parent.parent
+sys.path.insert(0, str(BACKEND))
+from SecureServer.code.paths import ADMIN_SOCKET_FILE
+from SecureServer.adminPortal.client import call_daemon
+
+PORTAL = BACKEND / "SecureServer" / "adminPortal"
+SESSION = "not-a-session"
+IN_PROCESS = ("import sys; sys.path.insert(0, sys.argv[1]); "
+              "from SecureServer.adminPortal.commands import listsessions; sys.exit(listsessions(sys.argv[2:]))")
+
+def timed(calls: int, func) -> list:
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def report(name: str, samples: list) -> None:
+    print(f"{name:<26} median {statistics.median(samples):8.2f} ms   max {max(samples):8.2f} ms")
+
+def run(*argv) -> None:
+    assert subprocess.run([sys.executable, *argv], capture_output=True).returncode == 1
+
+if __name__ == "__main__":
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    report("process per command", timed(calls, lambda: run("-c", IN_PROCESS, str(BACKEND), SESSION)))
+
+    daemon = subprocess.Popen([sys.executable, str(PORTAL / "admind.py")])
+    try:
+        deadline = time.monotonic() + 30
+        while call_daemon("listsessions", [SESSION]) is None:
+            assert time.monotonic() < deadline and daemon.poll() is None, "admin daemon did not start"
+            time.sleep(0.1)
+        report("script -> admin daemon", timed(calls, lambda: run(str(PORTAL / "listsessions.py"), SESSION)))
+        report("daemon round trip", timed(calls * 10, lambda: call_daemon("listsessions", [SESSION])))
+        report("python startup alone", timed(calls, lambda: subprocess.run([sys.executable, "-c", "pass"])))
+    finally:
+        daemon.terminate()
+        daemon.wait()
+        ADMIN_SOCKET_FILE.unlink(missing_ok=True)
@@ -0,0 +1,81 @@
+"""
+listusers / listsessions on a large tenant: the old commands (every record
+copied into one list and dumped at once; listsessions looks up the user of
+every token) vs. the streamed listings (records copied in small batches; usernames
+joined from one pass over the users) and a 100 item page.
+Time and peak Python memory per command. Runs against a temp dir; nothing
+under data/ is touched.
+
+Usage: python benchmarks/admin_listings.py [users]
+"""
+import sys, io, json, time, uuid, tempfile, tracemalloc
+from pathlib import Path
+from contextlib import redirect_stdout
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from SecureServer.code import file_handling
+from SecureServer.code.user_store import user_repository
+from SecureServer.code.token_store import token_repository
+from SecureServer.code.token_handling import get_user
+from SecureServer.code.encryption import hash_token
+from SecureServer.code.file_writer import writer
+from SecureServer.adminPortal import commands
+
+SESSION = "bench-admin-session"
+
+def populate(count: int) -> None:
+    admin_id = str(uuid.uuid4())
+    users = [{"id": admin_id, "username": "root", "dev_admin": True, "root_auth": True}]
+    users += [{"id": str(uuid.uuid4()), "username": f"user{i}", "first_name": "First", "last_name": "Last",
+               "salt": "00", "vault": "x" * 2048} for i in range(count)]
+    user_repository.save_all(users)
+    exp, now = int(time.time()) + 3600, int(time.time())
+    token_repository.add({"id": hash_token(SESSION), "user_id": admin_id, "exp": exp})
+    for i, user in enumerate(users[1:]):
+        token_repository.add({"id": f"token{i}", "user_id": user["id"], "exp": exp, "auth_time": now,
+                              "session_id": f"session{i}", "safe_log": "***abcd"})
+    token_repository.flush()
+
+def old_listusers() -> None:
+    print(json.dumps([commands.safe_user(u) for u in user_repository.all()]))
+
+def old_listsessions() -> None:
+    output = []
+    for t in token_repository.all():
+        user = get_user(t.get("user_id"))
+        output.append(commands.safe_session(t, user["username"] if user else None))
+    print(json.dumps(output))
+
+def measure(func) -> tuple:
+    """(ms, peak KiB) of func with its output discarded."""
+    with redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+    with redirect_stdout(io.StringIO()):
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+    return elapsed, peak
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    writer.set_window(0)  # as in the admin daemon
+
+    with tempfile.TemporaryDirectory() as scratch:
+        file_handling.USERS_FILE = user_repository._file = Path(scratch) / "users.json"
+        file_handling.TOKENS_FILE = token_repository._file = Path(scratch) / "tokens.json"
+        commands.server_log = lambda *args, **kwargs: None  # keep the benchmark out of server.log
+        populate(count)
+
+        for name, func in (
+            ("listusers (old)", old_listusers),
+            ("listusers", lambda: commands.listusers([SESSION])),
+            ("listusers --limit 100", lambda: commands.listusers([SESSION, "--limit", "100"])),
+            ("listsessions (old)", old_listsessions),
+            ("listsessions", lambda: commands.listsessions([SESSION])),
+            ("listsessions --limit 100", lambda: commands.listsessions([SESSION, "--limit", "100"])),
+        ):
+            elapsed, peak = measure(func)
+            print(f"{name:<26} {count} users {elapsed:8.1f} ms   peak {peak:9.0f} KiB")
@@ -0,0 +1,73 @@
+"""
+Latency of a cheap endpoint while logins are running, with password
+stretching on the event loop (blocking) vs. on the crypto executor.
+
+Usage: python benchmarks/crypto_offload.py [logins] [concurrent_logins]
+"""
+import sys, time, asyncio, statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+import httpx
+from fastapi import FastAPI
+from SecureServer.code.encryption import hash_pw, verify_pw, verify_pw_async
+from SecureServer.code import crypto_executor
+
+STORED = hash_pw("correct horse battery staple")
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/login_blocking")
+    async def login_blocking():
+        return {"ok": verify_pw("guess", STORED)}
+
+    @app.post("/login_offloaded")
+    async def login_offloaded():
+        return {"ok": await verify_pw_async("guess", STORED)}
+
+    @app.get("/cheap")
+    async def cheap():
+        return {"ok": True}
+
+    return app
+
+async def run(route: str, logins: int, concurrency: int) -> list:
+    transport = httpx.ASGITransport(app=build_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        done = asyncio.Event()
+
+        async def login_worker():
+            for _ in range(logins // concurrency):
+                await client.post(route)
+
+        async def drive_logins():
+            await asyncio.gather(*(login_worker() for _ in range(concurrency)))
+            done.set()
+
+        async def timed_cheap():
+            samples = []
+            while not done.is_set():
+                # A request "arrives" every 5 ms; a blocked loop delays it
+                start = time.perf_counter()
+                await asyncio.sleep(0.005)
+                await client.get("/cheap")
+                samples.append((time.perf_counter() - start - 0.005) * 1000)
+            return samples
+
+        _, samples = await asyncio.gather(drive_logins(), timed_cheap())
+        return samples
+
+def report(name: str, samples: list) -> None:
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{name:<16} p50 {statistics.median(samples):9.2f} ms   p99 {p99:9.2f} ms   max {samples[-1]:9.2f} ms")
+
+if __name__ == "__main__":
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+
+    asyncio.run(run("/login_offloaded", 1, 1))  # warm up the pool
+    report("blocking", asyncio.run(run("/login_blocking", logins, concurrency)))
+    report("offloaded", asyncio.run(run("/login_offloaded", logins, concurrency)))
+    crypto_executor.shutdown()
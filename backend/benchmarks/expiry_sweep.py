@@ -0,0 +1,49 @@
+"""
+Cost of one expired-session sweep with many live sessions: scanning every
+session (old cleanup_expired) vs. popping the session table's expiry heap.
+
+Usage: python benchmarks/expiry_sweep.py [live_sessions] [expired_per_sweep]
+"""
+import sys, time, statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from SecureServer.code.state_backend import SessionTable
+
+SWEEPS = 20
+
+def fill(table: SessionTable, live: int, expired: int, now: float):
+    for i in range(live):
+        table.set(f"live{i}", {"login_secret": b"", "exp": now + 3600 + i})
+    for sweep in range(SWEEPS):
+        for i in range(expired):
+            table.set(f"old{sweep}-{i}", {"login_secret": b"", "exp": now + sweep})
+
+def old_cleanup(table: SessionTable, now: float) -> int:
+    """The previous cleanup: scan every session."""
+    sessions = table._sessions
+    expired = [sid for sid, s in sessions.items() if s["exp"] < now]
+    for sid in expired:
+        del sessions[sid]
+    return len(expired)
+
+def run(cleanup, live: int, expired: int) -> list:
+    now = time.time()
+    table = SessionTable()
+    fill(table, live, expired, now)
+    samples = []
+    for sweep in range(SWEEPS):
+        start = time.perf_counter()
+        assert cleanup(table, now + sweep + 0.5) == expired
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def report(name: str, samples: list) -> None:
+    print(f"{name:<12} mean {statistics.mean(samples):8.3f} ms   p50 {statistics.median(samples):8.3f} ms per sweep")
+
+if __name__ == "__main__":
+    live = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    expired = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    report("full scan", run(old_cleanup, live, expired))
+    report("expiry heap", run(lambda table, now: table.cleanup(now), live, expired))
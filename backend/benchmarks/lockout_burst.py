@@ -0,0 +1,70 @@
+"""
+Brute-force burst against the lockout check: rewriting failed_attempts.json
+on every attempt (old) vs. the in-memory lockout tracker with snapshots.
+Runs against a temp dir; nothing under data/ is touched.
+
+Usage: python benchmarks/lockout_burst.py [attempts] [usernames]
+"""
+import sys, time, tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from SecureServer.code import lockout_store
+from SecureServer.code.file_handling import load_failed_attempts, save_failed_attempts
+from SecureServer.code.file_writer import writer
+
+MAX_FAILURES = 5
+WINDOW = 900
+
+def old_attempt(file: Path, username: str) -> int:
+    """The previous login_guard flow. Returns the number of file saves."""
+    failed_attempts = load_failed_attempts(file)
+    attempts = [ts for ts in failed_attempts.get(username, []) if time.time() - ts < WINDOW]
+    failed_attempts[username] = attempts
+    if len(attempts) >= MAX_FAILURES:
+        save_failed_attempts(failed_attempts, file)
+        return 1
+    attempts.append(time.time())
+    save_failed_attempts(failed_attempts, file)
+    return 1
+
+def run_old(file: Path, attempts: int, usernames: int):
+    saves = 0
+    start = time.perf_counter()
+    for i in range(attempts):
+        saves += old_attempt(file, f"victim{i % usernames}")
+    return time.perf_counter() - start, saves
+
+def run_new(file: Path, attempts: int, usernames: int, interval: int):
+    saves = 0
+    save = lockout_store.save_failed_attempts
+
+    def counted(*args):
+        nonlocal saves
+        saves += 1
+        save(*args)
+
+    lockout_store.save_failed_attempts = counted
+    tracker = lockout_store.LockoutTracker(file, MAX_FAILURES, WINDOW, interval)
+    start = time.perf_counter()
+    for i in range(attempts):
+        username = f"victim{i % usernames}"
+        if tracker.locked(username) is None:
+            tracker.record_failure(username)
+    elapsed = time.perf_counter() - start
+    tracker.flush()
+    lockout_store.save_failed_attempts = save
+    return elapsed, saves
+
+def report(name: str, attempts: int, elapsed: float, saves: int) -> None:
+    print(f"{name:<22} {elapsed * 1e6 / attempts:9.1f} us/attempt   {saves:6d} file saves")
+
+if __name__ == "__main__":
+    attempts = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    usernames = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    with tempfile.TemporaryDirectory() as scratch:
+        scratch = Path(scratch)
+        report("rewrite per attempt", attempts, *run_old(scratch / "old.json", attempts, usernames))
+        report("tracker (5 s snapshot)", attempts, *run_new(scratch / "new.json", attempts, usernames, 5))
+        writer.flush()
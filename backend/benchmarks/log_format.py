@@ -0,0 +1,53 @@
+"""
+Cost of turning one access log record into its stored line: coloured text
+with the status regex-searched in the message (old), coloured text with the
+status passed as a field, and JSON. Then the query tool streaming a generated
+log file (memory stays flat: lines are read one at a time).
+
+Usage: python benchmarks/log_format.py [records]
+"""
+import sys, time, tempfile, tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from SecureServer.code.logs import ServerLogRecord, format_server_log, format_json_log
+from SecureServer.code.log_query import query
+
+MESSAGE = '127.0.0.1:5000 - "GET /get_personal_information HTTP/1.1"'
+FIELDS = {"client": "127.0.0.1:5000", "method": "GET", "route": "/get_personal_information",
+          "status": 200, "latency_ms": 7.21, "user": "alice"}
+
+def per_record(func, records: int) -> float:
+    start = time.perf_counter()
+    for _ in range(records):
+        func()
+    return (time.perf_counter() - start) / records * 1e6
+
+if __name__ == "__main__":
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    record = ServerLogRecord("INFO", MESSAGE, FIELDS)
+
+    print(f"text, status parsed   {per_record(lambda: format_server_log('INFO', MESSAGE + ' 200'), records):6.2f} us/record")
+    print(f"text, status field    {per_record(lambda: format_server_log('INFO', MESSAGE, 200), records):6.2f} us/record")
+    print(f"json                  {per_record(lambda: format_json_log(record), records):6.2f} us/record")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_file = Path(tmp) / "server.log"
+        with open(log_file, "w", encoding="utf-8") as f:
+            for i in range(records * 4):
+                record.created = 1760000000 + i / 100
+                record.fields = {**FIELDS, "user": f"user{i % 500}", "status": 404 if i % 50 == 0 else 200}
+                f.write(format_json_log(record) + "\n")
+        size = log_file.stat().st_size
+
+        for name, filters in (("user + status", {"user": "user0", "status": "4xx"}), ("status only", {"status": "4xx"})):
+            start = time.perf_counter()
+            matched = sum(1 for _ in query([log_file], **filters))
+            elapsed = time.perf_counter() - start
+            print(f"query {name:<14} {records * 4} lines ({size / 1e6:.1f} MB): {matched:5d} matches in {elapsed * 1000:5.0f} ms"
+                  f" ({records * 4 / elapsed:,.0f} lines/s)")
+
+        tracemalloc.start()
+        sum(1 for _ in query([log_file], status="4xx"))
+        print(f"query peak memory {tracemalloc.get_traced_memory()[1] / 1024:.0f} KiB")
+        tracemalloc.stop()
@@ -0,0 +1,63 @@
+"""
+Per-call cost of server_log() on the request path (an access log line from
+uvicorn and a guard's log line): formatted and written on the caller (old) vs.
+only enqueued for the log thread. Also the time until the queue is written
+out, and what a burst does to a small queue under each full-queue policy.
+Log lines go to a temporary file, not server.log.
+
+Usage: python benchmarks/log_pipeline.py [calls]
+"""
+import sys, time, logging, tempfile, statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from SecureServer.code import logs
+from SecureServer.code.logs import server_log, start_log_queue, stop_log_queue, flush_logs
+
+ACCESS = logging.getLogger("uvicorn.access")
+
+def request_path_logs(i: int) -> None:
+    ACCESS.info('%s - "%s %s HTTP/%s" %d', "127.0.0.1:5000", "GET", "/api/get_user_info", "1.1", 200)
+    server_log("INFO", f"User alice (#{i}) retrieved their personal information.")
+
+def timed(calls: int) -> list:
+    samples = []
+    for i in range(calls):
+        start = time.perf_counter()
+        request_path_logs(i)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+def report(name: str, samples: list, drained: float) -> None:
+    print(f"{name:<10} per request {statistics.mean(samples):6.1f} us   p99 {sorted(samples)[len(samples) * 99 // 100]:6.1f} us"
+          f"   max {max(samples):8.1f} us   all written after {drained:7.1f} ms")
+
+if __name__ == "__main__":
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_file = Path(tmp) / "bench.log"
+        logs.handler.setStream(open(log_file, "a", encoding="utf-8")).close()
+        logs.handler.maxBytes = 0  # no rotation into the real log directory
+
+        for name, size in (("sync", 0), ("queued", 10000)):
+            start_log_queue(size, "drop")
+            timed(500)  # warm up
+            flush_logs()
+            start = time.perf_counter()
+            samples = timed(calls)
+            flush_logs()
+            report(name, samples, (time.perf_counter() - start) * 1000)
+
+        for policy in ("drop", "block"):
+            start_log_queue(100, policy)
+            start = time.perf_counter()
+            for i in range(calls):
+                server_log("INFO", f"burst {i}")
+            caller = (time.perf_counter() - start) * 1000
+            stop_log_queue()
+            written = sum(1 for line in open(log_file, encoding="utf-8") if "burst" in line)
+            dropped = sum(1 for line in open(log_file, encoding="utf-8") if "dropped" in line)
+            print(f"burst into a 100 record queue, policy {policy:<5}: caller {caller:7.1f} ms, {written} of {calls} written"
+                  f"{f', drops reported {dropped}x' if dropped else ''}")
+            logs.handler.stream.truncate(0)
@@ -0,0 +1,87 @@
+"""
+Failed logins through login_guard for a mix of real and unknown usernames:
+throughput and whether the two are distinguishable by timing.
+Users are kept in memory and failed attempts in a temp dir; nothing under data/ is touched.
+
+Usage: python benchmarks/login_dummy_hash.py [attempts_per_kind]
+"""
+import sys, time, asyncio, tempfile, statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from fastapi.responses import JSONResponse
+from starlette.requests import Request
+from pydantic import BaseModel
+from SecureServer import app as secure_app
+from SecureServer.code.encryption import hash_pw, hash_pw_async, verify_pw_async
+from SecureServer.code.lockout_store import LockoutTracker
+from SecureServer.code.file_writer import writer
+from SecureServer.code import crypto_executor
+
+class LoginRequest(BaseModel):
+    username: str
+    password: str
+
+class MemoryUsers:
+    """Just enough of the user repository for login_guard."""
+    def __init__(self, users: list):
+        self._by_username = {u["username"]: u for u in users}
+
+    def get_by_username(self, username: str):
+        return dict(self._by_username[username]) if username in self._by_username else None
+
+    def save_user(self, user: dict):
+        self._by_username[user["username"]] = user
+
+def make_request() -> Request:
+    return Request({"type": "http", "method": "POST", "path": "/login", "headers": [], "client": ("127.0.0.1", 0)})
+
+async def attempt(login, username: str) -> float:
+    start = time.perf_counter()
+    await login(make_request(), LoginRequest(username=username, password="wrong password"))
+    return (time.perf_counter() - start) * 1000
+
+def report(name: str, samples: list) -> None:
+    print(f"{name:<14} mean {statistics.mean(samples):8.1f} ms   p50 {statistics.median(samples):8.1f} ms   "
+          f"stdev {statistics.stdev(samples):6.1f} ms")
+
+async def main(per_kind: int, scratch: Path):
+    users = [{"id": str(i), "username": f"bench{i}", "password": hash_pw("right password")} for i in range(4)]
+    secure_app.user_repository = MemoryUsers(users)
+    # Never lock the bench users out
+    secure_app.state.lockouts = LockoutTracker(scratch / "failed_attempts.json", max_failures=1_000_000, interval=0)
+
+    guard = secure_app.SecureApp()
+
+    @guard.login_guard()
+    async def login(request: Request, data: LoginRequest):
+        return JSONResponse({"success": True})
+
+    await attempt(login, "bench0")  # warm up the crypto pool
+
+    known, unknown = [], []
+    start = time.perf_counter()
+    for i in range(per_kind):
+        known.append(await attempt(login, f"bench{i % len(users)}"))
+        unknown.append(await attempt(login, f"nobody{i}"))
+    elapsed = time.perf_counter() - start
+
+    # What an unknown username used to cost: hash a dummy, then verify against it
+    before = []
+    for i in range(per_kind):
+        t = time.perf_counter()
+        await verify_pw_async("wrong password", await hash_pw_async(f"nobody{i}_dummy"))
+        before.append((time.perf_counter() - t) * 1000)
+
+    report("known user", known)
+    report("unknown user", unknown)
+    report("unknown (old)", before)
+    print(f"throughput     {2 * per_kind / elapsed:.2f} failed logins/s   "
+          f"unknown - known mean {statistics.mean(unknown) - statistics.mean(known):+.1f} ms")
+
+if __name__ == "__main__":
+    per_kind = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    with tempfile.TemporaryDirectory() as scratch:
+        asyncio.run(main(per_kind, Path(scratch)))
+        writer.flush()
+    crypto_executor.shutdown()
@@ -0,0 +1,44 @@
+"""
+Successful-login key derivation: legacy three-stretch path vs. the single-stretch key schedule.
+
+Usage: python benchmarks/login_key_schedule.py [iterations]
+"""
+import sys, os, time, hashlib, statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from SecureServer.code.encryption import (
+    hash_pw, verify_pw, verify_login, login_keys, stretch_vault_secret
+)
+
+def timed(func, iterations: int) -> list:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def report(name: str, samples: list) -> None:
+    print(f"{name:<10} mean {statistics.mean(samples):9.1f} ms   p50 {statistics.median(samples):9.1f} ms   "
+          f"{1000 / statistics.mean(samples):6.2f} logins/s/core")
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    password = "correct horse battery staple"
+    salt = os.urandom(16).hex()
+    stored = hash_pw(password)
+
+    def before():
+        # verify_pw + get_new_token's login secret + stretch_vault_secret
+        assert verify_pw(password, stored)
+        login_secret = hashlib.pbkdf2_hmac('sha256', password.encode(), bytes.fromhex(salt), 600_000, dklen=32)
+        stretch_vault_secret(login_secret, salt)
+
+    def after():
+        master = verify_login(password, stored)
+        login_keys(master)
+
+    report("before", timed(before, iterations))
+    report("after", timed(after, iterations))
@@ -0,0 +1,90 @@
+"""
+Requests/s through the add_security_headers() stack for a static file and
+an API call: BaseHTTPMiddleware security headers (old) vs. pure ASGI.
+Requests are fed straight to the ASGI app, so no sockets are involved.
+
+Usage: python benchmarks/middleware_stack.py [requests]
+"""
+import sys, time, asyncio
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.middleware.sessions import SessionMiddleware
+from SecureServer.code.middleware import SecurityHeadersMiddleware, StaticFilesWithHeaders
+from SecureServer.code.environment_variables import ALLOWED_HOSTS, SYSTEM_KEY
+
+FRONTEND = Path(__file__).parent.parent.parent / "frontend"
+
+class OldSecurityHeadersMiddleware(BaseHTTPMiddleware):
+    """The previous implementation."""
+    async def dispatch(self, request, call_next):
+        response = await call_next(request)
+        response.headers["Content-Security-Policy"] = (
+            "default-src 'self'; "
+            "script-src 'self'; "
+            "style-src 'self' 'unsafe-inline'; "
+            "frame-ancestors 'none';"
+        )
+        response.headers["X-Frame-Options"] = "DENY"
+        response.headers["X-Content-Type-Options"] = "nosniff"
+        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
+        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains; preload"
+        return response
+
+def build(headers_middleware) -> FastAPI:
+    """Same stack as SecureApp.add_security_headers() + mount()."""
+    app = FastAPI()
+    app.add_middleware(TrustedHostMiddleware, allowed_hosts=ALLOWED_HOSTS)
+    app.add_middleware(SessionMiddleware, secret_key=SYSTEM_KEY)
+    app.add_middleware(headers_middleware)
+
+    @app.get("/api/ping")
+    async def ping(request: Request):
+        return JSONResponse({"success": True, "message": "pong"})
+
+    app.mount("/", StaticFilesWithHeaders(directory=FRONTEND, html=True), name="frontend")
+    return app
+
+async def drive(app: FastAPI, path: str, requests: int) -> float:
+    idle = asyncio.Event()
+
+    def receiver():
+        # Like a server: the request body once, then wait (BaseHTTPMiddleware listens for disconnects)
+        sent = False
+        async def receive():
+            nonlocal sent
+            if sent:
+                await idle.wait()
+            sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        return receive
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            assert message["status"] == 200, message["status"]
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+            "headers": [(b"host", b"localhost")], "client": ("127.0.0.1", 5000),
+            "server": ("localhost", 8000), "state": {},
+        }
+        await app(scope, receiver(), send)
+    return requests / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    for name, middleware in (("BaseHTTPMiddleware", OldSecurityHeadersMiddleware), ("pure ASGI", SecurityHeadersMiddleware)):
+        app = build(middleware)
+        for path in ("/style.css", "/api/ping"):
+            asyncio.run(drive(app, path, 200))  # warm up
+        static = asyncio.run(drive(app, "/style.css", requests))
+        api = asyncio.run(drive(app, "/api/ping", requests))
+        print(f"{name:<20} static file {static:8.0f} req/s   API call {api:8.0f} req/s")
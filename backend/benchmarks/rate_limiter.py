@@ -0,0 +1,102 @@
+"""
+Per-request rate limiter overhead through the ASGI app: no limiter, the
+previous slowapi Limiter + SlowAPIMiddleware (if installed), and the native
+GCRA limiter. Also the memory kept per distinct client.
+
+Usage: python benchmarks/rate_limiter.py [requests] [clients]
+"""
+import sys, gc, time, asyncio, tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+from SecureServer.code.rate_limit import RateLimiter
+from SecureServer.code.state_backend import RateLimitTable
+
+LIMIT = "1000000/minute"
+
+def build(kind: str) -> FastAPI:
+    app = FastAPI()
+    if kind == "slowapi":
+        from slowapi import Limiter
+        from slowapi.util import get_remote_address
+        from slowapi.middleware import SlowAPIMiddleware
+        app.state.limiter = Limiter(key_func=get_remote_address)
+        app.add_middleware(SlowAPIMiddleware)
+        decorate = app.state.limiter.limit(LIMIT)
+    elif kind == "native":
+        decorate = RateLimiter().limit(LIMIT)
+    else:
+        decorate = lambda func: func
+
+    @app.get("/limited")
+    @decorate
+    async def limited(request: Request):
+        return PlainTextResponse("ok")
+
+    @app.get("/open")
+    async def unlimited(request: Request):
+        return PlainTextResponse("ok")
+
+    return app
+
+async def drive(app: FastAPI, path: str, requests: int, clients: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for i in range(requests):
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+            "headers": [(b"host", b"localhost")], "client": (f"10.{i % clients // 65536}.{i % clients // 256 % 256}.{i % 256}", 5000),
+            "server": ("localhost", 8000), "state": {},
+        }
+        await app(scope, receive, send)
+    return (time.perf_counter() - start) * 1e6 / requests
+
+def retained_bytes(kind: str, clients: int) -> float:
+    """Memory kept by the limiter per distinct client."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    if kind == "slowapi":
+        from limits import parse
+        from limits.storage import MemoryStorage
+        from limits.strategies import FixedWindowRateLimiter
+        keeper = FixedWindowRateLimiter(MemoryStorage())
+        item = parse(LIMIT)
+        for i in range(clients):
+            keeper.hit(item, "benchmarks.rate_limiter.limited", f"10.{i // 65536}.{i // 256 % 256}.{i % 256}")
+    else:
+        keeper = RateLimitTable(clients)
+        for i in range(clients):
+            keeper.acquire([(f"0:10.{i // 65536}.{i // 256 % 256}.{i % 256}", 0.06, 60.0)])
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / clients
+
+if __name__ == "__main__":
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    kinds = ["none", "native"]
+    try:
+        import slowapi
+        kinds.insert(1, "slowapi")
+    except ImportError:
+        print("slowapi not installed; skipping the old limiter")
+
+    for kind in kinds:
+        app = build(kind)
+        asyncio.run(drive(app, "/limited", 1000, clients))  # warm up
+        asyncio.run(drive(app, "/open", 1000, clients))
+        limited = asyncio.run(drive(app, "/limited", requests, clients))
+        unlimited = asyncio.run(drive(app, "/open", requests, clients))
+        memory = f"{retained_bytes(kind, 100_000):7.0f} B/client" if kind != "none" else ""
+        print(f"{kind:<8} limited route {limited:7.1f} us/req   unlimited route {unlimited:7.1f} us/req   {memory}")
@@ -0,0 +1,44 @@
+"""
+Authenticated-request key path: full PBKDF2 derivation vs. the per-session KEK cache.
+
+Usage: python benchmarks/require_token_kek.py [iterations]
+"""
+import sys, os, time, uuid, statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from SecureServer.code.encryption import derive_vault_key, stretch_vault_secret, expand_vault_key, encrypt_vault, decrypt_vault
+from SecureServer.code.session_store import create_session, cache_kek, get_cached_kek, destroy_session
+
+def timed(func, iterations: int) -> list:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def report(name: str, samples: list) -> None:
+    print(f"{name:<10} mean {statistics.mean(samples):9.3f} ms   p50 {statistics.median(samples):9.3f} ms   max {max(samples):9.3f} ms")
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    salt = os.urandom(16).hex()
+    session_id = str(uuid.uuid4())
+    login_secret = os.urandom(32)
+
+    create_session(session_id, login_secret)
+    cache_kek(session_id, stretch_vault_secret(login_secret, salt))
+    cookie = encrypt_vault(b"AUTHORIZED", derive_vault_key(login_secret, salt, session_id))
+
+    def before():
+        decrypt_vault(cookie, derive_vault_key(login_secret, salt, session_id))
+
+    def after():
+        decrypt_vault(cookie, expand_vault_key(get_cached_kek(session_id), session_id))
+
+    report("before", timed(before, iterations))
+    report("after", timed(after, iterations * 1000))
+
+    destroy_session(session_id)
@@ -0,0 +1,45 @@
+"""
+First request per user after a restart: logging everyone in again (old) vs.
+loading their persisted session lazily (PERSIST_SESSIONS).
+Sessions are stored in a temp dir; nothing under data/ is touched.
+
+Usage: python benchmarks/session_restart.py [users]
+"""
+import sys, os, time, base64, tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from SecureServer.code.encryption import hash_pw, verify_login, login_keys, expand_vault_key
+from SecureServer.code.session_db import SessionDatabase
+from SecureServer.code.state_backend import SessionTable
+
+def report(name: str, users: int, elapsed: float) -> None:
+    print(f"{name:<22} {elapsed:8.2f} s total   {elapsed * 1000 / users:9.2f} ms/user   {users / elapsed:9.1f} users/s/core")
+
+if __name__ == "__main__":
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    password = "correct horse battery staple"
+    stored = hash_pw(password)
+    key = base64.urlsafe_b64encode(os.urandom(32)).decode()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        db_file = Path(scratch) / "sessions.db"
+        table = SessionTable(SessionDatabase(db_file, key), limit=users)
+        login_secret, base_key = login_keys(verify_login(password, stored))
+        for i in range(users):
+            table.set(f"session{i}", {"login_secret": login_secret, "base_key": base_key,
+                                      "key_schedule": True, "exp": int(time.time()) + 3600})
+
+        # Old: sessions were memory only, so every user logs in again
+        start = time.perf_counter()
+        for i in range(users):
+            expand_vault_key(login_keys(verify_login(password, stored))[1], f"session{i}")
+        report("re-login (old)", users, time.perf_counter() - start)
+
+        # New: a fresh process finds each session on its first request
+        restarted = SessionTable(SessionDatabase(db_file, key), limit=users)
+        start = time.perf_counter()
+        for i in range(users):
+            expand_vault_key(restarted.get(f"session{i}")["base_key"], f"session{i}")
+        report("persisted session", users, time.perf_counter() - start)
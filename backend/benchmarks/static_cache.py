@@ -0,0 +1,102 @@
+"""
+Static file requests/s for the login and dashboard pages and every asset they
+load: straight from disk (FileResponse) vs. the in-memory StaticFileCache,
+for frontend/ as is and for the precompressed build. Requests are fed
+straight to the ASGI app, so no sockets are involved.
+
+Usage: python benchmarks/static_cache.py [rounds]
+"""
+import re, sys, time, shutil, asyncio, tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from fastapi import FastAPI
+from SecureServer.code.middleware import StaticFilesWithHeaders
+from SecureServer.code.static_assets import build_assets, PrecompressedStaticFiles
+from SecureServer.code.static_cache import StaticFileCache
+
+FRONTEND = Path(__file__).parent.parent.parent / "frontend"
+PAGES = ("/login.html", "/dashboard.html")
+SUBRESOURCE = re.compile(r"""<(?:link|script)\b[^>]*?\b(?:href|src)\s*=\s*["']([^"']+)["']""", re.IGNORECASE)
+
+def page_urls(directory: Path) -> list:
+    """Each page and the assets it references (absolute URLs)."""
+    urls = []
+    for page in PAGES:
+        urls.append(page)
+        html = (directory / page.lstrip("/")).read_text()
+        urls.extend(ref if ref.startswith("/") else "/" + ref for ref in SUBRESOURCE.findall(html))
+    return urls
+
+async def get(app, path: str) -> tuple:
+    status, body, sent = None, [], False
+
+    async def receive():
+        # Like a server: the request once, then wait (FileResponse listens for disconnects)
+        nonlocal sent
+        if sent:
+            await asyncio.Event().wait()
+        sent = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"localhost"), (b"accept-encoding", b"gzip, deflate, br")],
+        "client": ("127.0.0.1", 5000), "server": ("localhost", 8000), "state": {},
+    }
+    await app(scope, receive, send)
+    return status, b"".join(body)
+
+async def drive(app, urls: list, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for url in urls:
+            status, _ = await get(app, url)
+            assert status == 200, (url, status)
+    return rounds * len(urls) / (time.perf_counter() - start)
+
+def mounted(files) -> FastAPI:
+    app = FastAPI()
+    app.mount("/", files, name="frontend")
+    return app
+
+async def check_invalidation(directory: Path) -> None:
+    """An edited file is served fresh on the next request."""
+    cache = StaticFileCache(1024 * 1024, 64 * 1024)
+    app = mounted(StaticFilesWithHeaders(directory=directory, html=True, cache=cache))
+    css = directory / "style.css"
+    _, before = await get(app, "/style.css")
+    css.write_bytes(before + b"\n/* edited */\n")
+    _, after = await get(app, "/style.css")
+    assert after.endswith(b"/* edited */\n"), "stale cache entry served"
+    css.write_bytes(before)
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "frontend"
+        shutil.copytree(FRONTEND, source)
+        asyncio.run(check_invalidation(source))
+        build = Path(tmp) / "build" / "frontend"
+        assets = build_assets(source, build)
+
+        for name, directory, make in (
+            ("frontend/", source, lambda cache: StaticFilesWithHeaders(directory=source, html=True, cache=cache)),
+            ("pipeline", build, lambda cache: PrecompressedStaticFiles(directory=build, html=True, cache=cache, assets=assets)),
+        ):
+            urls = page_urls(directory)
+            results = []
+            for cache in (None, StaticFileCache(16 * 1024 * 1024, 512 * 1024)):
+                app = mounted(make(cache))
+                asyncio.run(drive(app, urls, 20))  # warm up
+                results.append(asyncio.run(drive(app, urls, rounds)))
+            print(f"{name:<10} {len(urls)} files   disk {results[0]:8.0f} req/s   cached {results[1]:8.0f} req/s   x{results[1] / results[0]:.1f}")
@@ -0,0 +1,82 @@
+"""
+Bytes and requests per dashboard load: frontend/ served as is (old) vs. the
+fingerprinted, precompressed build. A small browser model fetches the page and
+every <link>/<script> it references; cached responses marked immutable are
+reused without a request, anything else is revalidated (If-None-Match /
+If-Modified-Since). Cold = empty cache, repeat = second visit.
+
+Usage: python benchmarks/static_pipeline.py [loads]
+"""
+import re, sys, time, tempfile
+from pathlib import Path
+from urllib.parse import urljoin
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from SecureServer.code.middleware import StaticFilesWithHeaders
+from SecureServer.code.static_assets import build_assets, PrecompressedStaticFiles
+
+FRONTEND = Path(__file__).parent.parent.parent / "frontend"
+PAGE = "/dashboard.html"
+SUBRESOURCE = re.compile(r"""<(?:link|script)\b[^>]*?\b(?:href|src)\s*=\s*["']([^"']+)["']""", re.IGNORECASE)
+
+class Browser:
+    """HTTP cache of one browser tab: counts requests and body bytes on the wire."""
+    def __init__(self, client: TestClient):
+        self.client = client
+        self.cache = {}  # url -> (headers, body)
+        self.requests = self.bytes = 0
+
+    def fetch(self, url: str) -> bytes:
+        cached = self.cache.get(url)
+        if cached and "immutable" in cached[0].get("cache-control", ""):
+            return cached[1]
+
+        headers = {"Accept-Encoding": "gzip, deflate, br"}
+        if cached:
+            if "etag" in cached[0]:
+                headers["If-None-Match"] = cached[0]["etag"]
+            if "last-modified" in cached[0]:
+                headers["If-Modified-Since"] = cached[0]["last-modified"]
+        response = self.client.get(url, headers=headers)
+        self.requests += 1
+        self.bytes += int(response.headers.get("content-length", len(response.content)))
+        if response.status_code == 304:
+            return cached[1]
+        self.cache[url] = (response.headers, response.content)
+        return response.content
+
+    def load(self, page: str) -> None:
+        html = self.fetch(page).decode()
+        for ref in SUBRESOURCE.findall(html):
+            self.fetch(urljoin(page, ref))
+
+def measure(files, loads: int) -> tuple:
+    app = FastAPI()
+    app.mount("/", files, name="frontend")
+    client = TestClient(app)
+
+    cold = Browser(client)
+    cold.load(PAGE)
+    repeat_requests, repeat_bytes = cold.requests, cold.bytes
+    start = time.perf_counter()
+    for _ in range(loads):
+        cold.load(PAGE)
+    elapsed = (time.perf_counter() - start) / loads * 1000
+    repeat = ((cold.requests - repeat_requests) / loads, (cold.bytes - repeat_bytes) / loads)
+    return (repeat_requests, repeat_bytes), repeat, elapsed
+
+def report(name: str, result: tuple) -> None:
+    (cold_requests, cold_bytes), (repeat_requests, repeat_bytes), elapsed = result
+    print(f"{name:<10} cold {cold_requests:3d} req {cold_bytes:8d} B   "
+          f"repeat {repeat_requests:5.1f} req {repeat_bytes:8.0f} B   {elapsed:6.2f} ms/repeat load")
+
+if __name__ == "__main__":
+    loads = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    report("old", measure(StaticFilesWithHeaders(directory=FRONTEND, html=True), loads))
+    with tempfile.TemporaryDirectory() as tmp:
+        build = Path(tmp) / "frontend"
+        assets = build_assets(FRONTEND, build)
+        report("pipeline", measure(PrecompressedStaticFiles(directory=build, html=True, assets=assets), loads))
@@ -0,0 +1,51 @@
+"""
+Cost of re-signing the user database after a single-user update:
+whole-file HMAC (old format) vs. per-record HMAC + Merkle path (new format).
+
+Usage: python benchmarks/user_integrity.py [vault_bytes]
+"""
+import sys, os, json, time, uuid, base64
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from SecureServer.code.encryption import calculate_hmac
+from SecureServer.code.integrity import MerkleTree, sign_record, sign_root
+
+def make_users(count: int, vault_bytes: int) -> list:
+    return [{
+        "id": str(uuid.uuid4()),
+        "username": f"user{i}",
+        "salt": os.urandom(16).hex(),
+        "vault": base64.urlsafe_b64encode(os.urandom(vault_bytes)).decode(),
+    } for i in range(count)]
+
+def timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+if __name__ == "__main__":
+    vault_bytes = int(sys.argv[1]) if len(sys.argv) > 1 else 1024
+
+    print(f"{'users':>8} {'whole-file':>14} {'per-record':>14} {'initial sign':>14} {'verify one':>14}")
+    for count in (1_000, 10_000, 100_000):
+        users = make_users(count, vault_bytes)
+        tree = MerkleTree([sign_record(u) for u in users])
+        index = count // 2
+        users[index]["vault"] = base64.urlsafe_b64encode(os.urandom(vault_bytes)).decode()
+
+        def whole_file():
+            calculate_hmac(json.dumps(users, indent=2, sort_keys=True))
+
+        def per_record():
+            tree.update(index, sign_record(users[index]))
+            sign_root(tree)
+
+        def initial_sign():
+            sign_root(MerkleTree([sign_record(u) for u in users]))
+
+        def verify_one():
+            return sign_record(users[index]) == tree.leaf(index)
+
+        print(f"{count:>8} {timed(whole_file):>11.2f} ms {timed(per_record):>11.3f} ms "
+              f"{timed(initial_sign):>11.2f} ms {timed(verify_one):>11.3f} ms")
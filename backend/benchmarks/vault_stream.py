@@ -0,0 +1,83 @@
+"""
+Saving and reading one vault: the old path (the whole vault encrypted into
+one string inside the user record, so every save rewrites users.json) vs.
+the chunked vault file (streamed in 64 KiB pieces, as /upload_vault receives
+them, and read back a chunk at a time), plus a 4 KiB range read. Time and
+peak Python memory per operation, with other users in users.json. Runs
+against a temp dir; nothing under data/ is touched.
+
+Usage: python benchmarks/vault_stream.py [users]
+"""
+import sys, os, time, uuid, tempfile, tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from SecureServer.code import file_handling, vault_store
+from SecureServer.code.user_store import user_repository
+from SecureServer.code.encryption import generate_vault_master_key, encrypt_vault, decrypt_vault
+from SecureServer.code.file_writer import writer
+
+PIECE = 64 * 1024
+KEY = generate_vault_master_key()
+
+def populate(count: int) -> str:
+    users = [{"id": str(uuid.uuid4()), "username": f"user{i}", "salt": "00", "vault": "x" * 2048} for i in range(count)]
+    user_repository.save_all(users)
+    return users[0]["id"]
+
+def old_save(user_id: str, text: str) -> None:
+    user = user_repository.get_by_id(user_id)
+    user["vault"] = encrypt_vault(text, KEY)
+    user_repository.save_user(user)
+
+def old_read(user_id: str) -> None:
+    decrypt_vault(user_repository.get_by_id(user_id)["vault"], KEY)
+
+def new_save(user_id: str, data: bytes) -> None:
+    with vault_store.VaultWriter(user_id, KEY) as vault:
+        for i in range(0, len(data), PIECE):
+            vault.write(data[i:i + PIECE])
+        vault.commit()
+
+def new_read(user_id: str, start: int = 0, end: int = None) -> None:
+    user_repository.get_by_id(user_id)
+    with vault_store.open_vault(user_id, KEY) as reader:
+        for _ in reader.read(start, end):
+            pass
+
+def measure(func, *args) -> tuple:
+    """(ms, peak KiB) of func(*args)."""
+    start = time.perf_counter()
+    func(*args)
+    elapsed = (time.perf_counter() - start) * 1000
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    return elapsed, peak
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    writer.set_window(0)  # every save is written before it returns
+
+    with tempfile.TemporaryDirectory() as scratch:
+        file_handling.USERS_FILE = user_repository._file = Path(scratch) / "users.json"
+        vault_store.VAULT_CHUNKS_DIR = Path(scratch) / "vault_chunks"
+        user_id = populate(count)
+
+        for size in (100 * 1000, 4 * 1024 * 1024, 16 * 1024 * 1024):
+            data = os.urandom(size // 2).hex().encode()
+            middle = size // 2
+            for name, func, args in (
+                ("save (old, in record)", old_save, (user_id, data.decode())),
+                ("read (old, in record)", old_read, (user_id,)),
+                ("save (chunked, streamed)", new_save, (user_id, data)),
+                ("read (chunked, streamed)", new_read, (user_id,)),
+                ("read 4 KiB range", new_read, (user_id, middle, middle + 4096)),
+            ):
+                elapsed, peak = measure(func, *args)
+                print(f"{size // 1024:6d} KiB vault  {name:<26} {elapsed:8.1f} ms   peak {peak:9.0f} KiB")
+            # Back to a small record for the next size
+            user = user_repository.get_by_id(user_id)
+            user.pop("vault", None)
+            user_repository.save_user(user)
@@ -1,178 +1,288 @@
-import os, time, math
-from pathlib import Path
-
-from SecureServer.code.request_validation import SignupRequest, LoginRequest, VaultUpdateRequest, PasswordChangeRequest
-
-from SecureServer.app import SecureApp, Request, JSONResponse
-from SecureServer.server import *
-
-BACKEND = Path(__file__).parent
-BASE_DIR = BACKEND.parent
-FRONTEND = BASE_DIR / "frontend"
-
-app = SecureApp()
-server = SecureServer()
-
-app.NAME = "Secure Vault"
-
-app.USE_HTTPS = False
-app.ENABLE_2FA = True
-app.REQUIRE_2FA = True
-app.add_security_headers()
-
-# === API Endpoints ===
-
-# --- POSTs ---
-@app.post("/signup") # ------ /signup
-@app.limit("10/minute")
-@app.signup_guard()
-async def signup(request: Request, data: SignupRequest) -> JSONResponse:
-    pass
-
-@app.post("/login") # ------ /login
-@app.limit("6/minute")
-@app.login_guard()
-async def login(request: Request, data: LoginRequest) -> JSONResponse:
-    pass
-
-@app.post("/logout") # ------ /logout
-@app.limit("10/minute")
-@app.auth_guard()
-@app.force_logout()
-async def logout(request: Request):
-    pass
-
-@app.post("/enable_2fa") # ------ /enable_2fa
-@app.limit("6/hour")
-@app.auth_guard()
-async def enable_2fa(request: Request, data: dict) -> JSONResponse:
-    users = app.database.load_users()
-    user = request.state.user
-
-    if user.get("2fa_enabled", False):
-        return JSONResponse({"success": False, "message": "2FA is already enabled."})
-
-    # Generate a new TOTP secret
-    secret = Encryptor.random_base32()
-    user["2fa_secret"] = secret
-
-    app.database.save_users(users)
-
-    return JSONResponse({
-        "success": True,
-        "message": "2FA turned on, you will be promted to activate it the next time you log in."
-    })
-
-@app.post("/disable_2fa") # ------ /disable_2fa
-@app.limit("1/hour")
-@app.auth_guard()
-async def disable_2fa(request: Request, data: dict) -> JSONResponse:
-    user = request.state.user
-    user["2fa_secret"] = None
-    user["2fa_enabled"] = False
-
-    users = app.database.load_users()
-    for i, u in enumerate(users):
-        if u["id"] == user["id"]:
-            users[i] = user
-            break
-    app.database.save_users(users)
-    return JSONResponse({"success": True, "message": "2FA disabled."})
-
-@app.post("/set_vault_information") # ------ /set_vault_information
-@app.limit("3/minute")
-@app.auth_guard()
-async def set_vault_information(request: Request, data: VaultUpdateRequest) -> JSONResponse:
-    user = request.state.user
-    key = request.state.key
-
-    users = app.database.load_users()
-    val_user = next((u for u in users if u["id"] == user["id"]), None)
-    if not val_user:
-        app.database.log("ERROR", f"Connected user {user['username']} not found with token.")
-        return JSONResponse({"success": False, "message": "User data error."})
-
-    # Get or generate vault master key
-    if not val_user.get("vault_master_key_wrapped"):
-        # First time: generate new master key and wrap it
-        master_key = Encryptor.generate_vault_master_key()
-        wrapped_key = Encryptor.wrap_vault_key(master_key, key)
-        val_user["vault_master_key_wrapped"] = wrapped_key
-        app.database.log("SECURITY", f"Generated new vault master key for {user['username']}.")
-    else:
-        # Unwrap existing master key
-        try:
-            master_key = Encryptor.unwrap_vault_key(val_user["vault_master_key_wrapped"], key)
-        except Exception as e:
-            app.database.log("ERROR", f"Failed to unwrap vault key for {user['username']}: {e}")
-            return JSONResponse({"success": False, "message": "Failed to decrypt vault key."})
-
-    # Encrypt vault data with master key
-    val_user["vault"] = Encryptor.encrypt_vault(data.data, master_key)
-    app.database.save_users(users)
-    app.database.log("UPDATE", f"User {user['username']} updated their vault (encrypted).")
-    return JSONResponse({"success": True, "message": "Vault successfully updated and encrypted."})
-
-@app.post("/change_password") # ------ /change_password
-@app.limit("3/week")
-@app.auth_guard()
-@app.change_pw_protocal()
-async def change_password(request: Request, data: PasswordChangeRequest) -> JSONResponse:
-    pass
-
-# --- GETs ---
-@app.get("/get_personal_information") # ------ /get_personal_information
-@app.limit("5/minute")
-@app.auth_guard()
-async def get_personal_information(request: Request) -> JSONResponse:
-    user = request.state.user
-    key = request.state.key
-
-    vault = ""
-    if user.get("vault"):
-        try:
-            # Unwrap the vault master key using password-derived KEK
-            if not user.get("vault_master_key_wrapped"):
-                vault = "[No vault key configured]"
-            else:
-                master_key = Encryptor.unwrap_vault_key(user["vault_master_key_wrapped"], key)
-                vault = Encryptor.decrypt_vault(user["vault"], master_key)
-        except Exception as e:
-            vault = f"[Error decrypting vault: {str(e)}]"
-
-    information = {
-        "username": user["username"],
-        "first_name": user["first_name"],
-        "last_name": user["last_name"],
-        "vault": vault
-    }
-    app.database.log("UPDATE", f"User {user['username']} requested personal info.")
-    return JSONResponse({"success": True, "message": "Personal information served.", "information": information})
-
-@app.get("/get_all_users") # ------ /get_all_users
-@app.limit("5/minute")
-@app.auth_guard(admin=True)
-async def get_all_users(request: Request) -> JSONResponse:
-    user = request.state.user
-    users = app.database.load_users()
-    safe_users = [
-        {
-            "id": u["id"],
-            "username": u["username"],
-            "name": f"{u.get('first_name')} {u.get('last_name')}",
-            "admin": u.get("admin", False),
-            "vault_size": len(u.get("vault", "")),
-        } for u in users
-    ]
-    app.database.log("ADMIN ACTION", f"Admin {user['username']} retrieved all user data safely.")
-    return JSONResponse({"success": True, "message": "All safe user data has been served.", "users": safe_users})
-
-# --- Mount frontend & Run server ---
-if __name__ == "__main__":
-    app.mount(FRONTEND)
-    
-    server.app = app
-    
-    server.LoadConfig()
-    app.database.log("STARTUP", "Server starting...")
+import os, time, math, json, anyio
+from pathlib import Path
+
+from SecureServer.code.request_validation import SignupRequest, LoginRequest, VaultUpdateRequest, PasswordChangeRequest, VAULT_TEXT_LIMIT
+from SecureServer.code import listings, vault_store
+from SecureServer.code.environment_variables import VAULT_MAX_SIZE
+
+from SecureServer.app import SecureApp, Request, Response, JSONResponse, StreamingResponse
+from SecureServer.server import *
+
+BACKEND = Path(__file__).parent
+BASE_DIR = BACKEND.parent
+FRONTEND = BASE_DIR / "frontend"
+
+app = SecureApp()
+server = SecureServer()
+
+app.NAME = "Secure Vault"
+
+app.USE_HTTPS = False
+app.ENABLE_2FA = True
+app.REQUIRE_2FA = True
+app.add_security_headers()
+
+# === API Endpoints ===
+
+# --- POSTs ---
+@app.post("/signup") # ------ /signup
+@app.limit("10/minute")
+@app.signup_guard()
+async def signup(request: Request, data: SignupRequest) -> JSONResponse:
+    pass
+
+@app.post("/login") # ------ /login
+@app.limit("6/minute")
+@app.login_guard()
+async def login(request: Request, data: LoginRequest) -> JSONResponse:
+    pass
+
+@app.post("/logout") # ------ /logout
+@app.limit("10/minute")
+@app.auth_guard()
+@app.force_logout()
+async def logout(request: Request):
+    pass
+
+@app.post("/enable_2fa") # ------ /enable_2fa
+@app.limit("6/hour")
+@app.auth_guard()
+async def enable_2fa(request: Request, data: dict) -> JSONResponse:
+    user = request.state.user
+
+    if user.get("2fa_enabled", False):
+        return JSONResponse({"success": False, "message": "2FA is already enabled."})
+
+    # Generate a new TOTP secret
+    secret = Encryptor.random_base32()
+    user["2fa_secret"] = secret
+
+    app.database.save_user(user)
+
+    return JSONResponse({
+        "success": True,
+        "message": "2FA turned on, you will be promted to activate it the next time you log in."
+    })
+
+@app.post("/disable_2fa") # ------ /disable_2fa
+@app.limit("1/hour")
+@app.auth_guard()
+async def disable_2fa(request: Request, data: dict) -> JSONResponse:
+    user = request.state.user
+    user["2fa_secret"] = None
+    user["2fa_enabled"] = False
+
+    app.database.save_user(user)
+    return JSONResponse({"success": True, "message": "2FA disabled."})
+
+def vault_master_key(val_user: dict, key: str) -> str | None:
+    """The user's vault master key, generated (and wrapped into val_user) on first use. None if it cannot be unwrapped."""
+    if not val_user.get("vault_master_key_wrapped"):
+        # First time: generate new master key and wrap it
+        master_key = Encryptor.generate_vault_master_key()
+        val_user["vault_master_key_wrapped"] = Encryptor.wrap_vault_key(master_key, key)
+        app.database.log("SECURITY", f"Generated new vault master key for {val_user['username']}.")
+        return master_key
+    try:
+        return Encryptor.unwrap_vault_key(val_user["vault_master_key_wrapped"], key)
+    except Exception as e:
+        app.database.log("ERROR", f"Failed to unwrap vault key for {val_user['username']}: {e}")
+        return None
+
+def save_vault_record(val_user: dict, before: dict) -> None:
+    """After a chunked vault write: drop a vault still stored in the record. The user record is only saved if it changed."""
+    val_user.pop("vault", None)
+    if val_user != before:
+        app.database.save_user(val_user)
+
+@app.post("/set_vault_information") # ------ /set_vault_information
+@app.limit("3/minute")
+@app.auth_guard()
+async def set_vault_information(request: Request, data: VaultUpdateRequest) -> JSONResponse:
+    user = request.state.user
+    key = request.state.key
+
+    val_user = app.database.get_user(user["id"])
+    if not val_user:
+        app.database.log("ERROR", f"Connected user {user['username']} not found with token.")
+        return JSONResponse({"success": False, "message": "User data error."})
+    before = dict(val_user)
+
+    master_key = vault_master_key(val_user, key)
+    if master_key is None:
+        return JSONResponse({"success": False, "message": "Failed to decrypt vault key."})
+
+    # Encrypt vault data with master key (chunked, outside the user record)
+    await anyio.to_thread.run_sync(vault_store.write, user["id"], master_key, data.data.encode())
+    save_vault_record(val_user, before)
+    app.database.log("UPDATE", f"User {user['username']} updated their vault (encrypted).")
+    return JSONResponse({"success": True, "message": "Vault successfully updated and encrypted."})
+
+@app.post("/upload_vault") # ------ /upload_vault
+@app.limit("3/minute")
+@app.auth_guard()
+async def upload_vault(request: Request) -> JSONResponse:
+    # Raw request body (application/octet-stream) replaces the vault, encrypted chunk by chunk as it arrives
+    user = request.state.user
+    key = request.state.key
+
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > VAULT_MAX_SIZE:
+        return JSONResponse({"success": False, "message": "Vault is too large."}, status_code=413)
+
+    val_user = app.database.get_user(user["id"])
+    if not val_user:
+        app.database.log("ERROR", f"Connected user {user['username']} not found with token.")
+        return JSONResponse({"success": False, "message": "User data error."})
+    before = dict(val_user)
+
+    master_key = vault_master_key(val_user, key)
+    if master_key is None:
+        return JSONResponse({"success": False, "message": "Failed to decrypt vault key."})
+
+    try:
+        with vault_store.VaultWriter(user["id"], master_key) as vault:
+            async for piece in request.stream():
+                await anyio.to_thread.run_sync(vault.write, piece)
+            await anyio.to_thread.run_sync(vault.commit)
+    except vault_store.VaultTooLarge:
+        return JSONResponse({"success": False, "message": "Vault is too large."}, status_code=413)
+
+    save_vault_record(val_user, before)
+    app.database.log("UPDATE", f"User {user['username']} uploaded their vault ({vault.size} bytes, encrypted).")
+    return JSONResponse({"success": True, "message": "Vault successfully updated and encrypted.", "size": vault.size})
+
+@app.post("/change_password") # ------ /change_password
+@app.limit("3/week")
+@app.auth_guard()
+@app.change_pw_protocal()
+async def change_password(request: Request, data: PasswordChangeRequest) -> JSONResponse:
+    pass
+
+# --- GETs ---
+@app.get("/get_personal_information") # ------ /get_personal_information
+@app.limit("5/minute")
+@app.auth_guard()
+async def get_personal_information(request: Request) -> JSONResponse:
+    user = request.state.user
+    key = request.state.key
+
+    vault = ""
+    if user.get("vault") or vault_store.exists(user["id"]):
+        try:
+            # Unwrap the vault master key using password-derived KEK
+            if not user.get("vault_master_key_wrapped"):
+                vault = "[No vault key configured]"
+            elif (vault_store.size(user["id"]) or 0) > VAULT_TEXT_LIMIT * 4:
+                vault = "[Vault too large to show here, use /download_vault]"
+            else:
+                master_key = Encryptor.unwrap_vault_key(user["vault_master_key_wrapped"], key)
+                vault = await anyio.to_thread.run_sync(vault_store.read_text, user, master_key)
+        except Exception as e:
+            vault = f"[Error decrypting vault: {str(e)}]"
+
+    information = {
+        "username": user["username"],
+        "first_name": user["first_name"],
+        "last_name": user["last_name"],
+        "vault": vault
+    }
+    app.database.log("UPDATE", f"User {user['username']} requested personal info.")
+    return JSONResponse({"success": True, "message": "Personal information served.", "information": information})
+
+@app.get("/download_vault") # ------ /download_vault
+@app.limit("30/minute")
+@app.auth_guard()
+async def download_vault(request: Request):
+    # Streams the decrypted vault (application/octet-stream); a single "Range: bytes=..." only decrypts the chunks it covers
+    user = request.state.user
+    key = request.state.key
+
+    if not user.get("vault_master_key_wrapped"):
+        return JSONResponse({"success": False, "message": "No vault stored."}, status_code=404)
+    try:
+        master_key = Encryptor.unwrap_vault_key(user["vault_master_key_wrapped"], key)
+    except Exception as e:
+        app.database.log("ERROR", f"Failed to unwrap vault key for {user['username']}: {e}")
+        return JSONResponse({"success": False, "message": "Failed to decrypt vault key."})
+
+    reader = vault_store.open_vault(user["id"], master_key)
+    if reader is None:
+        # Vault still stored in the user record (written before chunked storage)
+        body = Encryptor.decrypt_vault(user.get("vault", ""), master_key).encode()
+        total = len(body)
+    else:
+        total = reader.size
+
+    headers = {"Accept-Ranges": "bytes", "Cache-Control": "no-store"}
+    try:
+        span = vault_store.parse_range(request.headers.get("range"), total)
+    except ValueError:
+        if reader is not None:
+            reader.close()
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{total}"})
+    start, end = span or (0, total)
+    headers["Content-Length"] = str(end - start)
+    if span:
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{total}"
+
+    chunks = vault_store.iter_range(reader, start, end) if reader is not None else iter([body[start:end]])
+    app.database.log("UPDATE", f"User {user['username']} downloaded their vault.")
+    return StreamingResponse(chunks, status_code=206 if span else 200,
+                             media_type="application/octet-stream", headers=headers)
+
+MAX_USERS_PAGE = 1000  # largest page of /get_all_users
+
+def users_page_request(request: Request) -> bool:
+    return "limit" in request.query_params
+
+@app.get("/get_all_users") # ------ /get_all_users
+@app.limit("5/minute", when=lambda request: not users_page_request(request))  # full dumps
+@app.limit("30/minute", when=users_page_request)  # pages of at most MAX_USERS_PAGE users
+@app.auth_guard(admin=True)
+async def get_all_users(request: Request):
+    # Query: limit + cursor (next_cursor of the previous page), prefix and admin filters, format=ndjson to stream
+    user = request.state.user
+    params = request.query_params
+    try:
+        limit = listings.parse_limit(params.get("limit"), MAX_USERS_PAGE)
+        after = listings.decode_cursor(params.get("cursor"))
+        admin = listings.parse_flag(params.get("admin"))
+    except ValueError:
+        return JSONResponse({"success": False, "message": "Invalid listing parameters."})
+
+    def safe_user(u: dict) -> dict:
+        return {
+            "id": u["id"],
+            "username": u["username"],
+            "name": f"{u.get('first_name')} {u.get('last_name')}",
+            "admin": u.get("admin", False),
+            "vault_size": vault_store.size_of(u),
+        }
+
+    users, next_cursor = listings.page(
+        listings.users(after, params.get("prefix"), admin, app.database.users), limit, listings.user_key)
+    app.database.log("ADMIN ACTION", f"Admin {user['username']} retrieved all user data safely.")
+
+    if params.get("format") == "ndjson":
+        def lines():
+            for u in users:
+                yield json.dumps(safe_user(u)) + "\n"
+            if next_cursor:
+                yield json.dumps({"next_cursor": next_cursor}) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    response = {"success": True, "message": "All safe user data has been served.", "users": [safe_user(u) for u in users]}
+    if limit is not None:
+        response["next_cursor"] = next_cursor
+    return JSONResponse(response)
+
+# --- Mount frontend & Run server ---
+if __name__ == "__main__":
+    app.mount(FRONTEND)
+    
+    server.app = app
+    
+    server.LoadConfig()
+    app.database.log("STARTUP", "Server starting...")
     server.run()
\ No newline at end of file